@@ -29,17 +29,16 @@ file(a, "wb") on file which requires admin NOT running:         IOError: [Errno
 To know if we need UAC, check if the directory is writable
 """
 
-import hashlib
 import os
 import shutil
 import sys
 
 from distutils.version import LooseVersion
 from kivy.logger import Logger
-from utils.devmode import devmode
 from utils import paths
 from utils import process_launcher
 from utils import unicode_helpers
+from utils.executables import compare_if_same_files, get_external_executable
 
 '''
 try:
@@ -56,15 +55,6 @@ class UpdateException(Exception):
     pass
 
 
-def get_external_executable():
-    executable = devmode.get_application_executable()
-    if executable:
-        return executable
-
-    else:
-        return paths.get_external_executable()
-
-
 def call_file_arguments(filename):
     """Prepare arguments to call filename. Basically if it's a python script prepend 'python' to it."""
     if filename.endswith('.py'):
@@ -102,34 +92,6 @@ def request_my_update(new_executable):
     process_launcher.run(args)
 
 
-def compare_if_same_files(other_executable):
-    """This function checks if the running executable is the same as the one pointed by
-    other_executable variable"""
-    my_sha1 = None
-    other_sha1 = None
-
-    my_executable_path = get_external_executable()
-    Logger.info('Autoupdater: Comparing {} with {}...'.format(my_executable_path, other_executable))
-
-    with file(my_executable_path, 'rb') as my_file:
-        contents = my_file.read()
-        my_sha1 = hashlib.sha1(contents).hexdigest()
-
-    try:
-        with file(other_executable, 'rb') as other_file:
-            contents = other_file.read()
-            other_sha1 = hashlib.sha1(contents).hexdigest()
-
-    except IOError as ex:
-        if ex.errno == 2:
-            Logger.info('Autoupdater: Up to date file missing.')
-            return False
-
-    same_files = my_sha1 == other_sha1
-    Logger.info('Autoupdater: Same files: {}'.format(same_files))
-    return same_files
-
-
 def perform_substitution(old_executable_name):
     my_executable_pathname = get_external_executable()
     Logger.info('Autoupdater: Trying to copy {} over {}'.format(my_executable_pathname, old_executable_name))
@@ -20,6 +20,7 @@ import kivy.app  # To keep PyDev from complaining
 import os
 import textwrap
 import third_party.helpers
+import threading
 import urllib
 import utils.system_processes
 
@@ -33,11 +34,14 @@ from kivy.network.urlrequest import UrlRequest
 from kivy.uix.screenmanager import Screen
 from kivy.logger import Logger
 
+from sync.metadata_diff import diff_metadata
 from sync.modmanager import ModManager
+from utils import requests_wrapper
 from utils.devmode import devmode
 from utils.fake_enum import enum
 from utils.primitive_git import get_git_sha1_auto
 from utils.paths import is_pyinstaller_bundle
+from utils.promise import Promise
 from view.errorpopup import ErrorPopup, DEFAULT_ERROR_MESSAGE
 from view.gameselectionbox import GameSelectionBox
 from view.modreusebox import ModReuseBox
@@ -58,6 +62,8 @@ DynamicButtonStates = enum('play', 'checking', 'install', 'self_upgrade')
 
 
 class Controller(object):
+    NEWS_CACHE_MAX_AGE = 10 * 60  # Don't refetch the news more often, unless told by the server
+
     def __init__(self, widget):
         super(Controller, self).__init__()
 
@@ -68,6 +74,9 @@ class Controller(object):
         self.mod_manager = ModManager(self.settings)
         self.version = version
         self.para = None
+        self.precheck = None  # Checking of the mods from the cached metadata
+        self.precheck_mod_data = None
+        self.updating_mods = set()  # Mods updated in the running sync process
 
         Clock.schedule_once(self.update_footer_label, 0)
 
@@ -120,9 +129,15 @@ class Controller(object):
         self.set_action_button_state(DynamicButtonStates.checking)
 
         self.syncing_failed = False
+        self.updating_mods = set()
         self.mod_manager.reset()
 
         if force_download_new:
+            # Check the mods described by the cached metadata while the new
+            # metadata is being downloaded. Most of the time, it hasn't changed
+            # and the result can be used right away.
+            self.start_precheck(self.settings.get('mod_data_cache'))
+
             # download mod description
             self.para = self.mod_manager.download_mod_description()
             self.para.then(self.on_download_mod_description_resolve,
@@ -163,6 +178,8 @@ class Controller(object):
             # self.para.request_termination()
             self.para.request_termination_and_break_promises()
 
+        self.cancel_precheck()
+
         Clock.unschedule(self.seeding_and_action_button_upkeep)
         Clock.unschedule(self.metadata_watchdog)
 
@@ -231,15 +248,47 @@ class Controller(object):
             Logger.debug('on_watchdog_metadata_fetch: Requirements not met. Aborting.')
             return
 
+        # Note: even when the server answered 304 Not Modified, the cached copy
+        # may be newer than mod_data_cache if a previous fetch was discarded
+        Logger.debug('on_watchdog_metadata_fetch: Not modified on the server: {}'.format(data.get('not_modified')))
+        if data.get('hash') and data['hash'] == self.settings.get('mod_data_hash'):
+            Logger.debug('on_watchdog_metadata_fetch: Data is still the same. Not doing anything.')
+            return
+
         data = data['data']
+        changes = diff_metadata(self.settings.get('mod_data_cache'), data)
 
-        if data != self.settings.get('mod_data_cache'):
-            Logger.info('on_watchdog_metadata_fetch: Data differs, restarting the checking routine.')
+        if changes.is_empty():
+            Logger.debug('on_watchdog_metadata_fetch: Data is still the same. Not doing anything.')
+
+        elif changes.can_be_applied_in_place():
+            Logger.info('on_watchdog_metadata_fetch: Only some torrents changed, updating them: {}'.format(changes))
+            self.update_mods_in_place(data, changes)
+
+        else:
+            Logger.info('on_watchdog_metadata_fetch: Data differs, restarting the checking routine: {}'.format(changes))
             self.settings.set('automatic_download', True)
             self.restart_checking_mods(force_download_new=True)
 
-        else:
-            Logger.debug('on_watchdog_metadata_fetch: Data is still the same. Not doing anything.')
+    def update_mods_in_place(self, data, changes):
+        """Sync the new torrents of the changed mods in the running sync
+        process. The other mods keep seeding.
+        """
+        self.settings.set('mod_data_cache', data)
+        self.watchdog_reschedule(data)
+        self.mod_manager.apply_metadata_changes(changes)
+
+        synced_mods = {mod.foldername: mod for mod in self.mod_manager.get_mods(only_selected=True)
+                       if mod.foldername in changes.changed_mods}
+        if not synced_mods:
+            return
+
+        self.updating_mods.update(synced_mods)
+        self.para.send_message('update_mods', synced_mods.values())
+
+        self.set_action_button_state(DynamicButtonStates.checking)
+        self.disable_action_buttons()
+        self._set_status_label('Updating mods: {}'.format(', '.join(sorted(synced_mods))))
 
     def metadata_watchdog(self, dt):
         """Check if the metadata has changed from the time it was last fetched.
@@ -687,6 +736,38 @@ class Controller(object):
 
     # Download_mod_description callbacks #######################################
 
+    def fetch_news(self):
+        """Show the news, from the cache if they are fresh enough, otherwise
+        revalidated with the server. The news are fetched in a thread to keep
+        the UI responsive.
+        """
+        url = launcher_config.news_url
+        if not url:
+            return
+
+        label = self.view.ids.news_label
+
+        thread = threading.Thread(target=self._fetch_news_in_thread, args=(url, label), name='NewsFetcher')
+        thread.daemon = True
+        thread.start()
+
+    def _fetch_news_in_thread(self, url, label):
+        try:
+            res = requests_wrapper.download_url_cached(None, url, max_age=self.NEWS_CACHE_MAX_AGE, timeout=10)
+
+        except requests_wrapper.DownloadException as ex:
+            Logger.info('InstallScreen: Could not fetch the news: {}'.format(ex))
+            return
+
+        if res.status_code != 200:
+            Logger.info('InstallScreen: Could not fetch the news: HTTP {}'.format(res.status_code))
+            return
+
+        news = res.content.decode('utf-8', 'replace')
+
+        # Kivy widgets may only be touched from the main thread
+        Clock.schedule_once(lambda dt: self.on_news_success(label, None, news), 0)
+
     def on_news_success(self, label, request, result):
         # TODO: Move me to another file
 
@@ -727,9 +808,7 @@ class Controller(object):
         self.checkmods(data['data'])
         self.watchdog_reschedule(data['data'])
 
-        if launcher_config.news_url:
-            UrlRequest(launcher_config.news_url, on_success=partial(
-                self.on_news_success, self.view.ids.news_label))
+        self.fetch_news()
         UrlRequest('http://launcherstats.frontline-mod.com/launcher?domain=' +
                    urllib.quote(launcher_config.domain))
 
@@ -751,6 +830,7 @@ class Controller(object):
 
         # Ugly hack until we have an auto-updater
         if 'launcher is out of date' in message:
+            self.cancel_precheck()
             message = textwrap.dedent('''
                 This launcher is out of date!
                 You won\'t be able to download mods until you update to the latest version!
@@ -776,12 +856,43 @@ class Controller(object):
 
             self.checkmods(mod_data)
 
-            if launcher_config.news_url:
-                UrlRequest(launcher_config.news_url, on_success=partial(self.on_news_success, self.view.ids.news_label))
+            self.fetch_news()
 
     # Checkmods callbacks ######################################################
 
+    def start_precheck(self, mod_data):
+        self.cancel_precheck()
+
+        if not mod_data:
+            return
+
+        Logger.info('InstallScreen: Checking the mods from the cached metadata')
+        self.precheck_mod_data = mod_data
+        self.precheck = Promise.from_para(self.mod_manager.prepare_and_check(mod_data))
+
+    def cancel_precheck(self):
+        if self.precheck:
+            self.precheck.cancel()
+
+        self.precheck = None
+        self.precheck_mod_data = None
+
     def checkmods(self, mod_data):
+        precheck = self.precheck
+        if precheck and mod_data == self.precheck_mod_data:
+            # The mods are already being checked. Just wait for the result
+            Logger.info('InstallScreen: Metadata unchanged, reusing the cached metadata checks')
+            self.precheck = None
+            self.precheck_mod_data = None
+            self.para = precheck.para
+
+            if self.para.is_open():
+                self.para.add_progress_handler(self.on_checkmods_progress)
+
+            precheck.then(self.on_checkmods_resolve, self.on_checkmods_reject)
+            return
+
+        self.cancel_precheck()
         self.para = self.mod_manager.prepare_and_check(mod_data)
         self.para.then(self.on_checkmods_resolve,
                        self.on_checkmods_reject,
@@ -930,6 +1041,12 @@ class Controller(object):
 
         self.view.ids.progress_bar.value = percentage * 100
 
+        mod_synchronised = progress.get('workaround_finished')
+        if mod_synchronised in self.updating_mods:
+            self.updating_mods.discard(mod_synchronised)
+            if not self.updating_mods:
+                self.try_enable_play_button()
+
         tsplugin_request_action = progress.get('tsplugin_request_action')
         message_box = progress.get('message_box')
         if message_box:
@@ -945,6 +1062,7 @@ class Controller(object):
 
     def on_sync_resolve(self, progress):
         self.para = None
+        self.updating_mods = set()
         Logger.info('InstallScreen: syncing finished')
         self.view.ids.status_image.hide()
         self._set_status_label(progress.get('msg'))
@@ -954,6 +1072,7 @@ class Controller(object):
 
     def on_sync_reject(self, data):
         self.para = None
+        self.updating_mods = set()
         Logger.info('InstallScreen: syncing failed')
 
         message = data.get('msg', DEFAULT_ERROR_MESSAGE)
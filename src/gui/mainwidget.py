@@ -140,8 +140,8 @@ class Controller(object):
             self.set_background_path(None)
             return
 
-        background_path = filecache.map_file(url)
-        if os.path.isfile(background_path):
+        background_path = filecache.get_path(url)
+        if background_path:
             Logger.info('Background: Background already fetched. Reusing cached data.')
             self.set_background_path(background_path)
 
@@ -0,0 +1,111 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""Headless seeder for dedicated seedboxes.
+
+Seeds all the mods described by the given metadata.json files (local paths or
+urls) without starting the GUI. If no metadata file is given, the metadata of
+the launcher configuration is used.
+
+Usage: python headless_seeder.py -d <mods directory> [-m <metadata>]...
+"""
+
+from __future__ import unicode_literals
+
+import os
+
+# Don't let kivy parse our command line arguments
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+
+from utils.paths import fix_unicode_paths
+fix_unicode_paths()
+
+import argparse
+import signal
+
+from sync.metrics import MetricsExporter
+from sync.seeder import MetadataSource, Seeder
+from utils.devmode import devmode
+from utils.log import Logger, set_log_level
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Seed all the mods without running the GUI.')
+    parser.add_argument('-d', '--directory', required=True,
+                        help='Directory where the mods are stored')
+    parser.add_argument('-m', '--metadata', action='append', default=[],
+                        help='Path or url of a metadata.json file. May be used multiple times')
+    parser.add_argument('--torrents-url', default=None,
+                        help='Url of the directory containing the torrents of local metadata files')
+    parser.add_argument('--login', default=None)
+    parser.add_argument('--password', default=None)
+    parser.add_argument('--max-download', type=int, default=0,
+                        help='Maximum download speed in KB/s (0 = unlimited)')
+    parser.add_argument('--max-upload', type=int, default=0,
+                        help='Maximum upload speed in KB/s (0 = unlimited)')
+    parser.add_argument('--refresh', type=int, default=300,
+                        help='Check the metadata files for changes every X seconds')
+    parser.add_argument('--resume-data', type=int, default=900,
+                        help='Save the resume data every X seconds')
+    parser.add_argument('--metrics-json', default=None,
+                        help='Periodically write the seeding metrics to this JSON file')
+    parser.add_argument('--metrics-prometheus', default=None,
+                        help='Periodically write the seeding metrics to this Prometheus text file')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='Serve the metrics on http://127.0.0.1:<port>/metrics')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    set_log_level(devmode.get_log_level('info'))
+
+    if args.metadata:
+        sources = [MetadataSource(location, args.login, args.password, args.torrents_url)
+                   for location in args.metadata]
+
+    else:
+        import launcher_config
+        domain = devmode.get_launcher_domain(default=launcher_config.domain)
+        metadata_path = devmode.get_metadata_path(default=launcher_config.metadata_path)
+        sources = [MetadataSource('http://{}{}'.format(domain, metadata_path),
+                                  args.login, args.password, args.torrents_url)]
+
+    if args.metrics_json or args.metrics_prometheus or args.metrics_port:
+        metrics_exporter = MetricsExporter(args.metrics_json, args.metrics_prometheus, args.metrics_port)
+    else:
+        metrics_exporter = MetricsExporter.from_devmode()
+
+    seeder = Seeder(sources, os.path.abspath(args.directory),
+                    max_download_speed=args.max_download,
+                    max_upload_speed=args.max_upload,
+                    refresh_interval=args.refresh,
+                    resume_data_interval=args.resume_data,
+                    metrics_exporter=metrics_exporter)
+
+    def stop_handler(signum, frame):
+        seeder.stop()
+
+    signal.signal(signal.SIGINT, stop_handler)
+    signal.signal(signal.SIGTERM, stop_handler)
+
+    Logger.info('Seeder: Starting headless seeder')
+    try:
+        seeder.run()
+    finally:
+        if metrics_exporter:
+            metrics_exporter.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -35,6 +35,12 @@ def start():
     import multiprocessing
     multiprocessing.freeze_support()
 
+    # Child processes import this file again as their main module. They only
+    # run the functions passed by Para which import whatever they need, so
+    # don't make them pay for importing kivy.
+    if __name__ != '__main__':
+        return
+
     # Import kivy as soon as possible to let it eat all the kivy args from sys.argv
     import kivy
 
@@ -107,6 +113,7 @@ def start():
         from kivy.base import ExceptionManager
 
         from utils.app import BaseApp
+        from utils.process import start_worker_pool, stop_worker_pool
         from view.numberinput import NumberInput
         from view.dynamicbutton import DynamicButton
         from view.hoverbutton import HoverButton
@@ -146,6 +153,16 @@ def start():
                 logger.addHandler(logging.StreamHandler())
                 return MainWidget()
 
+            def on_start(self):
+                # Warm up the processes running the Para functions in the
+                # background, with the heavy modules already imported
+                start_worker_pool(devmode.get_worker_pool_size(default=2),
+                                  preload=['libtorrent', 'sync.manager_functions', 'sync.torrentsyncer'])
+
+            def on_stop(self):
+                stop_worker_pool()
+                self.settings.flush()
+
         class SelfUpdaterApp(BaseApp):
             """app which starts the self updater"""
 
@@ -160,6 +177,9 @@ def start():
                 logger.addHandler(logging.StreamHandler())
                 return UpdaterMainWidget()
 
+            def on_stop(self):
+                self.settings.flush()
+
         if __name__ == '__main__':
             launcher_app = None
 
@@ -0,0 +1,189 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""Deduplication of identical files across mods.
+
+Several servers ship variants of the same mods under different foldernames,
+with many identical files. Those files are detected with the per-file hashes
+and sizes stored in the torrents and are replaced with hard links of a single
+copy.
+
+Hard linked files share their modification time, so the resume data of the
+mods is updated accordingly to keep is_complete_quick() working.
+"""
+
+from __future__ import unicode_literals
+
+import os
+
+from collections import defaultdict
+from sync.reconcile import get_torrent_files
+from utils import context, hashes, paths
+from utils.log import Logger
+from utils.metadatafile import MetadataFile
+
+# Don't bother with small files
+MIN_FILE_SIZE = 64 * 1024
+
+
+class FileEntry(object):
+    """A file of a mod, as described by the mod's torrent."""
+
+    def __init__(self, mod, index, torrent_file):
+        super(FileEntry, self).__init__()
+        self.mod = mod
+        self.index = index  # Index of the file in the torrent
+        self.torrent_file = torrent_file
+        self.full_path = os.path.join(mod.parent_location, torrent_file.path)
+
+
+def build_file_index(mods, min_size=MIN_FILE_SIZE):
+    """Return {(size, filehash): [FileEntry, ...]} for all the files of the
+    complete mods.
+    Mods whose torrents have no per-file hashes are skipped.
+    """
+    from sync import torrent_utils
+
+    index = defaultdict(list)
+    seen = set()
+
+    for mod in mods:
+        if mod.foldername in seen or not mod.is_complete():
+            continue
+
+        seen.add(mod.foldername)
+        metadata_file = MetadataFile(mod.foldername)
+        metadata_file.read_data(ignore_open_errors=True)
+        torrent_content = metadata_file.get_torrent_content()
+        if not torrent_content:
+            continue
+
+        try:
+            torrent_info = torrent_utils.get_torrent_info_from_bytestring(torrent_content)
+
+        except RuntimeError:
+            continue
+
+        for file_index, torrent_file in enumerate(get_torrent_files(torrent_info)):
+            if torrent_file.filehash and torrent_file.size >= min_size:
+                index[(torrent_file.size, torrent_file.filehash)].append(FileEntry(mod, file_index, torrent_file))
+
+    return index
+
+
+def get_shared_files(mods):
+    """Return {(size, filehash): full_path} of the files of complete mods.
+    Meant to be passed to reconcile.reconcile_mod_files().
+    """
+    return {key: entries[0].full_path for key, entries in build_file_index(mods).iteritems()}
+
+
+def _update_resume_data_mtime(entries):
+    """Set the modification time stored in the resume data of the mods to the
+    current modification time of the given files.
+    """
+    import libtorrent
+
+    by_mod = defaultdict(list)
+    for entry in entries:
+        by_mod[entry.mod.foldername].append(entry)
+
+    for foldername, mod_entries in by_mod.iteritems():
+        metadata_file = MetadataFile(foldername)
+        metadata_file.read_data(ignore_open_errors=True)
+        resume_data_bencoded = metadata_file.get_torrent_resume_data()
+        if not resume_data_bencoded:
+            continue
+
+        resume_data = libtorrent.bdecode(resume_data_bencoded)
+        file_sizes = resume_data.get('file sizes')
+        if not file_sizes:
+            continue
+
+        for entry in mod_entries:
+            file_sizes[entry.index][1] = int(os.stat(entry.full_path).st_mtime)
+
+        metadata_file.set_torrent_resume_data(libtorrent.bencode(resume_data))
+        metadata_file.write_data()
+
+
+def _replace_with_link(canonical, duplicate):
+    """Replace the duplicate file with a hard link to the canonical file.
+    The link replaces the duplicate in one step, so the file is never missing.
+    """
+    tmp_path = duplicate + '.launcher_tmp'
+    paths.hardlink(canonical, tmp_path)
+
+    try:
+        paths.replace_file(tmp_path, duplicate)
+
+    except OSError:
+        with context.ignore_nosuchfile_exception():
+            os.unlink(tmp_path)
+        raise
+
+
+def deduplicate_files(mods):
+    """Replace identical files of complete mods with hard links.
+
+    Return a dictionary with the number of files linked, the number of bytes
+    saved and the number of files that could not be linked (different volumes,
+    no hard link support or files in use).
+    """
+    report = {'files_linked': 0, 'bytes_saved': 0, 'files_skipped': 0}
+    changed_entries = []
+
+    for (size, filehash), entries in build_file_index(mods).iteritems():
+        if len(entries) < 2:
+            continue
+
+        canonical = entries[0]
+
+        try:
+            duplicates = [entry for entry in entries[1:]
+                          if not paths.is_same_file(canonical.full_path, entry.full_path)]
+
+            if not duplicates:
+                continue  # Already deduplicated
+
+            if hashes.sha1(canonical.full_path) != filehash:
+                Logger.info('Dedup: {} has been modified. Skipping.'.format(canonical.full_path))
+                continue
+
+        except (IOError, OSError):
+            continue
+
+        for entry in duplicates:
+            try:
+                if hashes.sha1(entry.full_path) != filehash:
+                    Logger.info('Dedup: {} has been modified. Skipping.'.format(entry.full_path))
+                    continue
+
+                _replace_with_link(canonical.full_path, entry.full_path)
+
+            except (IOError, OSError) as ex:
+                Logger.info('Dedup: Could not link {} to {}: {}'.format(entry.full_path, canonical.full_path, repr(ex)))
+                report['files_skipped'] += 1
+                continue
+
+            Logger.debug('Dedup: Linked {} to {}'.format(entry.full_path, canonical.full_path))
+            changed_entries.append(entry)
+            report['files_linked'] += 1
+            report['bytes_saved'] += size
+
+    _update_resume_data_mtime(changed_entries)
+
+    Logger.info('Dedup: Linked {files_linked} files, saved {bytes_saved} bytes, skipped {files_skipped} files'.format(
+        **report))
+
+    return report
+
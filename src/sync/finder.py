@@ -18,9 +18,9 @@ import os
 import re
 import string
 
-from kivy.logger import Logger
 from third_party.arma import Arma
 from utils import walker
+from utils.log import Logger
 from utils.unicode_helpers import casefold
 from sync.torrent_utils import path_can_be_a_mod, path_already_used_for_mod
 
@@ -24,10 +24,10 @@ import itertools
 import os
 import shutil
 
-from kivy.logger import Logger
 from utils import walker
 from utils.context import ignore_exceptions
 from utils.hashes import sha1
+from utils.log import Logger
 from utils.unicode_helpers import casefold
 from third_party import teamspeak
 
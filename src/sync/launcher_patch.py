@@ -0,0 +1,73 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""Update of the launcher executable with the binary patches published next
+to the launcher torrent (see torrent_uploader.create_launcher_patches).
+"""
+
+from __future__ import unicode_literals
+
+import launcher_config
+import os
+
+from utils import delta
+from utils import executables
+from utils import paths
+from utils.log import Logger
+from utils.requests_wrapper import download_url, DownloadException
+
+
+def patch_launcher(message_queue, launcher):
+    """Build the new launcher executable by patching the running one, if the
+    metadata has a patch for it. The torrent then only has to check the file
+    instead of downloading it.
+    On any failure, the torrent downloads the whole executable, as usual.
+    Return True if the executable has been patched.
+    """
+
+    if not launcher.sha1 or not launcher.patches:
+        return False
+
+    try:
+        my_executable = executables.get_external_executable()
+        my_sha1 = executables.get_file_sha1(my_executable)
+    except EnvironmentError as ex:
+        Logger.info('patch_launcher: Not patching: {}'.format(ex))
+        return False
+
+    patch_file = launcher.patches.get(my_sha1)
+    if not patch_file:
+        Logger.info('patch_launcher: No patch for the executable {}'.format(my_sha1))
+        return False
+
+    new_executable = os.path.join(launcher.get_full_path(), launcher_config.executable_name + '.exe')
+    if os.path.isfile(new_executable) and executables.get_file_sha1(new_executable) == launcher.sha1:
+        return False
+
+    patch_url = '{}/{}'.format(launcher.torrent_url.rsplit('/', 1)[0], patch_file)
+    tmp_executable = '{}.patched'.format(new_executable)
+    message_queue.progress({'msg': 'Downloading the launcher update...'}, 0)
+
+    try:
+        res = download_url(None, patch_url, timeout=10)
+        Logger.info('patch_launcher: Applying patch {} ({} bytes)'.format(patch_url, len(res.content)))
+
+        paths.mkdir_p(launcher.get_full_path())
+        delta.apply_patch(my_executable, res.content, tmp_executable)
+        paths.replace_file(tmp_executable, new_executable)
+
+    except (DownloadException, delta.PatchError, EnvironmentError) as ex:
+        Logger.error('patch_launcher: Patching failed, downloading the whole launcher: {}'.format(ex))
+        return False
+
+    Logger.info('patch_launcher: The launcher executable has been patched')
+    return True
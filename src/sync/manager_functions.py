@@ -17,21 +17,21 @@ import launcher_config
 import os
 import textwrap
 import time
+import urlparse
 
 from datetime import datetime
 from distutils.version import LooseVersion
-from kivy.logger import Logger
-from kivy.config import Config
-from sync import integrity, torrent_utils
+from sync import integrity, launcher_patch, torrent_utils
 from sync.mod import Mod
 from sync.server import Server
-from sync.torrentsyncer import TorrentSyncer
 from third_party import teamspeak
+from utils import metadata_store
 from utils.devmode import devmode
-from utils.requests_wrapper import download_url, DownloadException
+from utils.log import Logger, set_log_level
+from utils.requests_wrapper import download_url_cached, DownloadException
 
 default_log_level = devmode.get_log_level('info')
-Config.set('kivy', 'log_level', default_log_level)
+set_log_level(default_log_level)
 
 ################################################################################
 ################################## ATTENTION!!! ################################
@@ -79,26 +79,35 @@ def symlink_mod(message_queue, mod_location, real_location):
         message_queue.reject({'msg': ex.message})
 
 
-def _get_mod_descriptions(para, login, password):
+def _get_mod_descriptions(para, login, password, url=None):
     """
     helper function to get the moddescriptions from the server
 
     this function is ment be used threaded or multiprocesses, you have
     to pass in a queue
+
+    If url is not set, the metadata url of the launcher configuration is used.
     """
     para.progress({'msg': 'Downloading mod descriptions'})
 
-    domain = devmode.get_launcher_domain(default=launcher_config.domain)
-    metadata_path = devmode.get_metadata_path(default=launcher_config.metadata_path)
-    url = 'http://{}{}'.format(domain, metadata_path)
+    if url is None:
+        domain = devmode.get_launcher_domain(default=launcher_config.domain)
+        metadata_path = devmode.get_metadata_path(default=launcher_config.metadata_path)
+        url = 'http://{}{}'.format(domain, metadata_path)
+
+    else:
+        domain = urlparse.urlparse(url).netloc
 
     try:
+        # The server usually answers 304 Not Modified and the cached copy
+        # of the metadata is used
         if login and password:
-            res = download_url(domain, url, timeout=5, auth=(login, password))
+            res = download_url_cached(domain, url, timeout=5, auth=(login, password))
         else:
-            res = download_url(domain, url, timeout=5)
+            res = download_url_cached(domain, url, timeout=5)
     except DownloadException as ex:
         para.reject({'msg': 'Downloading metadata: {}'.format(ex.args[0])})
+        return ''
 
 
     if res.status_code == 404:
@@ -145,7 +154,9 @@ def _get_mod_descriptions(para, login, password):
             return ''
 
     para.resolve({'msg': 'Downloading mods descriptions finished',
-                  'data': data})
+                  'data': data,
+                  'hash': metadata_store.get_hash(data),
+                  'not_modified': res.from_cache})
 
     return data
 
@@ -171,23 +182,32 @@ def _torrent_url_base():
 
     return torrent_url_prefix
 
-def parse_launcher_data(para, metadata, launcher_basedir):
+def _inherit_web_seeds(entry, parent):
+    """Web seeds may be set for all the mods of the metadata or of a server."""
+    for key in ('web-seeds', 'web-seed-connections'):
+        if key in parent:
+            entry.setdefault(key, parent[key])
+
+
+def parse_launcher_data(para, metadata, launcher_basedir, torrent_url_prefix=None):
     if 'launcher' not in metadata:
         return None
 
     launcher = metadata['launcher']
-    launcher_mod = convert_metadata_to_mod(launcher, _torrent_url_base())
+    _inherit_web_seeds(launcher, metadata)
+    launcher_mod = convert_metadata_to_mod(launcher, torrent_url_prefix or _torrent_url_base())
     launcher_mod.parent_location = launcher_basedir
     launcher_mod.is_launcher = True
 
     return launcher_mod
 
 
-def parse_mods_data(para, data, launcher_moddir):
+def parse_mods_data(para, data, launcher_moddir, torrent_url_prefix=None):
     mods = []
 
     for md in data.get('mods', []):
-        mod = convert_metadata_to_mod(md, _torrent_url_base())
+        _inherit_web_seeds(md, data)
+        mod = convert_metadata_to_mod(md, torrent_url_prefix or _torrent_url_base())
         mod.parent_location = launcher_moddir
         mods.append(mod)
 
@@ -206,7 +226,7 @@ def parse_battleye_data(para, data):
 
     return battleye
 
-def parse_servers_data(para, data, launcher_moddir):
+def parse_servers_data(para, data, launcher_moddir, torrent_url_prefix=None):
     servers = []
 
     servers_list = data.get('servers')
@@ -224,7 +244,8 @@ def parse_servers_data(para, data, launcher_moddir):
 
         # Add the server mods is available
         if 'mods' in server_entry:
-            server.add_mods(parse_mods_data(para, server_entry, launcher_moddir))
+            _inherit_web_seeds(server_entry, data)
+            server.add_mods(parse_mods_data(para, server_entry, launcher_moddir, torrent_url_prefix))
 
         server.teamspeak = parse_teamspeak_data(para, server_entry)
         server.battleye = parse_battleye_data(para, server_entry)
@@ -441,8 +462,52 @@ def _try_installing_teamspeak_plugins(message_queue, mod):
     return True
 
 
-def _sync_all(message_queue, mods, max_download_speed, max_upload_speed, seed):
-    """Run syncers for all the mods in parallel and then their post-download hooks."""
+def _finish_updated_mod(message_queue, mod, all_mods=None):
+    """Run the post-download hooks of a mod whose torrent has been replaced
+    while syncing or seeding: install its TeamSpeak plugins and deduplicate its
+    files against all_mods, if given.
+    Called by the syncer as soon as the mod is synced, as the sync itself may
+    never end while seeding.
+    Return False if a reject has been issued.
+    """
+
+    if not _try_installing_teamspeak_plugins(message_queue, mod):
+        return False
+
+    mod.force_completion()
+
+    if all_mods:
+        from sync import dedup
+
+        # all_mods still holds the mod as it was before the update
+        all_mods = [mod if m.foldername == mod.foldername else m for m in all_mods]
+
+        message_queue.progress({'msg': 'Deduplicating mod files...'}, 1.0)
+        report = dedup.deduplicate_files(all_mods)
+        Logger.info('_finish_updated_mod: Deduplicated {}: {}'.format(mod.foldername, report))
+
+    return True
+
+
+def _sync_all(message_queue, mods, max_download_speed, max_upload_speed, seed, all_mods=None):
+    """Run syncers for all the mods in parallel and then their post-download hooks.
+
+    all_mods - all the mods known to the launcher. Files identical to the ones
+               of those mods are hard linked instead of being downloaded and
+               are deduplicated once the download is done.
+    """
+
+    # Imported here so that the processes that don't sync don't import libtorrent
+    from sync import dedup
+    from sync.metrics import MetricsExporter
+    from sync.torrentsyncer import TorrentSyncer
+
+    deduplicate = all_mods and not seed and devmode.get_deduplicate_mods(default=True)
+
+    if not seed:
+        for m in mods:
+            if getattr(m, 'is_launcher', False) and not m.is_complete():
+                launcher_patch.patch_launcher(message_queue, m)
 
     syncer = TorrentSyncer(message_queue, mods, max_download_speed, max_upload_speed)
     ip_whitelist = devmode.get_ip_whitelist(default=[])
@@ -450,7 +515,19 @@ def _sync_all(message_queue, mods, max_download_speed, max_upload_speed, seed):
         Logger.info('_sync_all: Setting whitelist: {}'.format(ip_whitelist))
         syncer.set_whitelist_filter(ip_whitelist)
 
-    sync_ok = syncer.sync(force_sync=False, just_seed=seed)  # Use force_sync to force full recheck of all the files' checksums
+    if deduplicate:
+        syncer.shared_files = dedup.get_shared_files(all_mods)
+
+    # Mods updated while seeding are done when their torrent is, not when the sync ends
+    dedup_mods = all_mods if devmode.get_deduplicate_mods(default=True) else None
+    syncer.updated_mod_hook = lambda mod: _finish_updated_mod(message_queue, mod, dedup_mods)
+
+    syncer.metrics_exporter = MetricsExporter.from_devmode()
+    try:
+        sync_ok = syncer.sync(force_sync=False, just_seed=seed)  # Use force_sync to force full recheck of all the files' checksums
+    finally:
+        if syncer.metrics_exporter:
+            syncer.metrics_exporter.close()
 
     # If we had an error or we're closing the launcher, don't call post_download_hooks
     if sync_ok is False or syncer.force_termination:
@@ -461,6 +538,7 @@ def _sync_all(message_queue, mods, max_download_speed, max_upload_speed, seed):
             return
 
     # Perform post-download hooks for updated mods
+    synced_mods = []
     for m in mods:
         # If the mod had to be updated and the download was performed successfully
         if not m.is_complete() and m.finished_hook_ran:
@@ -470,5 +548,15 @@ def _sync_all(message_queue, mods, max_download_speed, max_upload_speed, seed):
 
             message_queue.progress({'msg': '[%s] Mod synchronized.' % (m.foldername,),
                                     'workaround_finished': m.foldername}, 1.0)
+            synced_mods.append(m)
+
+    report = None
+    if deduplicate and synced_mods:
+        for m in synced_mods:
+            m.force_completion()
+
+        message_queue.progress({'msg': 'Deduplicating mod files...'}, 1.0)
+        report = dedup.deduplicate_files(all_mods)
 
-    message_queue.resolve({'msg': 'Downloading mods finished.'})
+    message_queue.resolve({'msg': 'Downloading mods finished.',
+                           'dedup': report})
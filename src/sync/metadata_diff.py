@@ -0,0 +1,123 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""Comparison of two versions of the metadata.json contents.
+
+Most of the time, when the metadata changes, only some mods got a new torrent
+(a new torrent-timestamp). Those mods can be updated in the running sync
+process without restarting the checking of all the mods.
+"""
+
+from __future__ import unicode_literals
+
+# Top-level keys that can change without affecting the mods
+IN_PLACE_KEYS = ('refresh',)
+
+
+class MetadataChanges(object):
+    """The differences between two versions of the metadata."""
+
+    def __init__(self):
+        super(MetadataChanges, self).__init__()
+        self.changed_mods = {}  # {foldername: new description} of the mods with a new torrent
+        self.added_mods = set()
+        self.removed_mods = set()
+        self.updated_mods = set()  # Mods with a changed description but the same torrent
+        self.changed_keys = set()  # Top-level keys that changed, ignoring torrent-timestamps
+
+    def is_empty(self):
+        return not (self.changed_mods or self.added_mods or self.removed_mods or
+                    self.updated_mods or self.changed_keys)
+
+    def can_be_applied_in_place(self):
+        """Can the changes be applied by just replacing the torrents of the
+        changed mods. Any other change requires checking everything again.
+        """
+        if self.added_mods or self.removed_mods or self.updated_mods:
+            return False
+
+        return self.changed_keys.issubset(IN_PLACE_KEYS)
+
+    def __repr__(self):
+        return '<MetadataChanges: changed: {}, added: {}, removed: {}, updated: {}, keys: {}>'.format(
+            sorted(self.changed_mods), sorted(self.added_mods), sorted(self.removed_mods),
+            sorted(self.updated_mods), sorted(self.changed_keys))
+
+
+def _strip_timestamps(value):
+    """Return a copy of the value without the torrent-timestamp fields."""
+    if isinstance(value, dict):
+        return {key: _strip_timestamps(item) for key, item in value.iteritems() if key != 'torrent-timestamp'}
+
+    if isinstance(value, list):
+        return [_strip_timestamps(item) for item in value]
+
+    return value
+
+
+def _collect_mods(metadata):
+    """Return {foldername: [descriptions]} of all the mods of the metadata.
+    A mod may be listed several times: globally and by some servers.
+    """
+    mods = {}
+    entries = list(metadata.get('mods', []))
+    for server in metadata.get('servers', []):
+        entries.extend(server.get('mods', []))
+
+    for entry in entries:
+        mods.setdefault(entry.get('foldername'), []).append(entry)
+
+    return mods
+
+
+def diff_metadata(old, new):
+    """Compare the old and the new metadata and return a MetadataChanges."""
+    changes = MetadataChanges()
+    old = old or {}
+    new = new or {}
+
+    old_mods = _collect_mods(old)
+    new_mods = _collect_mods(new)
+
+    changes.added_mods = set(new_mods) - set(old_mods)
+    changes.removed_mods = set(old_mods) - set(new_mods)
+
+    for foldername in set(old_mods) & set(new_mods):
+        old_entries = old_mods[foldername]
+        new_entries = new_mods[foldername]
+        old_timestamps = [entry.get('torrent-timestamp') for entry in old_entries]
+        new_timestamps = [entry.get('torrent-timestamp') for entry in new_entries]
+
+        if [_strip_timestamps(entry) for entry in old_entries] != \
+           [_strip_timestamps(entry) for entry in new_entries]:
+            changes.updated_mods.add(foldername)
+
+        elif old_timestamps != new_timestamps:
+            if len(set(new_timestamps)) == 1:
+                changes.changed_mods[foldername] = new_entries[0]
+            else:
+                # Different versions of the same mod: not something to fix in place
+                changes.updated_mods.add(foldername)
+
+    # The launcher is compared as a whole: a new version requires a self-update
+    for key in set(old) | set(new):
+        old_value = old.get(key)
+        new_value = new.get(key)
+
+        if key != 'launcher':
+            old_value = _strip_timestamps(old_value)
+            new_value = _strip_timestamps(new_value)
+
+        if old_value != new_value:
+            changes.changed_keys.add(key)
+
+    return changes
@@ -0,0 +1,293 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""Syncing and seeding metrics.
+
+The metrics are collected by TorrentSyncer on every tick from the libtorrent
+session status and from the per-torrent status snapshot. They can be written
+periodically to a JSON and/or a Prometheus text file and served on a loopback
+HTTP endpoint.
+
+To enable the export, set metrics_json_file, metrics_prometheus_file and/or
+metrics_port in devmode.conf.
+"""
+
+from __future__ import unicode_literals
+
+import BaseHTTPServer
+import json
+import libtorrent
+import socket
+import threading
+import time
+
+from contextlib import contextmanager
+from utils import paths
+from utils.devmode import devmode
+from utils.log import Logger
+from utils.unicode_helpers import decode_utf8
+
+PHASES = ('metadata', 'checking', 'download', 'finished_hook', 'cleanup')
+
+CHECKING_STATES = (libtorrent.torrent_status.checking_files,
+                   libtorrent.torrent_status.checking_resume_data,
+                   libtorrent.torrent_status.queued_for_checking)
+
+
+class SyncMetrics(object):
+    """Metrics of a single TorrentSyncer session."""
+
+    def __init__(self):
+        super(SyncMetrics, self).__init__()
+
+        self.started_at = time.time()
+        self.last_update = None
+        self.phase_seconds = dict.fromkeys(PHASES, 0.0)
+        self.session = {}
+        self.torrents = {}
+
+        # Values from the previous tick, required to compute rates
+        self._previous = {}
+
+    @contextmanager
+    def phase(self, name):
+        """Add the time spent in the with block to the given phase."""
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.phase_seconds[name] += time.time() - start
+
+    def _get_session_values(self, session):
+        status = session.status()
+        values = {
+            'payload_download_rate': status.payload_download_rate,
+            'payload_upload_rate': status.payload_upload_rate,
+            'payload_downloaded_bytes_total': status.total_payload_download,
+            'payload_uploaded_bytes_total': status.total_payload_upload,
+            'wasted_bytes_total': status.total_redundant_bytes,
+            'hash_failed_bytes_total': status.total_failed_bytes,
+            'peers': status.num_peers,
+        }
+
+        # The cache status fields differ between libtorrent versions
+        cache_status = session.get_cache_status()
+        values['disk_queue_jobs'] = getattr(cache_status, 'job_queue_length',
+                                            getattr(cache_status, 'queued_jobs', 0))
+        values['disk_queue_bytes'] = getattr(cache_status, 'queued_bytes', 0)
+
+        return values
+
+    def _get_torrent_values(self, mod, elapsed):
+        status = mod.status
+        previous = self._previous.get(mod.foldername)
+
+        values = {
+            'state': decode_utf8(status.state.name),
+            'payload_download_rate': status.download_payload_rate,
+            'payload_upload_rate': status.upload_payload_rate,
+            'wasted_bytes_total': status.total_redundant_bytes,
+            'hash_failed_bytes_total': status.total_failed_bytes,
+            'peers': status.num_peers,
+            'seeds': status.num_seeds,
+            'pieces': status.num_pieces,
+            'progress': status.progress,
+            'piece_interval_seconds': 0.0,
+            'checking_rate': 0.0,
+        }
+
+        if previous and elapsed > 0:
+            # Average time between two completed pieces during the last tick
+            new_pieces = status.num_pieces - previous['pieces']
+            if new_pieces > 0:
+                values['piece_interval_seconds'] = elapsed / new_pieces
+
+            if status.state in CHECKING_STATES:
+                checked = (status.progress - previous['progress']) * status.total_wanted
+                values['checking_rate'] = max(checked, 0) / elapsed
+
+        return values
+
+    def _get_tick_phase(self, mods):
+        """Return the phase the whole session is in during this tick."""
+        if not all(mod.torrent_handle.has_metadata() for mod in mods):
+            return 'metadata'
+
+        if any(mod.status.state in CHECKING_STATES for mod in mods):
+            return 'checking'
+
+        if any(mod.status.state == libtorrent.torrent_status.downloading for mod in mods):
+            return 'download'
+
+        return None
+
+    def update(self, session, mods):
+        """Take a snapshot of the session and torrents status.
+        The mods' status is expected to be up to date.
+        """
+        now = time.time()
+        elapsed = now - self.last_update if self.last_update else 0.0
+        self.last_update = now
+
+        mods = [mod for mod in mods if mod.torrent_handle.is_valid()]
+
+        phase = self._get_tick_phase(mods)
+        if phase:
+            self.phase_seconds[phase] += elapsed
+
+        self.session = self._get_session_values(session)
+        self.torrents = {mod.foldername: self._get_torrent_values(mod, elapsed) for mod in mods}
+
+        self.session['checking_rate'] = sum(values['checking_rate'] for values in self.torrents.itervalues())
+        self._previous = {name: {'pieces': values['pieces'], 'progress': values['progress']}
+                          for name, values in self.torrents.iteritems()}
+
+    def as_dict(self):
+        return {
+            'timestamp': self.last_update,
+            'uptime_seconds': time.time() - self.started_at,
+            'phase_seconds': self.phase_seconds,
+            'session': self.session,
+            'torrents': self.torrents,
+        }
+
+    def to_json(self):
+        return json.dumps(self.as_dict(), indent=2, sort_keys=True)
+
+    def to_prometheus(self):
+        """Return the metrics in the Prometheus text exposition format."""
+        lines = []
+
+        def add(name, value, labels=None):
+            label_text = ''
+            if labels:
+                label_text = '{' + ','.join('{}="{}"'.format(key, label.replace('\\', '\\\\').replace('"', '\\"'))
+                                            for key, label in sorted(labels.iteritems())) + '}'
+
+            lines.append('launcher_{}{} {}'.format(name, label_text, repr(float(value))))
+
+        add('uptime_seconds', time.time() - self.started_at)
+
+        for phase in PHASES:
+            add('phase_seconds', self.phase_seconds[phase], {'phase': phase})
+
+        for key, value in sorted(self.session.iteritems()):
+            add('session_{}'.format(key), value)
+
+        for mod_name, values in sorted(self.torrents.iteritems()):
+            for key, value in sorted(values.iteritems()):
+                if key == 'state':
+                    add('torrent_state', 1, {'mod': mod_name, 'state': value})
+                else:
+                    add('torrent_{}'.format(key), value, {'mod': mod_name})
+
+        return '\n'.join(lines) + '\n'
+
+
+class _MetricsRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        exporter = self.server.exporter
+
+        if self.path == '/metrics':
+            body, content_type = exporter.prometheus_text, 'text/plain; version=0.0.4'
+        elif self.path == '/metrics.json':
+            body, content_type = exporter.json_text, 'application/json'
+        else:
+            self.send_error(404)
+            return
+
+        body = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Don't spam the logs on each request
+
+
+class MetricsExporter(object):
+    """Periodically write the metrics to files and serve them on 127.0.0.1."""
+
+    def __init__(self, json_file=None, prometheus_file=None, port=None, interval=10):
+        super(MetricsExporter, self).__init__()
+
+        self.json_file = json_file
+        self.prometheus_file = prometheus_file
+        self.interval = interval
+        self.last_export = 0
+
+        self.json_text = '{}'
+        self.prometheus_text = ''
+
+        self.http_server = None
+        if port:
+            self._start_http_server(port)
+
+    def _start_http_server(self, port):
+        try:
+            self.http_server = BaseHTTPServer.HTTPServer(('127.0.0.1', port), _MetricsRequestHandler)
+
+        except socket.error as ex:
+            # The port may be taken by another launcher instance. The metrics
+            # are still written to the files, if any.
+            Logger.error('Metrics: Could not serve metrics on port {}: {}'.format(port, repr(ex)))
+            return
+
+        self.http_server.exporter = self
+
+        thread = threading.Thread(target=self.http_server.serve_forever, name='MetricsServer')
+        thread.daemon = True
+        thread.start()
+        Logger.info('Metrics: Serving metrics on http://127.0.0.1:{}/metrics'.format(port))
+
+    @classmethod
+    def from_devmode(cls):
+        """Create an exporter configured from devmode.conf or return None if
+        the metrics export has not been enabled.
+        """
+        json_file = devmode.get_metrics_json_file()
+        prometheus_file = devmode.get_metrics_prometheus_file()
+        port = devmode.get_metrics_port()
+
+        if not (json_file or prometheus_file or port):
+            return None
+
+        return cls(json_file, prometheus_file, port, devmode.get_metrics_interval(default=10))
+
+    def export(self, metrics, force=False):
+        """Export the metrics if at least `interval` seconds have passed since
+        the last export.
+        """
+        if not force and time.time() - self.last_export < self.interval:
+            return
+
+        self.last_export = time.time()
+        self.json_text = metrics.to_json()
+        self.prometheus_text = metrics.to_prometheus()
+
+        try:
+            if self.json_file:
+                paths.write_file_atomically(self.json_file, self.json_text.encode('utf-8'))
+
+            if self.prometheus_file:
+                paths.write_file_atomically(self.prometheus_file, self.prometheus_text.encode('utf-8'))
+
+        except (IOError, OSError) as ex:
+            Logger.error('Metrics: Could not write metrics: {}'.format(repr(ex)))
+
+    def close(self):
+        if self.http_server:
+            self.http_server.shutdown()
+            self.http_server.server_close()
+            self.http_server = None
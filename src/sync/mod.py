@@ -16,8 +16,8 @@ from __future__ import unicode_literals
 import external.junctions
 import os
 
-from kivy.logger import Logger
 from torrent_utils import is_complete_quick
+from utils.log import Logger
 
 
 class Mod(object):
@@ -31,7 +31,11 @@ class Mod(object):
             torrent_timestamp='',
             full_name='',
             version='0',
-            up_to_date=None):
+            up_to_date=None,
+            web_seeds=None,
+            web_seed_connections=4,
+            sha1=None,
+            patches=None):
         super(Mod, self).__init__()
 
         self.optional = optional  # Is the mod optional
@@ -43,6 +47,10 @@ class Mod(object):
         self.version = version  # "0.1-alpha6" (optional)
         self.up_to_date = up_to_date
         self.selected = False  # Is the mod selectec if it is set as optional
+        self.web_seeds = web_seeds or []  # ['https://mirror.domain/mods/'] (optional)
+        self.web_seed_connections = web_seed_connections
+        self.sha1 = sha1  # Launcher only: sha1 of the executable (optional)
+        self.patches = patches or {}  # Launcher only: {old executable sha1: patch file name} (optional)
 
     def get_full_path(self):
         return os.path.join(self.parent_location, self.foldername)
@@ -107,10 +115,39 @@ class Mod(object):
         torrent_url = d.get('torrent_url', "")
         version = d.get('version', '0')
         optional = d.get('optional', False)
+        web_seeds = d.get('web-seeds', [])
+        web_seed_connections = d.get('web-seed-connections', 4)
+        sha1 = d.get('sha1')
+        patches = d.get('patches', {})
 
         m = Mod(foldername=foldername, torrent_timestamp=torrent_timestamp,
                 full_name=full_name, torrent_url=torrent_url, version=version,
-                optional=optional)
+                optional=optional, web_seeds=web_seeds,
+                web_seed_connections=web_seed_connections, sha1=sha1, patches=patches)
+        return m
+
+    # Fields sent to the child processes. The runtime state (torrent handle,
+    # status, files list, libtorrent params...) stays in the process that
+    # created it. The torrent itself is read from the mod's MetadataFile.
+    WIRE_FIELDS = ('foldername', 'optional', 'parent_location', 'torrent_url',
+                   'torrent_timestamp', 'full_name', 'version', 'up_to_date',
+                   'selected', 'web_seeds', 'web_seed_connections', 'sha1', 'patches')
+
+    def to_wire(self, memo):
+        """Return the compact representation of the mod. See utils.wire."""
+        data = tuple(getattr(self, field) for field in self.WIRE_FIELDS)
+        return data + (getattr(self, 'is_launcher', False),)
+
+    @classmethod
+    def from_wire(cls, data, memo):
+        """Return a new mod instance constructed from to_wire() data."""
+        m = cls.__new__(cls)
+        for field, value in zip(cls.WIRE_FIELDS, data):
+            setattr(m, field, value)
+
+        if data[-1]:
+            m.is_launcher = True
+
         return m
 
     def __repr__(self):
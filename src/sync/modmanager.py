@@ -20,6 +20,8 @@ from manager_functions import (
     _get_mod_descriptions,
     _prepare_and_check,
     _sync_all,
+    _torrent_url_base,
+    convert_metadata_to_mod,
 )
 
 from preparer import prepare_all
@@ -216,6 +218,7 @@ class ModManager(object):
             Logger.info('ModManager: Got base battleye:\n{}'.format(repr(self.battleye)))
 
     def sync_all(self, seed):
+        all_mods = self.get_mods(include_all_servers=True)
         synced_elements = self.get_mods(only_selected=True)  # Work on the copy
         if self.launcher:
             synced_elements.append(self.launcher)
@@ -232,7 +235,8 @@ class ModManager(object):
                 synced_elements,
                 self.settings.get('max_download_speed'),
                 self.settings.get('max_upload_speed'),
-                seed
+                seed,
+                all_mods
             ),
             'sync',
             then=(None, None, self.on_sync_all_progress),
@@ -241,6 +245,20 @@ class ModManager(object):
 
         return para
 
+    def apply_metadata_changes(self, changes):
+        """Point the mods that got a new torrent (see metadata_diff) to it.
+        The mods are marked as not up to date.
+        """
+        for mod in self.get_mods(include_all_servers=True):
+            description = changes.changed_mods.get(mod.foldername)
+            if description is None:
+                continue
+
+            new_mod = convert_metadata_to_mod(dict(description), _torrent_url_base())
+            mod.torrent_timestamp = new_mod.torrent_timestamp
+            mod.torrent_url = new_mod.torrent_url
+            mod.up_to_date = False
+
     def on_sync_all_progress(self, data, progress):
         Logger.debug('ModManager: Sync progress ' + repr(data))
         # Todo: modlist could be a class of its own
@@ -18,14 +18,13 @@ import os
 import time
 import torrent_utils
 
-from kivy.config import Config
-from kivy.logger import Logger
 from sync import finder
 from utils.devmode import devmode
+from utils.log import Logger, set_log_level
 
 
 default_log_level = devmode.get_log_level('info')
-Config.set('kivy', 'log_level', default_log_level)
+set_log_level(default_log_level)
 
 # Everything in this file is run IN A DIFFERENT PROCESS!
 # To communicate with the main program, you have to use the resolve(), reject()
@@ -0,0 +1,245 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""Pre-download reconciliation of the files already present on disk.
+
+When the files of a mod are renamed or moved to other directories, the new
+torrent contains the same data at different paths. Instead of letting
+libtorrent download everything again (and then removing the old files as
+superfluous), the files already on disk are matched to the new torrent
+entries by their size and hash and are moved to their new paths before the
+download starts.
+"""
+
+from __future__ import unicode_literals
+
+import hashlib
+import os
+import shutil
+
+from collections import defaultdict, namedtuple
+from utils import context, hashes, paths
+from utils.log import Logger
+from utils.unicode_helpers import casefold
+
+TorrentFile = namedtuple('TorrentFile', ['path', 'size', 'offset', 'filehash'])
+
+NULL_HASH = b'\0' * 20
+
+
+def get_torrent_files(torrent_info):
+    """Return the list of TorrentFile entries of the torrent.
+    filehash is None if the torrent has been created without file hashes.
+    """
+    files = []
+
+    for entry in torrent_info.files():
+        filehash = entry.filehash.to_bytes()
+        if filehash == NULL_HASH:
+            filehash = None
+
+        files.append(TorrentFile(entry.path.decode('utf-8'), entry.size, entry.offset, filehash))
+
+    return files
+
+
+def list_files(directory):
+    """Return the full paths of all the files inside the directory."""
+    found = []
+
+    for dirpath, _, filenames in os.walk(directory):
+        for filename in filenames:
+            found.append(os.path.join(dirpath, filename))
+
+    return found
+
+
+class ContentVerifier(object):
+    """Check whether the contents of a local file are the same as the contents
+    of a torrent file entry.
+
+    If the torrent contains file hashes, the whole file is hashed. Otherwise,
+    the pieces that lie entirely inside the file are checked against the
+    torrent piece hashes. Files that are too small to contain a whole piece
+    cannot be verified that way and are never matched.
+    """
+
+    def __init__(self, piece_length=0, piece_hashes=None, total_size=0):
+        super(ContentVerifier, self).__init__()
+        self.piece_length = piece_length
+        self.piece_hashes = piece_hashes or []
+        self.total_size = total_size
+        self._file_hashes = {}
+
+    @classmethod
+    def from_torrent_info(cls, torrent_info):
+        piece_hashes = [torrent_info.hash_for_piece(i) for i in xrange(torrent_info.num_pieces())]
+        return cls(torrent_info.piece_length(), piece_hashes, torrent_info.total_size())
+
+    def _matches_pieces(self, path, torrent_file):
+        if not self.piece_length:
+            return False
+
+        first_piece = (torrent_file.offset + self.piece_length - 1) // self.piece_length
+        file_end = torrent_file.offset + torrent_file.size
+        checked = 0
+
+        with open(path, 'rb') as f:
+            for piece in xrange(first_piece, len(self.piece_hashes)):
+                piece_start = piece * self.piece_length
+                piece_size = min(self.piece_length, self.total_size - piece_start)  # The last one may be shorter
+
+                if piece_start + piece_size > file_end:
+                    break
+
+                f.seek(piece_start - torrent_file.offset)
+                if hashlib.sha1(f.read(piece_size)).digest() != self.piece_hashes[piece]:
+                    return False
+
+                checked += 1
+
+        return checked > 0
+
+    def matches(self, path, torrent_file):
+        if torrent_file.filehash:
+            if path not in self._file_hashes:
+                self._file_hashes[path] = hashes.sha1(path)
+
+            return self._file_hashes[path] == torrent_file.filehash
+
+        return self._matches_pieces(path, torrent_file)
+
+
+def plan_reconciliation(torrent_files, local_files, verifier):
+    """Find local files whose contents match torrent entries missing on disk.
+
+    torrent_files - list of (TorrentFile, destination_full_path) tuples
+    local_files - {full_path: size} of the files present on disk
+    verifier - a ContentVerifier
+
+    Destinations that already exist are skipped and left for libtorrent to
+    check.
+
+    Return {source_full_path: [destination_full_path, ...]}.
+    """
+    present = set(casefold(path) for path in local_files)
+    by_size = defaultdict(list)
+    for path, size in local_files.iteritems():
+        by_size[size].append(path)
+
+    plan = defaultdict(list)
+    for torrent_file, destination in torrent_files:
+        if casefold(destination) in present:
+            continue
+
+        for candidate in by_size.get(torrent_file.size, []):
+            try:
+                if verifier.matches(candidate, torrent_file):
+                    plan[candidate].append(destination)
+                    break
+
+            except (IOError, OSError) as ex:
+                Logger.error('Reconcile: Could not read {}: {}'.format(candidate, repr(ex)))
+
+    return plan
+
+
+def break_stale_hardlinks(torrent_files, verifier):
+    """Replace the hard linked files whose contents differ from what the torrent
+    expects with private copies.
+
+    Files deduplicated between mods are hard links of each other. Libtorrent
+    writing the new contents of such a file would also modify the file of the
+    other mod, so the link has to be broken before the download starts.
+    """
+    for torrent_file, destination in torrent_files:
+        if not os.path.isfile(destination) or paths.get_link_count(destination) < 2:
+            continue
+
+        try:
+            if verifier.matches(destination, torrent_file):
+                continue
+
+        except (IOError, OSError):
+            pass
+
+        Logger.info('Reconcile: Breaking the hard link of {}'.format(destination))
+        tmp_path = destination + '.launcher_tmp'
+
+        try:
+            shutil.copy2(destination, tmp_path)
+            paths.replace_file(tmp_path, destination)
+
+        except EnvironmentError:
+            with context.ignore_nosuchfile_exception():
+                os.unlink(tmp_path)
+            raise
+
+
+def reconcile_mod_files(torrent_info, base_directory, mod_directory, shared_files=None):
+    """Move or copy the files already present in mod_directory to the paths
+    where the torrent expects them, so they don't need to be downloaded again.
+
+    Files that are not part of the torrent anymore are moved. Files that are
+    still required at their current path are copied.
+
+    shared_files - optional {(size, filehash): full_path} of the files of other
+                   complete mods. Missing files found there are hard linked.
+
+    Return the number of bytes that won't have to be downloaded.
+    """
+
+    torrent_files = [(torrent_file, os.path.join(base_directory, torrent_file.path))
+                     for torrent_file in get_torrent_files(torrent_info)]
+    verifier = ContentVerifier.from_torrent_info(torrent_info)
+    bytes_reused = 0
+
+    if os.path.isdir(mod_directory):
+        break_stale_hardlinks(torrent_files, verifier)
+
+        wanted = set(casefold(destination) for _, destination in torrent_files)
+        local_files = {path: os.path.getsize(path) for path in list_files(mod_directory)}
+        plan = plan_reconciliation(torrent_files, local_files, verifier)
+
+        for source, destinations in plan.iteritems():
+            # Superfluous files can be moved to their last destination
+            can_move = casefold(source) not in wanted
+
+            for index, destination in enumerate(destinations):
+                paths.mkdir_p(os.path.dirname(destination))
+
+                if can_move and index == len(destinations) - 1:
+                    Logger.info('Reconcile: Moving {} to {}'.format(source, destination))
+                    os.rename(source, destination)
+                else:
+                    Logger.info('Reconcile: Copying {} to {}'.format(source, destination))
+                    shutil.copy2(source, destination)
+
+                bytes_reused += local_files[source]
+
+    for torrent_file, destination in torrent_files:
+        if not shared_files or not torrent_file.filehash or os.path.lexists(destination):
+            continue
+
+        source = shared_files.get((torrent_file.size, torrent_file.filehash))
+        if not source or not os.path.isfile(source) or os.path.getsize(source) != torrent_file.size:
+            continue
+
+        Logger.info('Reconcile: Linking {} to {}'.format(destination, source))
+        paths.mkdir_p(os.path.dirname(destination))
+        paths.hardlink_or_copy(source, destination)
+        bytes_reused += torrent_file.size
+
+    if bytes_reused:
+        Logger.info('Reconcile: Reused {} bytes already present on disk'.format(bytes_reused))
+
+    return bytes_reused
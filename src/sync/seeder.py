@@ -0,0 +1,280 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""Headless seeding of all the mods described by one or more metadata.json
+files. This is meant to be run as a long-lived daemon on a dedicated seedbox.
+
+Nothing from the gui and view packages may be imported here!
+"""
+
+from __future__ import unicode_literals
+
+import copy
+import hashlib
+import json
+import os
+import posixpath
+import time
+
+from sync import manager_functions
+from sync.torrentsyncer import TorrentSyncer
+from utils.devmode import devmode
+from utils.log import Logger
+
+
+class SeederException(Exception):
+    pass
+
+
+class MetadataSource(object):
+    """A metadata.json file, either on a local disk or on a web server."""
+
+    def __init__(self, location, login=None, password=None, torrent_url_prefix=None):
+        super(MetadataSource, self).__init__()
+        self.location = location
+        self.login = login
+        self.password = password
+        self.torrent_url_prefix = torrent_url_prefix
+
+        if not self.torrent_url_prefix and self.is_url():
+            # http://domain/updater/metadata.json -> http://domain/updater/torrents/
+            self.torrent_url_prefix = posixpath.join(posixpath.dirname(location), 'torrents/')
+
+    def is_url(self):
+        return self.location.startswith(('http://', 'https://'))
+
+    def fetch(self):
+        """Return the parsed contents of the metadata.json file.
+        Raise SeederException on failure.
+        """
+
+        if not self.is_url():
+            try:
+                with open(self.location, 'rb') as f:
+                    return json.load(f)
+
+            except (IOError, ValueError) as ex:
+                raise SeederException('Could not read {}: {}'.format(self.location, repr(ex)))
+
+        queue = SeederQueue()
+        try:
+            data = manager_functions._get_mod_descriptions(queue, self.login, self.password, url=self.location)
+
+        # _get_mod_descriptions may carry on for a while after rejecting
+        except Exception:
+            if not queue.rejected:
+                raise
+
+        if queue.rejected:
+            raise SeederException('Could not fetch {}: {}'.format(self.location, queue.get_reject_message()))
+
+        return data
+
+
+class SeederQueue(object):
+    """Stand-in for the message queue passed to the functions run by Para.
+
+    Progress messages are only logged (and only when they change) and the
+    torrent alerts are dropped right away so that nothing accumulates in
+    memory, no matter how long the seeder is running.
+    """
+
+    def __init__(self, termination_check=None):
+        super(SeederQueue, self).__init__()
+        self.termination_check = termination_check
+        self.last_message = None
+        self.rejected = []
+
+    def progress(self, data, percentage=0):
+        message = data.get('msg')
+        if message and message != self.last_message:
+            Logger.info('Seeder: {}'.format(message))
+            self.last_message = message
+
+    def resolve(self, data=None):
+        pass
+
+    def reject(self, data=None):
+        data = data or {}
+        Logger.error('Seeder: {}'.format(data.get('msg') or data.get('details')))
+        self.rejected.append(data)
+
+    def get_reject_message(self):
+        if not self.rejected:
+            return ''
+
+        return self.rejected[-1].get('msg') or self.rejected[-1].get('details')
+
+    def receive_message(self):
+        if self.termination_check and self.termination_check():
+            return {'command': 'terminate', 'params': None}
+
+        return None
+
+
+class Seeder(object):
+    """Seed all the mods from the metadata sources until stop() is called.
+
+    The metadata sources are polled every refresh_interval seconds. When their
+    contents change, the torrents are reloaded. Resume data is saved every
+    resume_data_interval seconds so that a restart does not require rechecking
+    all the files.
+    """
+
+    retry_delay = 60
+
+    def __init__(self, sources, mods_directory, max_download_speed=0, max_upload_speed=0,
+                 refresh_interval=300, resume_data_interval=900, metrics_exporter=None):
+        super(Seeder, self).__init__()
+
+        self.sources = sources
+        self.mods_directory = mods_directory
+        self.max_download_speed = max_download_speed
+        self.max_upload_speed = max_upload_speed
+        self.refresh_interval = refresh_interval
+        self.resume_data_interval = resume_data_interval
+        self.metrics_exporter = metrics_exporter
+
+        self.stop_requested = False
+        self.metadata_checksum = None
+        self.next_refresh = 0
+
+    def stop(self):
+        Logger.info('Seeder: Stop requested')
+        self.stop_requested = True
+
+    def fetch_metadata(self):
+        """Fetch all the metadata sources.
+        Return a list of (source, metadata) tuples along with the checksum of
+        the whole data.
+        """
+        metadata = [(source, source.fetch()) for source in self.sources]
+        serialized = json.dumps([data for _, data in metadata], sort_keys=True)
+        checksum = hashlib.sha1(serialized).hexdigest()
+
+        return metadata, checksum
+
+    def get_mods(self, metadata):
+        """Return all the mods and server mods from all the metadata entries.
+        Mods present in several metadata files are only seeded once.
+        """
+
+        mods = {}
+        queue = SeederQueue()
+
+        for source, data in metadata:
+            # The parse functions modify the data in place
+            data = copy.deepcopy(data)
+            prefix = source.torrent_url_prefix
+
+            found = manager_functions.parse_mods_data(queue, data, self.mods_directory, prefix)
+
+            if data.get('servers'):
+                for server in manager_functions.parse_servers_data(queue, data, self.mods_directory, prefix):
+                    found.extend(server.mods)
+
+            launcher = manager_functions.parse_launcher_data(queue, data, self.mods_directory, prefix)
+            if launcher:
+                found.append(launcher)
+
+            for mod in found:
+                if mod.foldername in mods and mods[mod.foldername].torrent_url != mod.torrent_url:
+                    Logger.warning('Seeder: {} has different torrents in different metadata files. Using {}'.format(
+                        mod.foldername, mod.torrent_url))
+
+                mods[mod.foldername] = mod
+
+        return mods.values()
+
+    def metadata_changed(self):
+        """Check the metadata sources if the time has come.
+        Any errors are ignored and the old metadata is kept in that case.
+        """
+        if time.time() < self.next_refresh:
+            return False
+
+        self.next_refresh = time.time() + self.refresh_interval
+
+        try:
+            _, checksum = self.fetch_metadata()
+
+        except Exception as ex:
+            Logger.error('Seeder: Could not refresh metadata: {}'.format(repr(ex)))
+            return False
+
+        if checksum != self.metadata_checksum:
+            Logger.info('Seeder: Metadata has changed. Reloading torrents.')
+            return True
+
+        return False
+
+    def should_terminate(self):
+        return self.stop_requested or self.metadata_changed()
+
+    def seed_once(self):
+        """Fetch the metadata and seed all the mods until termination is
+        requested or the metadata changes.
+        Return whether all the torrents have been seeded without errors.
+        """
+
+        metadata, self.metadata_checksum = self.fetch_metadata()
+        self.next_refresh = time.time() + self.refresh_interval
+
+        mods = self.get_mods(metadata)
+        Logger.info('Seeder: Seeding {} mods to {}'.format(len(mods), self.mods_directory))
+
+        queue = SeederQueue(termination_check=self.should_terminate)
+        syncer = TorrentSyncer(queue, mods, self.max_download_speed, self.max_upload_speed)
+        syncer.resume_data_interval = self.resume_data_interval
+        syncer.metrics_exporter = self.metrics_exporter
+
+        # Libtorrent only keeps a handful of torrents active by default
+        syncer.update_session_settings(active_downloads=len(mods),
+                                       active_seeds=len(mods),
+                                       active_limit=len(mods))
+
+        ip_whitelist = devmode.get_ip_whitelist(default=[])
+        if ip_whitelist:
+            Logger.info('Seeder: Setting whitelist: {}'.format(ip_whitelist))
+            syncer.set_whitelist_filter(ip_whitelist)
+
+        sync_ok = syncer.sync(keep_seeding=True)
+
+        return sync_ok is not False and not queue.rejected
+
+    def run(self):
+        """Seed until stop() is called."""
+
+        if not os.path.isdir(self.mods_directory):
+            raise SeederException('Mods directory does not exist: {}'.format(self.mods_directory))
+
+        while not self.stop_requested:
+            try:
+                successful = self.seed_once()
+
+            except SeederException as ex:
+                Logger.error('Seeder: {}'.format(ex.args[0]))
+                successful = False
+
+            except Exception as ex:
+                Logger.error('Seeder: Unexpected error: {}'.format(repr(ex)))
+                successful = False
+
+            if successful or self.stop_requested:
+                continue
+
+            Logger.info('Seeder: Retrying in {} seconds'.format(self.retry_delay))
+            deadline = time.time() + self.retry_delay
+            while not self.stop_requested and time.time() < deadline:
+                time.sleep(1)
+
+        Logger.info('Seeder: Stopped')
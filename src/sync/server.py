@@ -13,6 +13,9 @@
 
 from __future__ import unicode_literals
 
+from utils import wire
+
+
 class Server(object):
     """Encapsulate data needed for a server"""
 
@@ -66,6 +69,24 @@ class Server(object):
 
         return server
 
+    WIRE_FIELDS = ('name', 'ip', 'port', 'password', 'teamspeak', 'battleye',
+                   'selected', 'background')
+
+    def to_wire(self, memo):
+        """Return the compact representation of the server. See utils.wire."""
+        data = tuple(getattr(self, field) for field in self.WIRE_FIELDS)
+        return data + (wire.encode_field(self.mods, memo),)
+
+    @classmethod
+    def from_wire(cls, data, memo):
+        """Return a new server instance constructed from to_wire() data."""
+        server = cls.__new__(cls)
+        for field, value in zip(cls.WIRE_FIELDS, data):
+            setattr(server, field, value)
+
+        server.mods = wire.decode_field(data[-1], memo)
+        return server
+
     def __repr__(self):
         mods_repr = ''
         if self.mods:
@@ -16,22 +16,34 @@ import errno
 import inspect
 import json
 import launcher_config
+import multiprocessing
 import os
+import shutil
 import textwrap
 import time
 
 from collections import OrderedDict
-from kivy.logger import Logger
-from kivy.config import Config
 from manager_functions import _torrent_url_base
 from sync import torrent_utils
 from sync import manager_functions
+from sync.integrity import is_whitelisted
 from utils.devmode import devmode
+from utils import delta
+from utils import hashes
+from utils import process
 from utils import pypeeker
 from utils import remote
+from utils.log import Logger, set_log_level
+
+# Creating more torrents at the same time makes the disk the bottleneck
+DEFAULT_MAX_TORRENT_WORKERS = 4
+
+# Previous launcher executables are kept there to make patches from them
+LAUNCHER_RELEASES_DIRECTORY = 'launcher_releases'
+KEEP_LAUNCHER_RELEASES = 3
 
 default_log_level = devmode.get_log_level('info')
-Config.set('kivy', 'log_level', default_log_level)
+set_log_level(default_log_level)
 
 ################################################################################
 ################################## ATTENTION!!! ################################
@@ -57,6 +69,8 @@ if devmode.get_create_torrents():
     metadata_file = devmode.get_server_metadata_filename('metadata.json')
     torrents_path = devmode.get_server_torrents_path(mandatory=True)
     server_delay = devmode.get_server_torrent_delay(0)
+    sftp_channels = devmode.get_server_sftp_channels(remote.DEFAULT_CHANNELS)
+    web_seed_mirrors = devmode.get_web_seed_mirrors([])
 
 
 # Note: this is using an experimental message passing method and should be moved
@@ -146,12 +160,10 @@ def _make_torrent(message_queue, launcher_basedir, mods):
         message_queue.reject({'msg': 'torrent_tracker_urls cannot be empty!'})
         return
 
-    mods_created = []
+    mods_to_build = []
+    jobs = []
 
-    counter = 0
     for mod in mods:
-        counter += 1
-
         if mod.is_complete():
             Logger.info('make_torrent: Mod {} is up to date, skipping...'.format(mod.foldername))
             continue
@@ -168,14 +180,23 @@ def _make_torrent(message_queue, launcher_basedir, mods):
             Logger.error('make_torrent: Directory does not exist! Skipping. Directory: {}'.format(directory))
             continue
 
-        message_queue.progress({'msg': 'Creating file: {}'.format(output_file)}, counter / len(mods))
-        file_created = torrent_utils.create_torrent(directory, announces, output_path, comment, web_seeds)
+        mods_to_build.append((mod, output_file, timestamp))
+        jobs.append((output_file, directory, announces, output_path, comment, web_seeds))
+
+    files_created = build_torrents(message_queue, jobs)
+
+    mods_created = []
+    for (mod, output_file, timestamp), file_created in zip(mods_to_build, files_created):
         with file(file_created, 'rb') as f:
             mod.torrent_content = f.read()
         mod.torrent_url = '{}{}'.format(_torrent_url_base(), output_file)
         mods_created.append((mod, file_created, output_file, timestamp))
         Logger.info('make_torrent: New torrent for mod {} created!'.format(mod.foldername))
 
+        if hasattr(mod, 'is_launcher'):
+            message_queue.progress({'msg': 'Creating launcher update patches...'}, 1)
+            create_launcher_patches(launcher_basedir, mod, timestamp)
+
     if mods_created:
         mods_user_friendly_list = []
         for mod, _, _, _ in mods_created:
@@ -206,10 +227,149 @@ def _make_torrent(message_queue, launcher_basedir, mods):
         for mod, _, _, _ in mods_created:
             torrent_utils.set_torrent_complete(mod)
 
+            if hasattr(mod, 'is_launcher'):
+                keep_launcher_release(launcher_basedir, mod)
+
     message_queue.resolve({'msg': 'Torrents created: {}'.format(len(mods_created)),
                            'mods_created': len(mods_created)})
 
 
+def get_torrent_creation_workers(jobs_count):
+    """Return the number of processes creating the torrents at the same time.
+    Hashing is limited by the disk as much as by the CPU, hence the cap.
+    """
+
+    default = min(multiprocessing.cpu_count(), DEFAULT_MAX_TORRENT_WORKERS)
+    workers = devmode.get_torrent_creation_workers(default=default)
+
+    return max(1, min(workers, jobs_count))
+
+
+def _build_torrent(job, report_progress):
+    """Create the torrent described by the job. Run by map_in_processes().
+    Return the path to the created file.
+    """
+
+    output_file, directory, announces, output_path, comment, web_seeds = job
+    reported = [0]
+
+    def on_progress(fraction):
+        # Only report every percent, there may be hundreds of thousands of pieces
+        if fraction - reported[0] < 0.01 and fraction < 1:
+            return
+
+        reported[0] = fraction
+        report_progress(fraction)
+
+    return torrent_utils.create_torrent(directory, announces, output_path, comment, web_seeds,
+                                        progress_callback=on_progress)
+
+
+def build_torrents(message_queue, jobs):
+    """Create the torrents for all the jobs, on as many processes as
+    get_torrent_creation_workers() allows. The progress of each torrent is
+    reported through the message_queue.
+    Return the list of the created files, in the order of the jobs.
+    """
+
+    if not jobs:
+        return []
+
+    def report_progress(index, fraction, total_fraction):
+        output_file = jobs[index][0]
+        message_queue.progress({'msg': 'Creating file: {} ({:.0%})'.format(output_file, fraction),
+                                'file': output_file,
+                                'file_progress': fraction},
+                               total_fraction)
+
+    workers = get_torrent_creation_workers(len(jobs))
+    Logger.info('build_torrents: Creating {} torrents using {} processes'.format(len(jobs), workers))
+
+    return process.map_in_processes(_build_torrent, jobs, workers, report_progress)
+
+
+def get_launcher_executable(mod):
+    return os.path.join(mod.get_full_path(), launcher_config.executable_name + '.exe')
+
+
+def get_launcher_releases(launcher_basedir):
+    """Return the paths to the kept launcher executables, newest first."""
+
+    directory = os.path.join(launcher_basedir, LAUNCHER_RELEASES_DIRECTORY)
+    if not os.path.isdir(directory):
+        return []
+
+    releases = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.exe')]
+    return sorted(releases, key=os.path.getmtime, reverse=True)
+
+
+def _create_launcher_patch(job, report_progress):
+    """Write the patch turning the old executable into the new one. Run by
+    map_in_processes(). Return the size of the patch.
+    """
+
+    old_executable, new_executable, patch_path = job
+
+    with open(patch_path, 'wb') as f:
+        f.write(delta.create_patch(old_executable, new_executable))
+
+    return os.path.getsize(patch_path)
+
+
+def create_launcher_patches(launcher_basedir, mod, timestamp):
+    """Create the patches turning the previous launcher executables into the
+    new one, on as many processes as get_torrent_creation_workers() allows.
+    The patches are saved next to the torrents.
+    Set mod.sha1, mod.patches and mod.patch_files.
+    """
+
+    new_executable = get_launcher_executable(mod)
+    mod.sha1 = hashes.sha1(new_executable, human_readable=True)
+    mod.patches = {}
+    mod.patch_files = []
+
+    jobs = []
+    for old_executable in get_launcher_releases(launcher_basedir)[:KEEP_LAUNCHER_RELEASES]:
+        old_sha1 = os.path.splitext(os.path.basename(old_executable))[0]
+        if old_sha1 == mod.sha1:
+            continue
+
+        patch_file = '{}-{}-{}.patch'.format(mod.foldername, timestamp, old_sha1[:12])
+        patch_path = os.path.join(launcher_basedir, patch_file)
+        jobs.append((old_executable, new_executable, patch_path))
+
+        mod.patches[old_sha1] = patch_file
+        mod.patch_files.append((patch_path, patch_file))
+
+    if not jobs:
+        return
+
+    Logger.info('make_torrent: Creating {} launcher patches...'.format(len(jobs)))
+    sizes = process.map_in_processes(_create_launcher_patch, jobs, get_torrent_creation_workers(len(jobs)))
+
+    for (_, patch_file), size in zip(mod.patch_files, sizes):
+        Logger.info('make_torrent: Patch {} created: {} bytes'.format(patch_file, size))
+
+
+def keep_launcher_release(launcher_basedir, mod):
+    """Keep a copy of the published launcher executable, to make the patches
+    of the next version. Only the last few versions are kept.
+    """
+
+    directory = os.path.join(launcher_basedir, LAUNCHER_RELEASES_DIRECTORY)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    new_executable = get_launcher_executable(mod)
+    sha1 = mod.sha1 or hashes.sha1(new_executable, human_readable=True)
+    release_path = os.path.join(directory, '{}.exe'.format(sha1))
+    shutil.copyfile(new_executable, release_path)
+    os.utime(release_path, None)  # Make it the newest release
+
+    for old_release in get_launcher_releases(launcher_basedir)[KEEP_LAUNCHER_RELEASES:]:
+        os.unlink(old_release)
+
+
 def get_new_launcher_version(mod):
     """Return the real version of the launcher, stored on disk and pointed to by
     mod.
@@ -245,6 +405,11 @@ def update_metadata_json(metadata_json_orig, mods_created):
                 # Get the new mod version
                 tree['launcher']['version'] = get_new_launcher_version(mod)
 
+                # The patches from the previous versions, if any
+                if getattr(mod, 'sha1', None):
+                    tree['launcher']['sha1'] = mod.sha1
+                    tree['launcher']['patches'] = mod.patches
+
         # Perform the per-server mods update
         # Note: update the hidden servers, if present
         for server in tree.get('servers', []) + tree.get('hidden_servers', []):
@@ -256,6 +421,71 @@ def update_metadata_json(metadata_json_orig, mods_created):
     return metadata_json_modified
 
 
+def get_torrents_to_remove(remote_file_names, mods_created):
+    """Return the paths of the old torrents of the created mods, given the
+    list of the files present in the remote torrents directory.
+    """
+
+    new_file_names = set(file_name for _, _, file_name, _ in mods_created)
+    to_remove = []
+
+    for mod, _, _, _ in mods_created:
+        new_file_names.update(file_name for _, file_name in getattr(mod, 'patch_files', []))
+
+    for remote_file_name in remote_file_names:
+        if remote_file_name.endswith('.patch') and remote_file_name not in new_file_names:
+            # Patches to the previous launcher version are not needed anymore
+            if any(remote_file_name.startswith(mod.foldername + '-') and hasattr(mod, 'is_launcher')
+                   for mod, _, _, _ in mods_created):
+                to_remove.append(remote.join(torrents_path, remote_file_name))
+            continue
+
+        if not remote_file_name.endswith('.torrent'):
+            continue
+
+        # Overwritten by the upload anyway. Removing it while it's being
+        # uploaded could remove the new torrent
+        if remote_file_name in new_file_names:
+            continue
+
+        for mod, _, file_name, _ in mods_created:
+            if not remote_file_name.startswith(mod.foldername):
+                continue
+
+            if len(remote_file_name) != len(file_name):
+                continue
+
+            # Got the file[s] to remove
+            to_remove.append(remote.join(torrents_path, remote_file_name))
+            break
+
+    return to_remove
+
+
+def mirror_mods(message_queue, mods_created):
+    """Copy the data of the created mods to all the web seed hosts.
+    Only the files and the blocks that changed are sent.
+    """
+
+    file_filter = lambda path: not is_whitelisted(path)
+
+    for mirror in web_seed_mirrors:
+        Logger.info('mirror_mods: Mirroring mods to {}...'.format(mirror['host']))
+
+        with remote.RemoteConection(mirror['host'], mirror['username'], mirror['password'],
+                                    mirror.get('port', 22)) as connection:
+
+            for mod, _, _, _ in mods_created:
+                message_queue.progress({'msg': 'Sending {} to {}...'.format(mod.foldername, mirror['host'])}, 1)
+
+                stats = connection.mirror_directory(
+                    os.path.join(mod.parent_location, mod.foldername),
+                    remote.join(mirror['path'], mod.foldername),
+                    file_filter=file_filter, channels=sftp_channels)
+
+                Logger.info('mirror_mods: {} sent to {}: {}'.format(mod.foldername, mirror['host'], stats))
+
+
 def perform_update(message_queue, mods_created):
     """Connect to the remote server, remove old, unused torrents, push newly
     created torrents and update metadata.json to use them.
@@ -283,36 +513,46 @@ def perform_update(message_queue, mods_created):
 
         metadata_json_updated = update_metadata_json(metadata_json, mods_created)
 
-        # Delete old torrents
-        message_queue.progress({'msg': 'Deleting old torrents...'}, 1)
-        Logger.info('perform_update: Deleting old torrents...')
-        for mod, local_file_path, file_name, _ in mods_created:
-            for remote_file_name in connection.list_files(torrents_path):
-                if not remote_file_name.endswith('.torrent'):
-                    continue
+        # The web seeds must have the data before the torrents point to it
+        mirror_mods(message_queue, mods_created)
 
-                if not remote_file_name.startswith(mod.foldername):
-                    continue
+        removals = get_torrents_to_remove(connection.list_files(torrents_path), mods_created)
+        uploads = [(local_file_path, remote.join(torrents_path, file_name))
+                   for _, local_file_path, file_name, _ in mods_created]
 
-                if len(remote_file_name) != len(file_name):
-                    continue
+        for mod, _, _, _ in mods_created:
+            uploads.extend((local_file_path, remote.join(torrents_path, file_name))
+                           for local_file_path, file_name in getattr(mod, 'patch_files', []))
 
-                # Got the file[s] to remove
-                file_path = remote.join(torrents_path, remote_file_name)
-                connection.remove_file(file_path)
+        def on_file_done(action, remote_path, size, seconds):
+            file_name = remote_path.rsplit('/', 1)[-1]
+
+            if action == 'put':
+                message = 'Pushed {} ({:.0f} KB/s)'.format(file_name, size / 1024.0 / max(seconds, 0.001))
+            else:
+                message = 'Deleted {}'.format(file_name)
+
+            message_queue.progress({'msg': message}, 1)
 
-        # Sleep custom amount of time
         if server_delay:
+            # Delete old torrents
+            message_queue.progress({'msg': 'Deleting old torrents...'}, 1)
+            Logger.info('perform_update: Deleting old torrents...')
+            connection.transfer_files(removals=removals, channels=sftp_channels, callback=on_file_done)
+
+            # Sleep custom amount of time
             message_queue.progress({'msg': 'Waiting {} seconds...'.format(server_delay)}, 1)
             Logger.info('perform_update: Sleeping {} seconds...'.format(server_delay))
             time.sleep(devmode.get_server_torrent_timeout(server_delay))
 
-        # Push new torrents
+            removals = []
+
+        # Push new torrents (and delete the old ones at the same time, if no
+        # delay is required between the two)
         message_queue.progress({'msg': 'Pushing new torrents...'}, 1)
         Logger.info('perform_update: Pushing new torrents...')
-        for mod, local_file_path, file_name, _ in mods_created:
-            remote_torrent_path = remote.join(torrents_path, file_name)
-            connection.put_file(local_file_path, remote_torrent_path)
+        connection.transfer_files(uploads=uploads, removals=removals,
+                                  channels=sftp_channels, callback=on_file_done)
 
         message_queue.progress({'msg': 'Updating modified metadata.json...'}, 1)
         Logger.info('perform_update: Updated metadata.json:\n{}'.format(metadata_json_updated))
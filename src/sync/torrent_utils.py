@@ -19,8 +19,7 @@ import subprocess
 import sys
 import textwrap
 
-import libtorrent
-from kivy.logger import Logger
+from utils.log import Logger
 
 from sync.integrity import check_mod_directories, check_files_mtime_correct, are_ts_plugins_installed, is_whitelisted
 from utils import paths
@@ -98,6 +97,7 @@ def is_complete_quick(mod):
     if not resume_data_bencoded:
         Logger.info('Is_complete: Could not get resume data. Marking as not complete')
         return False
+    import libtorrent  # Only the processes that need it pay for importing it
     resume_data = libtorrent.bdecode(resume_data_bencoded)
 
     # (4)
@@ -127,6 +127,7 @@ def is_complete_quick(mod):
 
 def get_torrent_info_from_bytestring(bencoded):
     """Get torrent metadata from a bencoded string and return info structure."""
+    import libtorrent
 
     torrent_metadata = libtorrent.bdecode(bencoded)
     torrent_info = libtorrent.torrent_info(torrent_metadata)
@@ -458,6 +459,7 @@ def symlink_mod(mod_full_path, real_location):
 
 def create_add_torrent_flags(just_seed=False):
     """Create default flags for adding a new torrent to a syncer."""
+    import libtorrent
     f = libtorrent.add_torrent_params_flags_t
 
     flags = 0
@@ -478,7 +480,13 @@ def create_add_torrent_flags(just_seed=False):
     return flags
 
 
-def create_torrent(directory, announces=None, output=None, comment=None, web_seeds=None):
+def create_torrent(directory, announces=None, output=None, comment=None, web_seeds=None,
+                   progress_callback=None):
+    """Create a torrent file for the directory.
+    progress_callback(fraction), if given, is called as the pieces are hashed.
+    """
+    import libtorrent
+
     if not output:
         output = directory + ".torrent"
 
@@ -507,7 +515,12 @@ def create_torrent(directory, announces=None, output=None, comment=None, web_see
         t.add_url_seed(unicode_helpers.encode_utf8(web_seed))
     # t.add_http_seed("http://...")
 
-    libtorrent.set_piece_hashes(t, unicode_helpers.encode_utf8(os.path.dirname(directory)))
+    base_path = unicode_helpers.encode_utf8(os.path.dirname(directory))
+    if progress_callback:
+        num_pieces = float(max(t.num_pieces(), 1))
+        libtorrent.set_piece_hashes(t, base_path, lambda piece: progress_callback((piece + 1) / num_pieces))
+    else:
+        libtorrent.set_piece_hashes(t, base_path)
 
     with open(output, "wb") as file_handle:
         file_handle.write(libtorrent.bencode(t.generate()))
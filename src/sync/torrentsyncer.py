@@ -27,16 +27,19 @@ if __name__ == "__main__":
 
 
 import libtorrent
+import reconcile
 import textwrap
 import torrent_utils
+import webseed
 
-from kivy.logger import Logger
 from sync.integrity import check_mod_directories
+from sync.metrics import SyncMetrics
 from utils import requests_wrapper
 from utils.eta import Eta
+from utils.log import Logger
 from utils.metadatafile import MetadataFile
 from utils.unicode_helpers import decode_utf8, encode_utf8
-from time import sleep
+from time import sleep, time
 
 
 class PrepareParametersException(Exception):
@@ -46,6 +49,12 @@ class PrepareParametersException(Exception):
 class TorrentSyncer(object):
     _update_interval = 1
     session = None
+    resume_data_interval = None  # Periodically save resume data every X seconds
+    metrics_exporter = None  # Set to a MetricsExporter to export self.metrics
+    shared_files = None  # {(size, filehash): path} of files of other mods that may be reused
+    web_seed_delay = 30  # Fall back to the web seeds after the swarm is empty for X seconds
+    torrent_cache_max_age = 30 * 24 * 60 * 60  # The torrent urls contain the timestamp: cache them
+    updated_mod_hook = None  # Called with each mod replaced by update_mods() once synced. Return False on failure
 
     def __init__(self, result_queue, mods, max_download_speed=0, max_upload_speed=0):
         """
@@ -63,13 +72,21 @@ class TorrentSyncer(object):
         self.result_queue = result_queue
         self.mods = mods
         self.force_termination = False
+        self.metrics = SyncMetrics()
+        self.updated_mods = set()  # Mods replaced while syncing, not reported as synced yet
 
         for m in mods:
-            m.finished_hook_ran = False
-            m.can_save_resume_data = False
+            self.init_mod_state(m)
 
         self.init_libtorrent(max_download_speed, max_upload_speed)
 
+    def init_mod_state(self, mod):
+        mod.finished_hook_ran = False
+        mod.can_save_resume_data = False
+        mod.web_seed_job = None
+        mod.web_seed_attempted = False
+        mod.swarm_empty_since = None
+
     def init_libtorrent(self, max_download_speed=0, max_upload_speed=0):
         """Perform the initialization of things that should be initialized once"""
         if self.session:
@@ -110,6 +127,14 @@ class TorrentSyncer(object):
 
         return torrent_log
 
+    def update_session_settings(self, **kwargs):
+        """Change the settings of the running session.
+        Only the settings passed as keyword arguments are modified.
+        """
+        session_settings = self.session.get_settings()
+        session_settings.update(kwargs)
+        self.session.set_settings(session_settings)
+
     def set_whitelist_filter(self, whitelisted):
         """Set an IP whitelist so that the torrent client will ONLY seed (and
         download from) those IPs.
@@ -200,6 +225,8 @@ class TorrentSyncer(object):
             session_actual_peers += mod.status.num_peers
             if mod.status.state == libtorrent.torrent_status.checking_files:
                 action = 'Checking missing pieces:'
+            elif mod.web_seed_job and action == syncing_message:
+                action = 'Downloading from the mirror:'
 
         if action == syncing_message:
             ETA = self.eta.calculate_eta(status.payload_download_rate, total_size, downloaded_size)
@@ -237,6 +264,13 @@ class TorrentSyncer(object):
         if download_fraction != 1:
             Logger.info('Progress: {}'.format(progress_message))
 
+    def update_metrics(self, force_export=False):
+        """Update the session metrics and export them if required."""
+        self.metrics.update(self.session, self.mods)
+
+        if self.metrics_exporter:
+            self.metrics_exporter.export(self.metrics, force=force_export)
+
     def get_mod_torrent_metadata(self, mod, metadata_file):
         """Retrieve torrent metadata either from the metadata_file or from associated the file, if not present.
         return torrent_info, torrent_contents
@@ -271,7 +305,9 @@ class TorrentSyncer(object):
             else:  # Torrent from url
                 try:
                     Logger.info('TorrentSyncer: Fetching torrent: {}'.format(mod.torrent_url))
-                    res = requests_wrapper.download_url(None, mod.torrent_url, timeout=5)
+                    res = requests_wrapper.download_url_cached(None, mod.torrent_url,
+                                                               max_age=self.torrent_cache_max_age,
+                                                               timeout=5)
                 except requests_wrapper.DownloadException as ex:
                     error_message = 'Downloading metadata: {}'.format(ex.args[0])
                     raise PrepareParametersException(error_message)
@@ -366,6 +402,17 @@ class TorrentSyncer(object):
             # hurt to do that again in case something changed in the meantime.
             torrent_utils.prepare_mod_directory(mod.get_full_path())
 
+            # A new version of the torrent: reuse the files that have only
+            # been renamed or moved instead of downloading them again
+            if not resume_data:
+                try:
+                    reconcile.reconcile_mod_files(torrent_info, mod.parent_location, mod.get_full_path(),
+                                                  self.shared_files)
+
+                except (IOError, OSError) as ex:
+                    Logger.error('TorrentSyncer: Could not reuse existing files of {}: {}'.format(
+                        mod.foldername, repr(ex)))
+
     def get_torrents_status(self):
         """Get the status of all torrents with valid handles and cache them in
         the TorrentSyncer class.
@@ -462,13 +509,135 @@ class TorrentSyncer(object):
 
             self.session.set_settings(session_settings)
 
-    def sync(self, force_sync=False, just_seed=False):
+        elif command == 'update_mods':
+            self.update_mods(params)
+
+    def update_mods(self, new_mods):
+        """Replace the torrents of the mods that got a new torrent while
+        syncing. The torrents of the other mods are not touched and keep
+        seeding.
+        """
+        for new_mod in new_mods:
+            old_mod = next((mod for mod in self.mods if mod.foldername == new_mod.foldername), None)
+            if old_mod is None:
+                Logger.info('Sync: Not syncing {}. Ignoring its update'.format(new_mod.foldername))
+                continue
+
+            Logger.info('Sync: Replacing the torrent of {} with {}'.format(old_mod.foldername, new_mod.torrent_url))
+
+            if old_mod.web_seed_job:
+                old_mod.web_seed_job.stop()
+                old_mod.web_seed_job.join()
+                old_mod.web_seed_job = None
+
+            if old_mod.torrent_handle.is_valid():
+                self.pause_torrent(old_mod)
+                self.session.remove_torrent(old_mod.torrent_handle)
+
+            self.init_mod_state(new_mod)
+
+            try:
+                self.prepare_libtorrent_params(new_mod)
+            except (PrepareParametersException, torrent_utils.AdminRequiredError) as ex:
+                self.result_queue.reject({'msg': ex.args[0]})
+                self.force_termination = True
+                return
+
+            new_mod.torrent_handle = self.session.add_torrent(new_mod.libtorrent_params)
+            new_mod.status = new_mod.torrent_handle.status()
+
+            self.mods[self.mods.index(old_mod)] = new_mod
+            self.updated_mods.add(new_mod.foldername)
+
+    def start_web_seed_download(self, mod):
+        """Pause the torrent and download its missing pieces from the web seeds
+        in the background.
+        """
+        missing = [piece for piece, have in enumerate(mod.status.pieces) if not have]
+        if not missing:
+            return
+
+        Logger.info('Sync: Nobody is seeding {}. Downloading {} pieces from the web seeds'.format(
+            mod.foldername, len(missing)))
+
+        layout = webseed.TorrentLayout.from_torrent_info(mod.torrent_handle.get_torrent_info())
+        downloader = webseed.WebSeedDownloader(layout, mod.parent_location, mod.web_seeds,
+                                               connections=mod.web_seed_connections)
+
+        # Libtorrent must not touch the files while they are written
+        self.pause_torrent(mod)
+        mod.web_seed_job = webseed.WebSeedJob(downloader, missing)
+        mod.web_seed_job.start()
+
+    def finish_web_seed_download(self, mod):
+        """Resume the torrent and let libtorrent pick up the downloaded pieces."""
+        downloaded = mod.web_seed_job.downloader.downloaded
+        mod.web_seed_job = None
+
+        if self.force_termination:
+            return
+
+        self.resume_torrent(mod)
+
+        if downloaded:
+            # Don't save the resume data until the torrent has been rechecked
+            mod.can_save_resume_data = False
+            mod.torrent_handle.force_recheck()
+
+    def check_web_seed_fallback(self, mod):
+        """Fall back to the web seeds of the mod (once) if the torrent has been
+        downloading without any seeds for web_seed_delay seconds.
+        """
+        if mod.web_seed_job:
+            if self.force_termination:
+                mod.web_seed_job.stop()
+
+            if not mod.web_seed_job.is_alive():
+                self.finish_web_seed_download(mod)
+
+            return
+
+        if not getattr(mod, 'web_seeds', None) or mod.web_seed_attempted or self.force_termination:
+            return
+
+        if mod.status.state != libtorrent.torrent_status.downloading or mod.status.num_seeds > 0:
+            mod.swarm_empty_since = None
+            return
+
+        if mod.swarm_empty_since is None:
+            mod.swarm_empty_since = time()
+            return
+
+        if time() - mod.swarm_empty_since >= self.web_seed_delay:
+            mod.web_seed_attempted = True
+            self.start_web_seed_download(mod)
+
+    def stop_web_seed_downloads(self):
+        """Wait until no web seed download is writing to the disk anymore."""
+        for mod in self.mods:
+            if mod.web_seed_job:
+                mod.web_seed_job.stop()
+                mod.web_seed_job.join()
+                mod.web_seed_job = None
+
+    def checkpoint_resume_data(self):
+        """Save the resume data of all the torrents that are done downloading.
+        This allows a long running session to be restarted quickly even if it
+        has not been shut down cleanly.
+        """
+        for mod in self.mods:
+            if mod.finished_hook_ran and mod.torrent_handle.is_valid():
+                self.save_resume_data(mod)
+
+    def sync(self, force_sync=False, just_seed=False, keep_seeding=False):
         """
         Synchronize the mod directory contents to contain exactly the files that
         are described in the torrent file.
 
         force_sync - Assume no resume data is available. Manually recheck all the
                      checksums for all the files in the torrent description.
+        keep_seeding - Don't stop when all the torrents are synced but keep
+                       seeding them until termination is requested.
 
         Individual torrent states:
         1) Downloading    -> Wait until it starts seeding
@@ -485,13 +654,14 @@ class TorrentSyncer(object):
                                     'log': [],
                                     }, 0)
 
-        for mod in self.mods:
-            try:
-                self.prepare_libtorrent_params(mod, force_sync, just_seed)
-            except (PrepareParametersException, torrent_utils.AdminRequiredError) as ex:
-                self.result_queue.reject({'msg': ex.args[0]})
-                sync_success = False
-                return sync_success
+        with self.metrics.phase('metadata'):
+            for mod in self.mods:
+                try:
+                    self.prepare_libtorrent_params(mod, force_sync, just_seed)
+                except (PrepareParametersException, torrent_utils.AdminRequiredError) as ex:
+                    self.result_queue.reject({'msg': ex.args[0]})
+                    sync_success = False
+                    return sync_success
 
         if self.force_termination:
             Logger.info('Sync: Downloading process was requested to stop before starting the download.')
@@ -507,12 +677,18 @@ class TorrentSyncer(object):
         self.get_torrents_status()
 
         self.eta = Eta()
+        last_checkpoint = time()
 
         # Loop until state (5). All torrents finished and paused
         while not self.is_syncing_finished():
             self.handle_messages()
 
+            if self.resume_data_interval and time() - last_checkpoint > self.resume_data_interval:
+                self.checkpoint_resume_data()
+                last_checkpoint = time()
+
             self.log_session_progress()
+            self.update_metrics()
 
             for mod in self.mods:
                 if not mod.torrent_handle.is_valid():
@@ -536,6 +712,8 @@ class TorrentSyncer(object):
                                         libtorrent.torrent_status.seeding):
                     mod.can_save_resume_data = True
 
+                self.check_web_seed_fallback(mod)
+
                 # Shut the torrent if we are terminating
                 if self.force_termination:
                     if not mod.torrent_handle.is_paused():  # Don't spam logs
@@ -552,16 +730,8 @@ class TorrentSyncer(object):
                 if not mod.finished_hook_ran and mod.torrent_handle.is_seed() and mod.torrent_handle.is_paused():
                     Logger.info('Sync: Torrent {} paused. Running finished_hook'.format(mod.foldername))
 
-                    hook_successful = self.torrent_finished_hook(mod)
-                    if not hook_successful:
-                        self.result_queue.reject({'msg': 'Could not perform mod {} cleanup. Make sure the files are not in use by another program.'
-                                                  .format(mod.foldername)})
-                        Logger.info('Sync: Could not perform mod {} cleanup. Make sure the files are not in use by another program.'
-                                    .format(mod.foldername))
+                    if not self.run_finished_hook(mod):
                         sync_success = False
-                        self.force_termination = True
-
-                    mod.finished_hook_ran = True
 
                     # Do not go into state (4) if we are terminating
                     if not self.force_termination:
@@ -569,7 +739,7 @@ class TorrentSyncer(object):
                         self.resume_torrent(mod)
 
             # If all are in state (4)
-            if self.all_torrents_ran_finished_hooks() and not just_seed:
+            if self.all_torrents_ran_finished_hooks() and not just_seed and not keep_seeding:
                 Logger.info('Sync: Pausing all torrents for syncing end.')
                 self.pause_all_torrents()
 
@@ -577,22 +747,60 @@ class TorrentSyncer(object):
             self.get_torrents_status()
 
         Logger.info('Sync: Main loop exited')
+        self.stop_web_seed_downloads()
 
-        for mod in self.mods:
-            if not mod.torrent_handle.is_valid():
-                self.result_queue.reject({'details': 'Mod {} torrent handle is invalid'.format(mod.foldername)})
-                sync_success = False
-                continue
+        with self.metrics.phase('cleanup'):
+            for mod in self.mods:
+                if not mod.torrent_handle.is_valid():
+                    self.result_queue.reject({'details': 'Mod {} torrent handle is invalid'.format(mod.foldername)})
+                    sync_success = False
+                    continue
 
-            self.save_resume_data(mod)
+                self.save_resume_data(mod)
 
-            self.log_torrent_progress(mod.status, mod.foldername)
-            if mod.status.error:
-                self.result_queue.reject({'details': 'An error occured: Libtorrent error: {}'.format(decode_utf8(mod.status.error))})
-                sync_success = False
+                self.log_torrent_progress(mod.status, mod.foldername)
+                if mod.status.error:
+                    self.result_queue.reject({'details': 'An error occured: Libtorrent error: {}'.format(decode_utf8(mod.status.error))})
+                    sync_success = False
+
+        self.update_metrics(force_export=True)
 
         return sync_success
 
+    def run_finished_hook(self, mod):
+        """Run the finished hook of the downloaded and paused mod.
+
+        The sync of the whole batch may never end when seeding, so the mods
+        replaced by update_mods() are passed to updated_mod_hook and reported
+        as synced right away.
+        Return whether the mod has been synced successfully.
+        """
+        with self.metrics.phase('finished_hook'):
+            hook_successful = self.torrent_finished_hook(mod)
+
+        mod.finished_hook_ran = True
+
+        if not hook_successful:
+            self.result_queue.reject({'msg': 'Could not perform mod {} cleanup. Make sure the files are not in use by another program.'
+                                      .format(mod.foldername)})
+            Logger.info('Sync: Could not perform mod {} cleanup. Make sure the files are not in use by another program.'
+                        .format(mod.foldername))
+            self.force_termination = True
+            return False
+
+        if mod.foldername in self.updated_mods:
+            self.updated_mods.discard(mod.foldername)
+
+            if self.updated_mod_hook and not self.updated_mod_hook(mod):
+                # The hook has issued a reject already
+                self.force_termination = True
+                return False
+
+            self.result_queue.progress({'msg': '[{}] Mod synchronized.'.format(mod.foldername),
+                                        'workaround_finished': mod.foldername}, 1.0)
+
+        return True
+
     def save_resume_data(self, mod):
         """Save the resume data of the mod that will allow a faster restart in the future."""
         if not mod.torrent_handle.is_valid():
@@ -0,0 +1,288 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""Download of torrent pieces from plain HTTP servers (web seeds).
+
+When nobody is seeding a mod, its missing pieces can still be fetched from
+web servers mirroring the mod directory. The files are laid out on the server
+the same way as in the torrent (BEP 19): <web seed url>/<path in torrent>.
+
+Each piece is fetched with HTTP range requests, verified against the piece
+hash from the torrent and written to the same place libtorrent would write it.
+Libtorrent has to recheck the torrent afterwards to pick up the new pieces.
+"""
+
+from __future__ import unicode_literals
+
+import hashlib
+import os
+import Queue
+import requests
+import threading
+import traceback
+import urllib
+
+from collections import namedtuple
+from utils.log import Logger
+
+CHUNK_SIZE = 64 * 1024
+
+FileSlice = namedtuple('FileSlice', ['path', 'offset', 'length'])
+
+
+class WebSeedException(Exception):
+    pass
+
+
+class TorrentLayout(object):
+    """Pieces and files of a torrent.
+
+    files - list of (path, size) tuples, in torrent order. The paths are
+            relative to the save path and contain the torrent name.
+    """
+
+    def __init__(self, piece_length, piece_hashes, files):
+        super(TorrentLayout, self).__init__()
+        self.piece_length = piece_length
+        self.piece_hashes = piece_hashes
+        self.files = []
+
+        offset = 0
+        for path, size in files:
+            self.files.append((path, size, offset))
+            offset += size
+
+        self.total_size = offset
+
+    @classmethod
+    def from_torrent_info(cls, torrent_info):
+        piece_hashes = [torrent_info.hash_for_piece(i) for i in xrange(torrent_info.num_pieces())]
+        files = [(entry.path.decode('utf-8'), entry.size) for entry in torrent_info.files()]
+
+        return cls(torrent_info.piece_length(), piece_hashes, files)
+
+    def num_pieces(self):
+        return len(self.piece_hashes)
+
+    def piece_size(self, piece):
+        # The last piece may be shorter
+        return min(self.piece_length, self.total_size - piece * self.piece_length)
+
+    def piece_slices(self, piece):
+        """Return the list of FileSlice that make up the piece."""
+        piece_start = piece * self.piece_length
+        piece_end = piece_start + self.piece_size(piece)
+        slices = []
+
+        for path, size, file_offset in self.files:
+            file_end = file_offset + size
+            if file_end <= piece_start or size == 0:
+                continue
+
+            if file_offset >= piece_end:
+                break
+
+            start = max(piece_start, file_offset)
+            end = min(piece_end, file_end)
+            slices.append(FileSlice(path, start - file_offset, end - start))
+
+        return slices
+
+
+def file_url(base_url, path):
+    """Return the url of the torrent file at path on the web seed base_url."""
+    quoted = urllib.quote(path.replace(os.path.sep, '/').encode('utf-8'))
+    return '{}/{}'.format(base_url.rstrip('/'), quoted)
+
+
+class WebSeedDownloader(object):
+    """Download pieces of a torrent from web seeds.
+
+    Pieces are fetched over several parallel connections. Each connection
+    keeps its HTTP session alive between the requests and switches to the
+    next web seed when a request fails.
+    """
+
+    def __init__(self, layout, save_path, urls, connections=4, timeout=30):
+        super(WebSeedDownloader, self).__init__()
+        self.layout = layout
+        self.save_path = save_path
+        self.urls = urls
+        self.connections = max(1, connections)
+        self.timeout = timeout
+
+        self.stop_requested = False
+        self.bytes_downloaded = 0
+        self.downloaded = set()
+        self.failed = set()
+        self._lock = threading.Lock()
+
+    def stop(self):
+        self.stop_requested = True
+
+    def fetch_slice(self, session, base_url, file_slice):
+        """Fetch the slice with a range request. Only a partial content
+        response is accepted: a server ignoring the range would send the
+        whole file. No more than the slice (and one chunk) is ever read.
+        """
+        url = file_url(base_url, file_slice.path)
+        last_byte = file_slice.offset + file_slice.length - 1
+        headers = {'Range': 'bytes={}-{}'.format(file_slice.offset, last_byte)}
+
+        res = session.get(url, headers=headers, timeout=self.timeout, stream=True)
+
+        try:
+            if res.status_code != 206:
+                raise WebSeedException('{} returned HTTP {}'.format(url, res.status_code))
+
+            chunks = []
+            received = 0
+            for chunk in res.iter_content(CHUNK_SIZE):
+                received += len(chunk)
+                if received > file_slice.length:
+                    raise WebSeedException('{} returned more than {} bytes'.format(url, file_slice.length))
+
+                chunks.append(chunk)
+
+        finally:
+            res.close()
+
+        if received != file_slice.length:
+            raise WebSeedException('{} returned {} bytes instead of {}'.format(url, received, file_slice.length))
+
+        return b''.join(chunks)
+
+    def fetch_piece(self, session, base_url, piece):
+        """Fetch the piece from the web seed and verify its hash.
+        Return the data of each file slice of the piece.
+        """
+        slices = self.layout.piece_slices(piece)
+        chunks = [self.fetch_slice(session, base_url, file_slice) for file_slice in slices]
+
+        if hashlib.sha1(b''.join(chunks)).digest() != self.layout.piece_hashes[piece]:
+            raise WebSeedException('Piece {} from {} failed the hash check'.format(piece, base_url))
+
+        return zip(slices, chunks)
+
+    def write_piece(self, piece_data):
+        with self._lock:
+            for file_slice, chunk in piece_data:
+                path = os.path.join(self.save_path, file_slice.path)
+                directory = os.path.dirname(path)
+                if not os.path.isdir(directory):
+                    os.makedirs(directory)
+
+                with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+                    f.seek(file_slice.offset)
+                    f.write(chunk)
+
+    def _download_piece(self, session, piece, url_index):
+        """Download the piece from the web seeds, starting with url_index,
+        and write it. Return the index of the web seed to use next.
+        """
+        for _ in xrange(len(self.urls)):
+            base_url = self.urls[url_index]
+            try:
+                piece_data = self.fetch_piece(session, base_url, piece)
+
+            except (requests.exceptions.RequestException, WebSeedException) as ex:
+                Logger.error('WebSeed: {}'.format(ex))
+                url_index = (url_index + 1) % len(self.urls)
+                continue
+
+            try:
+                self.write_piece(piece_data)
+
+            except EnvironmentError as ex:
+                # Another web seed would not help: the file is locked or the disk is full
+                Logger.error('WebSeed: Could not write piece {}: {}'.format(piece, repr(ex)))
+                break
+
+            with self._lock:
+                self.downloaded.add(piece)
+                self.bytes_downloaded += self.layout.piece_size(piece)
+
+            return url_index
+
+        with self._lock:
+            self.failed.add(piece)
+
+        return url_index
+
+    def _worker(self, pieces_queue, first_url):
+        session = requests.Session()
+        url_index = first_url
+
+        try:
+            while not self.stop_requested:
+                try:
+                    piece = pieces_queue.get_nowait()
+                except Queue.Empty:
+                    return
+
+                try:
+                    url_index = self._download_piece(session, piece, url_index)
+
+                except Exception:
+                    # Keep going: the other pieces would be lost with the thread
+                    Logger.error('WebSeed: Piece {} failed: {}'.format(piece, traceback.format_exc()))
+                    with self._lock:
+                        self.failed.add(piece)
+
+        finally:
+            session.close()
+
+    def download(self, pieces):
+        """Download the given pieces and write them to the disk.
+        Return the set of pieces that have been downloaded successfully.
+        """
+        if not self.urls:
+            raise WebSeedException('No web seeds to download from')
+
+        pieces_queue = Queue.Queue()
+        for piece in pieces:
+            pieces_queue.put(piece)
+
+        workers = []
+        for i in xrange(min(self.connections, len(pieces))):
+            worker = threading.Thread(target=self._worker, args=(pieces_queue, i % len(self.urls)))
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+
+        for worker in workers:
+            worker.join()
+
+        Logger.info('WebSeed: Downloaded {} pieces ({} bytes), {} failed'.format(
+            len(self.downloaded), self.bytes_downloaded, len(self.failed)))
+
+        return self.downloaded
+
+
+class WebSeedJob(threading.Thread):
+    """Run a WebSeedDownloader in the background."""
+
+    def __init__(self, downloader, pieces):
+        super(WebSeedJob, self).__init__()
+        self.daemon = True
+        self.downloader = downloader
+        self.pieces = pieces
+
+    def run(self):
+        try:
+            self.downloader.download(self.pieces)
+
+        except Exception as ex:
+            Logger.error('WebSeed: Download failed: {}'.format(repr(ex)))
+
+    def stop(self):
+        self.downloader.stop()
@@ -24,11 +24,12 @@ import os
 import platform
 import urllib
 
-from kivy.logger import Logger
 from third_party import steam
+from utils import discovery
 from utils.devmode import devmode
 from utils import process_launcher
 from utils import paths
+from utils.log import Logger
 from utils.registry import Registry
 from utils.system_processes import program_running
 
@@ -47,8 +48,6 @@ class Arma(object):
     _user_document_path = r"Software\Microsoft\Windows\CurrentVersion\Explorer\Shell Folders"
     _profile_directory_name = "Arma 3 - Other Profiles"
 
-    installation_path_cached = None
-
     @staticmethod
     def _is_os_64bit():
         return platform.machine().endswith('64')
@@ -61,34 +60,37 @@ class Arma(object):
         2) Search the registry entry
         3) Browse steam libraries in search for Arma
 
-        Raises ArmaNotInstalled if the required registry keys cannot be found."""
+        The result is kept by utils.discovery.
 
-        if Arma.installation_path_cached:
-            return Arma.installation_path_cached
+        Raises ArmaNotInstalled if the required registry keys cannot be found."""
 
         if devmode.get_arma_path():
-            Arma.installation_path_cached = devmode.get_arma_path()
-            return Arma.installation_path_cached
+            return devmode.get_arma_path()
+
+        return discovery.get('arma_installation_path', Arma._find_installation_path, SoftwareNotInstalled)
+
+    @staticmethod
+    def _find_installation_path():
+        """Look for Arma. Return (path, [files the path depends on])."""
 
         # 1) Check local directory
         path = paths.get_external_executable_dir()
+        arma_exe = os.path.join(path, 'Arma3.exe')
 
-        if os.path.isfile(os.path.join(path, 'Arma3.exe')):
+        if os.path.isfile(arma_exe):
             Logger.info('Arma: Arma3.exe found in launcher directory: {}'.format(path))
-            Arma.installation_path_cached = path
-            return Arma.installation_path_cached
+            return path, [arma_exe]
 
         Logger.error('Arma: Could not find Arma3.exe in launcher directory')
 
         # 2) Search the registry entry
         try:
             path = Registry.ReadValueUserAndMachine(Arma._arma_registry_path, 'main', check_both_architectures=True)
+            arma_exe = os.path.join(path, 'Arma3.exe')
 
-            if os.path.isfile(os.path.join(path, 'Arma3.exe')):
+            if os.path.isfile(arma_exe):
                 Logger.info('Arma: Arma3.exe found through registry: {}'.format(path))
-
-                Arma.installation_path_cached = path
-                return Arma.installation_path_cached
+                return path, [arma_exe]
 
             else:
                 Logger.error('Arma: Could not find Arma3.exe at the location pointed by the registry: {}'.format(path))
@@ -97,15 +99,15 @@ class Arma(object):
             Logger.error('Arma: Could not find registry entry for installation path')
 
         # 3) Browse steam libraries in search for Arma
-        steam_libraries = steam.find_steam_libraries()
+        steam_libraries = steam.find_steam_libraries()  # May raise SteamNotInstalled
 
         for library in steam_libraries:
             path = os.path.join(library, 'steamapps', 'common', 'Arma 3')
+            arma_exe = os.path.join(path, 'Arma3.exe')
 
-            if os.path.isfile(os.path.join(path, 'Arma3.exe')):
+            if os.path.isfile(arma_exe):
                 Logger.info('Arma: Arma3.exe found in Steam libraries: {}'.format(path))
-                Arma.installation_path_cached = path
-                return Arma.installation_path_cached
+                return path, [arma_exe]
 
         # All failed :(
         raise ArmaNotInstalled()
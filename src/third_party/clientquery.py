@@ -16,8 +16,8 @@ import socket
 import textwrap
 import time
 
-from kivy.logger import Logger
 from utils.critical_messagebox import MessageBox
+from utils.log import Logger
 
 # from kivy.config import Config
 # Config.set('kivy', 'log_level', 'debug')
@@ -18,6 +18,7 @@ import utils.system_processes
 from utils.devmode import devmode
 from kivy.logger import Logger
 from third_party import SoftwareNotInstalled
+from utils import discovery
 from utils import process_launcher
 from utils.registry import Registry
 
@@ -33,6 +34,10 @@ def get_faceTrackNoIR_path():
     if fake_path:
         return fake_path
 
+    return discovery.get('facetracknoir_path', _find_faceTrackNoIR_path, FaceTrackNoIRNotInstalled)
+
+
+def _find_faceTrackNoIR_path():
     try:
         key = 'SOFTWARE\\Microsoft\\Windows\\CurrentVersion\\Uninstall\\FaceTrackNoIR_is1'
         reg_val = Registry.ReadValueUserAndMachine(key, 'InstallLocation', True)
@@ -44,7 +49,7 @@ def get_faceTrackNoIR_path():
             Logger.info('FaceTrackNoIR: Found install location but no expected exe file found: {}'.format(path))
             raise FaceTrackNoIRNotInstalled()
 
-        return path
+        return path, [path]
 
     except Registry.Error:
         raise FaceTrackNoIRNotInstalled()
@@ -84,6 +89,10 @@ def get_opentrack_path():
     if fake_path:
         return fake_path
 
+    return discovery.get('opentrack_path', _find_opentrack_path, OpentrackNotInstalled)
+
+
+def _find_opentrack_path():
     try:
         key = 'SOFTWARE\\Microsoft\\Windows\\CurrentVersion\\Uninstall\\{63F53541-A29E-4B53-825A-9B6F876A2BD6}_is1'
         reg_val = Registry.ReadValueUserAndMachine(key, 'InstallLocation', True)
@@ -95,7 +104,7 @@ def get_opentrack_path():
             Logger.info('Opentrack: Found install location but no expected exe file found: {}'.format(path))
             raise OpentrackNotInstalled()
 
-        return path
+        return path, [path]
 
     except Registry.Error:
         raise OpentrackNotInstalled()
@@ -135,6 +144,10 @@ def get_TrackIR_path():
     if fake_path:
         return fake_path
 
+    return discovery.get('trackir_path', _find_TrackIR_path, TrackIRNotInstalled)
+
+
+def _find_TrackIR_path():
     try:
         key = 'Software\\NaturalPoint\\NaturalPoint\\NPClient Location'
         reg_val = Registry.ReadValueUserAndMachine(key, 'Path', True)
@@ -146,7 +159,7 @@ def get_TrackIR_path():
             Logger.info('TrackIR: Found install location but no expected exe file found: {}'.format(path))
             raise TrackIRNotInstalled()
 
-        return path
+        return path, [path]
 
     except Registry.Error:
         raise TrackIRNotInstalled()
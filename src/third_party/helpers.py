@@ -441,6 +441,7 @@ def run_the_game(mods, ip=None, port=None, password=None, teamspeak_urls=None, b
 
 ARMA_PROCESS_EVER_SEEN = False
 ARMA_PROCESS_TERMINATED = True
+ARMA_PROCESS_WATCHER = utils.system_processes.ProcessWatcher('arma3.exe', 'arma3_x64.exe')
 
 
 def arma_may_be_running(newly_launched=False):
@@ -467,11 +468,12 @@ def arma_may_be_running(newly_launched=False):
     if newly_launched:
         ARMA_PROCESS_EVER_SEEN = False
         ARMA_PROCESS_TERMINATED = False
+        ARMA_PROCESS_WATCHER.reset()
 
     if ARMA_PROCESS_TERMINATED:  # If it is known the process has already terminated, don't iterate through processes
         return False
 
-    is_process_running = utils.system_processes.program_running('arma3.exe', 'arma3_x64.exe')
+    is_process_running = ARMA_PROCESS_WATCHER.is_running()
 
     if is_process_running:
         ARMA_PROCESS_EVER_SEEN = True
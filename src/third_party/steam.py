@@ -22,8 +22,9 @@ if __name__ == "__main__":
 import os
 import re
 
-from kivy.logger import Logger
+from utils import discovery
 from utils.devmode import devmode
+from utils.log import Logger
 from utils.registry import Registry
 
 from . import SoftwareNotInstalled
@@ -70,7 +71,17 @@ Note: Strings seem to be utf-8 encoded
 """
 
 def find_steam_libraries():
-    """Quick and shitty vdf parsing in order to find steam libraries locations."""
+    """Return the steam libraries locations.
+    The result is kept by utils.discovery until libraryfolders.vdf changes.
+    """
+
+    return discovery.get('steam_libraries', _find_steam_libraries, SteamNotInstalled)
+
+
+def _find_steam_libraries():
+    """Quick and shitty vdf parsing in order to find steam libraries locations.
+    Return (libraries, [files the libraries depend on]).
+    """
 
     # Matching:     "5"     "D:\\Steam"
     pattern = re.compile(""" \s*  "(\d+)"  \s+  "([^"]+)"  .* """, re.VERBOSE)
@@ -99,11 +110,11 @@ def find_steam_libraries():
                     libraries.append(library_decoded)
                     Logger.info('Steam: Adding library: {}'.format(library_decoded))
 
-            return libraries
+            return libraries, [path]
 
     except Exception as ex:
         Logger.error('Steam: Could not read library file {}: {}'.format(path, ex))
-        return libraries
+        return libraries, [path]
 
 
 if __name__ == '__main__':
@@ -10,60 +10,229 @@
 # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
 # GNU General Public License for more details.
 
+"""Query the servers for their player count, using the A2S_INFO protocol.
+
+All the servers are queried at the same time from a single non-blocking UDP
+socket. Replies are matched to the servers by their address. A server that
+does not answer is asked again, waiting twice as long each time.
+
+See: https://developer.valvesoftware.com/wiki/Server_queries
+"""
+
 from __future__ import unicode_literals
 
-import random
-import time
-import valve.source.a2s
+import errno
+import select
+import socket
+import struct
 
-from kivy.logger import Logger
-from multiprocessing.pool import ThreadPool
+from timeit import default_timer
+from utils.log import Logger
 
 
 RESPONSE_UNKNOWN = '?/?'
 RESPONSE_DOWN = '-/-'
 
-CONNECTIONS_ATTEMPTS = 3
-CONNECTION_TIMEOUT = 2
-MAX_SLEEP_TIMEOUT = 0.5
-POOL_PROCESSES = 10
+CONNECTIONS_ATTEMPTS = 4
+INITIAL_TIMEOUT = 0.5  # Doubled after each attempt: 0.5 + 1 + 2 + 4 seconds
+MAX_SELECT_TIMEOUT = 0.1  # How often termination requests are checked
+MAX_PACKET_SIZE = 1400
 
-
-def format_response(answers):
-    """Return responses while the checking is still running."""
-    return [answer if answer else RESPONSE_UNKNOWN for answer in answers]
+PACKET_HEADER = b'\xFF\xFF\xFF\xFF'
+A2S_INFO_REQUEST = PACKET_HEADER + b'TSource Engine Query\x00'
+S2C_CHALLENGE = b'A'
+S2A_INFO = b'I'
 
 
-def format_response_final(answers):
-    """Return the final responses when it is clear that some servers are down."""
-    return [answer if answer != RESPONSE_UNKNOWN else RESPONSE_DOWN for answer in answers]
+class InvalidResponse(Exception):
+    pass
 
 
-def query_server((server_id, server)):
-    """Query a server for its player count.
-    This function is run in a separate thread.
+def parse_info_response(data):
+    """Parse an A2S_INFO response. Return a dict with the fields needed by the
+    launcher.
     """
 
-    # Sleep to prevent flooding the network
-    time.sleep(random.random() * MAX_SLEEP_TIMEOUT)
+    if not data.startswith(PACKET_HEADER + S2A_INFO):
+        raise InvalidResponse('Not an A2S_INFO response: {!r}'.format(data[:5]))
 
-    Logger.info('query_server: [{}] Querying server {} at {}:{}'.format(
-        server_id, server.name, server.ip, int(server.port) + 1))
+    try:
+        # Header, protocol, then name, map, folder and game, null-terminated
+        offset = len(PACKET_HEADER) + 2
+        strings = []
+        for _ in range(4):
+            end = data.index(b'\x00', offset)
+            strings.append(data[offset:end].decode('utf-8', 'replace'))
+            offset = end + 1
+
+        _app_id, player_count, max_players = struct.unpack_from('<hBB', data, offset)
+
+    except (ValueError, struct.error) as ex:
+        raise InvalidResponse('Truncated A2S_INFO response: {}'.format(ex))
+
+    return {
+        'server_name': strings[0],
+        'map': strings[1],
+        'player_count': player_count,
+        'max_players': max_players,
+    }
+
+
+class ServerState(object):
+    """The query state of a single server."""
+
+    def __init__(self, server_id, address):
+        super(ServerState, self).__init__()
+        self.server_id = server_id
+        self.address = address
+        self.attempts = 0
+        self.challenge = b''
+        self.sent_at = None
+        self.deadline = 0  # Send the (next) request when this time is reached
+
+    def request(self):
+        return A2S_INFO_REQUEST + self.challenge
+
+
+class QueryEngine(object):
+    """Query many servers at once from a single UDP socket."""
+
+    def __init__(self, addresses, attempts=CONNECTIONS_ATTEMPTS, initial_timeout=INITIAL_TIMEOUT):
+        """
+        Args:
+            addresses: list of (host, query_port) tuples.
+        """
+        super(QueryEngine, self).__init__()
+        self.addresses = addresses
+        self.attempts = attempts
+        self.initial_timeout = initial_timeout
+
+    def _resolve(self, host):
+        try:
+            return socket.gethostbyname(host)
+
+        except socket.error as ex:
+            Logger.error('QueryEngine: Could not resolve {}: {}'.format(host, ex))
+            return None
+
+    def _send(self, sock, state, now):
+        try:
+            sock.sendto(state.request(), state.address)
+
+        except socket.error as ex:
+            # The attempt is counted as lost and retried after the backoff
+            Logger.error('QueryEngine: Could not send to {}: {}'.format(state.address, ex))
+
+        state.sent_at = now
+        state.deadline = now + self.initial_timeout * 2 ** state.attempts
+        state.attempts += 1
+
+    def results(self, should_stop=None):
+        """Generator yielding (server_id, info, ping) as the servers answer.
+        info is None (and ping is None) when the server did not answer.
+        The ping is the round-trip time in milliseconds.
+
+        should_stop is called regularly. When it returns True, the querying is
+        stopped and the remaining servers are not reported.
+        """
+
+        pending = {}  # {address: [ServerState, ...]}
+
+        for server_id, (host, port) in enumerate(self.addresses):
+            ip = self._resolve(host)
+            if ip is None:
+                yield server_id, None, None
+                continue
+
+            address = (ip, int(port))
+            pending.setdefault(address, []).append(ServerState(server_id, address))
+
+        if not pending:
+            return
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+
+        try:
+            while pending:
+                if should_stop and should_stop():
+                    Logger.info('QueryEngine: Stopping on request')
+                    return
+
+                now = default_timer()
+
+                for address, states in pending.items():
+                    state = states[0]
+                    if state.deadline > now:
+                        continue
+
+                    if state.attempts >= self.attempts:
+                        del pending[address]
+                        for lost in states:
+                            yield lost.server_id, None, None
+                        continue
+
+                    self._send(sock, state, now)
+
+                if not pending:
+                    break
+
+                next_deadline = min(states[0].deadline for states in pending.itervalues())
+                timeout = min(max(next_deadline - default_timer(), 0), MAX_SELECT_TIMEOUT)
+                readable, _, _ = select.select([sock], [], [], timeout)
+
+                # Read everything that has arrived in the meantime
+                while readable:
+                    try:
+                        data, address = sock.recvfrom(MAX_PACKET_SIZE)
+
+                    except socket.error as ex:
+                        # Nothing more to read. On Windows, an ICMP port
+                        # unreachable is reported by the next recvfrom
+                        if ex.errno not in (errno.EWOULDBLOCK, errno.EAGAIN, errno.ECONNRESET,
+                                            getattr(errno, 'WSAECONNRESET', None)):
+                            raise
+                        break
+
+                    received_at = default_timer()
+                    states = pending.get(address)
+                    if not states:
+                        continue  # Late duplicate or unknown sender
+
+                    state = states[0]
+                    if data.startswith(PACKET_HEADER + S2C_CHALLENGE) and len(data) >= 9:
+                        # Send the request again with the challenge. This does
+                        # not count as a failed attempt
+                        state.challenge = data[5:9]
+                        state.attempts -= 1
+                        self._send(sock, state, received_at)
+                        continue
+
+                    try:
+                        info = parse_info_response(data)
 
-    address = (server.ip, int(server.port) + 1)
+                    except InvalidResponse as ex:
+                        Logger.error('QueryEngine: {} sent garbage: {}'.format(address, ex))
+                        continue
 
-    try:
-        server = valve.source.a2s.ServerQuerier(address, timeout=CONNECTION_TIMEOUT)
-        info = server.get_info()
-        answer = '{}/{}'.format(info['player_count'], info['max_players'])
+                    ping = int(round((received_at - state.sent_at) * 1000))
+                    del pending[address]
+                    for answered in states:
+                        yield answered.server_id, info, ping
+
+        finally:
+            sock.close()
 
-    except Exception as ex:  # valve.source.a2s.NoResponseError:
-        Logger.error('query_server: [{}] Exception encountered: {}'.format(server_id, ex))
-        Logger.error('query_server: [{}] Exception details: {}'.format(server_id, repr(ex)))
 
-        return server_id, RESPONSE_UNKNOWN
+def format_response(answers):
+    """Return responses while the checking is still running."""
+    return [answer if answer else RESPONSE_UNKNOWN for answer in answers]
+
+
+def format_response_final(answers):
+    """Return the final responses when it is clear that some servers are down."""
+    return [answer if answer != RESPONSE_UNKNOWN else RESPONSE_DOWN for answer in answers]
 
-    return server_id, answer
 
 # TODO: Move all of this into a class
 force_termination = False
@@ -96,49 +265,37 @@ def query_servers(message_queue, servers):
     Logger.info('query_servers: Querying servers: {}'.format(servers))
 
     answers = [RESPONSE_UNKNOWN for _ in servers]
-    pool = ThreadPool(processes=POOL_PROCESSES)
-
-    message_queue.progress({'msg': 'progress', 'server_data': format_response(answers)}, 0)
-
-    # Check the failed servers 3 times
-    for iteration in range(CONNECTIONS_ATTEMPTS):
-        # Get all the servers that have not yet responded
-        servers_to_check = [(i, server) for i, server in enumerate(servers) if answers[i] == RESPONSE_UNKNOWN]
-
-        if servers_to_check and iteration > 0:
-            # Wait a bit in case the network was the culprit of previous failures
-            time.sleep(MAX_SLEEP_TIMEOUT)
-
-        pool_generator = pool.imap_unordered(query_server, servers_to_check)
+    pings = [None for _ in servers]
 
-        # This is an overly complicated `for i in pool.imap_unordered`
-        # That allows catching (and ignoring) exceptions in the workers
-        while True:
-            handle_messages(message_queue)
-            if force_termination:
-                Logger.info('query_servers: Received termination request. Stopping...')
-                break
+    message_queue.progress({'msg': 'progress',
+                            'server_data': format_response(answers),
+                            'server_ping': pings}, 0)
 
-            try:
-                server_id, response = pool_generator.next()
+    def should_stop():
+        handle_messages(message_queue)
+        return force_termination
 
-            except StopIteration:
-                break
+    # The query port is the game port + 1
+    engine = QueryEngine([(server.ip, int(server.port) + 1) for server in servers])
 
-            except Exception:
-                raise
-                # print "Got Exception: {}, continuing...".format(type(ex))
-                # continue
+    for server_id, info, ping in engine.results(should_stop):
+        if info is None:
+            Logger.info('query_servers: [{}] {} did not answer'.format(server_id, servers[server_id].name))
+            answers[server_id] = RESPONSE_DOWN
 
-            Logger.info('query_servers: Players: {}'.format(response))
-            answers[server_id] = response
-            message_queue.progress({'msg': 'progress', 'server_data': format_response(answers)}, 0)
+        else:
+            answers[server_id] = '{}/{}'.format(info['player_count'], info['max_players'])
+            pings[server_id] = ping
+            Logger.info('query_servers: [{}] Players: {}, ping: {} ms'.format(
+                server_id, answers[server_id], ping))
 
-        if force_termination:
-            Logger.info('query_servers: Received termination request. Stopping... (2)')
-            break
+        message_queue.progress({'msg': 'progress',
+                                'server_data': format_response(answers),
+                                'server_ping': pings}, 0)
 
-    message_queue.resolve({'msg': 'Done', 'server_data': format_response_final(answers)})
+    if force_termination:
+        Logger.info('query_servers: Received termination request. Stopping...')
 
-    pool.close()
-    pool.join()
+    message_queue.resolve({'msg': 'Done',
+                           'server_data': format_response_final(answers),
+                           'server_ping': pings})
@@ -18,15 +18,16 @@ import textwrap
 import urllib
 import zipfile
 
-from kivy.logger import Logger
 from third_party import SoftwareNotInstalled
 from third_party.clientquery import get_TS_servers_connected
+from utils import discovery
 from utils import process_launcher
 from utils import system_processes
 from utils import walker
 from utils.admin import run_admin
 from utils.devmode import devmode
 from utils.hashes import sha1
+from utils.log import Logger
 from utils.registry import Registry
 
 
@@ -42,13 +43,17 @@ def get_executable_path():
     if devmode.get_ts_executable():
         return devmode.get_ts_executable()
 
+    return discovery.get('ts_executable_path', _find_executable_path, TeamspeakNotInstalled)
+
+
+def _find_executable_path():
     install_location = get_install_location()
     matches = ['ts3client_win32.exe', 'ts3client_win64.exe']
+    exe_files = [os.path.join(install_location, match) for match in matches]
 
-    for match in matches:
-        exe_file = os.path.join(install_location, match)
+    for exe_file in exe_files:
         if os.path.isfile(exe_file):
-            return exe_file
+            return exe_file, exe_files
 
     error_message = textwrap.dedent("""\
         Could not find the TS executable path.
@@ -72,13 +77,17 @@ def get_addon_installer_path():
     if devmode.get_ts_addon_installer():
         return devmode.get_ts_addon_installer()
 
+    return discovery.get('ts_addon_installer_path', _find_addon_installer_path, TeamspeakNotInstalled)
+
+
+def _find_addon_installer_path():
     install_location = get_install_location()
     match = 'package_inst.exe'
 
     exe_file = os.path.join(install_location, match)
     if os.path.isfile(exe_file):
         Logger.info('TS: Guessed TS installer path: {}'.format(exe_file))
-        return exe_file
+        return exe_file, [exe_file]
 
     error_message = textwrap.dedent("""\
         Could not get the TS plugin installer path.
@@ -100,10 +109,14 @@ def get_install_location():
     if devmode.get_ts_install_location():
         return devmode.get_ts_install_location()
 
+    return discovery.get('ts_install_location', _find_install_location, TeamspeakNotInstalled)
+
+
+def _find_install_location():
     try:
         key = 'SOFTWARE\\TeamSpeak 3 Client'
         reg_val = Registry.ReadValueMachineAndUser(key, '', True)
-        return reg_val
+        return reg_val, [reg_val]
 
     except Registry.Error:
         raise TeamspeakNotInstalled('Could not get the TS install location')
@@ -150,7 +163,15 @@ def get_plugins_locations():
     probable locations to check.
     """
 
-    return [get_install_location(), get_config_location()]
+    if devmode.get_ts_install_location() or devmode.get_ts_config_location():
+        return [get_install_location(), get_config_location()]
+
+    return discovery.get('ts_plugins_locations', _find_plugins_locations, TeamspeakNotInstalled)
+
+
+def _find_plugins_locations():
+    locations = [get_install_location(), get_config_location()]
+    return locations, locations
 
 
 def check_installed():
@@ -15,9 +15,13 @@ from __future__ import unicode_literals
 
 import json
 import os
+import threading
 
 from kivy.logger import Logger
-from utils.paths import mkdir_p
+from utils.paths import mkdir_p, write_file_atomically
+
+# Changes made within that many seconds are saved together
+DEFAULT_SAVE_DELAY = 1.0
 
 
 class JsonStore(object):
@@ -33,11 +37,10 @@ class JsonStore(object):
         if directories and not os.path.isdir(directories):
             mkdir_p(directories)
 
-        with open(filename, "w") as text_file:
-            text_file.write(contents)
-
-    def save(self, model):
+        write_file_atomically(filename, contents)
 
+    def save(self, model, changed_keys=None):
+        """Save the model. changed_keys, if given, are only used for logging."""
 
         # build new dict with items which have persist set not to False
         dict_to_save = {}
@@ -52,8 +55,11 @@ class JsonStore(object):
         string = json.dumps(dict_to_save, sort_keys=True,
                             indent=4, separators=(',', ': '))
 
-        Logger.info('JsonStore: Saving model: {} to {} | {}'.format(
-                    model, self.filepath, string))
+        if changed_keys is None:
+            Logger.info('JsonStore: Saving model: {} to {}'.format(model, self.filepath))
+        else:
+            Logger.info('JsonStore: Saving model: {} to {} | changed: {}'.format(
+                        model, self.filepath, ', '.join(sorted(changed_keys))))
 
         self._save_to_file(self.filepath, string)
 
@@ -73,3 +79,67 @@ class JsonStore(object):
                     model, self.filepath, nice_model_data))
 
         return model
+
+
+class DelayedSaver(object):
+    """Save a model with a JsonStore on a background thread.
+
+    The model is saved at most once per delay: the changes made in the
+    meantime are saved together. Call flush() before exiting to save the
+    pending changes right away.
+    """
+    def __init__(self, store, model, delay=DEFAULT_SAVE_DELAY):
+        super(DelayedSaver, self).__init__()
+        self.store = store
+        self.model = model
+        self.delay = delay
+
+        self._lock = threading.Lock()  # Guards the pending changes
+        self._write_lock = threading.Lock()  # One write at a time
+        self._changed_keys = set()
+        self._timer = None
+
+    def schedule(self, key):
+        """Mark the key as changed and make sure a save is coming."""
+        with self._lock:
+            self._changed_keys.add(key)
+
+            self._start_timer()
+
+    def _start_timer(self):
+        """Start the timer of the next save, if not already started.
+        Must be called with self._lock held.
+        """
+        if self._timer is None:
+            self._timer = threading.Timer(self.delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def has_pending_changes(self):
+        with self._lock:
+            return bool(self._changed_keys)
+
+    def flush(self):
+        """Save the pending changes now, in the calling thread."""
+        with self._write_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+
+                changed_keys, self._changed_keys = self._changed_keys, set()
+
+            if not changed_keys:
+                return
+
+            try:
+                self.store.save(self.model, changed_keys)
+
+            except Exception as ex:
+                Logger.error('DelayedSaver: Could not save the model to {}: {}. Retrying in {}s'.format(
+                    self.store.filepath, ex, self.delay))
+
+                # Keep the changes so they are saved with the next attempt
+                with self._lock:
+                    self._changed_keys.update(changed_keys)
+                    self._start_timer()
@@ -0,0 +1,293 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""rsync-style block deltas.
+
+The signature of a file is the list of the checksums of its blocks: a weak
+one (adler32), cheap to compute on a rolling window, and a strong one (md5)
+to confirm the matches.
+
+The delta of a new version of the file against a signature tells which parts
+of the new file are already present, as whole blocks, in the old file and
+which parts have to be sent.
+
+A delta can also be stored in a patch file, that rebuilds the new file from
+the old one, with the data that is not in the old file.
+"""
+
+from __future__ import unicode_literals
+
+import hashlib
+import mmap
+import os
+import struct
+import zlib
+
+from utils import context
+
+DEFAULT_BLOCK_SIZE = 64 * 1024
+ADLER_MOD = 65521
+
+# Rolling byte by byte is done in python and is slow. Once that many bytes
+# have been rolled over without finding anything, only whole blocks are compared
+MAX_ROLLING_BYTES = 1024 * 1024
+
+# Patch file: magic, block size, size and sha1 of the old and the new file,
+# followed by the compressed operations
+PATCH_MAGIC = b'BPDELTA1'
+PATCH_HEADER = struct.Struct('<8sIQ20sQ20s')
+PATCH_BLOCK_SIZE = 4 * 1024
+PATCH_MAX_ROLLING_BYTES = 16 * MAX_ROLLING_BYTES
+OP_COPY = b'C'
+OP_DATA = b'D'
+
+
+class PatchError(Exception):
+    pass
+
+
+def weak_checksum(data):
+    return zlib.adler32(data) & 0xffffffff
+
+
+def strong_checksum(data):
+    return hashlib.md5(data).hexdigest()
+
+
+def file_signature(path, block_size=DEFAULT_BLOCK_SIZE):
+    """Return the list of [weak, strong] checksums of the blocks of the file."""
+
+    blocks = []
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            blocks.append([weak_checksum(block), strong_checksum(block)])
+
+    return blocks
+
+
+def compute_delta(path, blocks, block_size=DEFAULT_BLOCK_SIZE, max_rolling_bytes=MAX_ROLLING_BYTES):
+    """Compare the file with the signature of its old version.
+
+    Return a list of operations building the new file, in order:
+        ('copy', offset, block_index, length): the data at offset in the new
+            file is the block block_index of the old file.
+        ('data', offset, length): the data at offset is not in the old file.
+    """
+
+    table = {}
+    for index, (weak, _) in enumerate(blocks):
+        table.setdefault(weak, []).append(index)
+
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+
+    ops = []
+
+    with open(path, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        def find_block(offset, weak):
+            candidates = table.get(weak)
+            if not candidates:
+                return None
+
+            strong = strong_checksum(data[offset:offset + block_size])
+            for index in candidates:
+                if blocks[index][1] == strong:
+                    return index
+
+            return None
+
+        def emit_match(offset, index, unmatched_start):
+            if unmatched_start < offset:
+                ops.append(('data', unmatched_start, offset - unmatched_start))
+
+            length = min(block_size, size - offset)
+            ops.append(('copy', offset, index, length))
+            return offset + length
+
+        try:
+            position = 0
+            unmatched_start = 0
+            rolling_budget = max_rolling_bytes
+
+            while position < size:
+                weak = weak_checksum(data[position:position + block_size])
+                index = find_block(position, weak)
+                if index is not None:
+                    position = unmatched_start = emit_match(position, index, unmatched_start)
+                    continue
+
+                # Look for a block starting at the next offsets, in case some
+                # bytes have been inserted or removed
+                end = min(position + block_size, size - block_size)
+                if rolling_budget <= 0 or position >= end:
+                    position += block_size
+                    continue
+
+                a = weak & 0xffff
+                b = weak >> 16
+                offset = position
+
+                while offset < end:
+                    byte_out = ord(data[offset])
+                    byte_in = ord(data[offset + block_size])
+                    a = (a - byte_out + byte_in) % ADLER_MOD
+                    b = (b - block_size * byte_out + a - 1) % ADLER_MOD
+                    offset += 1
+
+                    index = find_block(offset, (b << 16) | a)
+                    if index is not None:
+                        break
+
+                rolling_budget -= offset - position
+
+                if index is not None:
+                    position = unmatched_start = emit_match(offset, index, unmatched_start)
+                else:
+                    position = offset
+
+            if unmatched_start < size:
+                ops.append(('data', unmatched_start, size - unmatched_start))
+
+        finally:
+            data.close()
+
+    return ops
+
+
+def get_ranges_to_send(ops, block_size=DEFAULT_BLOCK_SIZE):
+    """Return the (offset, length) ranges of the new file that have to be
+    written over the old file, to patch it in place.
+
+    Blocks that are found at the same offset in both versions are kept.
+    Blocks that moved have to be sent again: they can't be copied from the
+    old file once it's being overwritten.
+    """
+
+    ranges = []
+    for op in ops:
+        if op[0] == 'copy':
+            _, offset, index, length = op
+            if offset == index * block_size:
+                continue
+        else:
+            _, offset, length = op
+
+        if ranges and ranges[-1][0] + ranges[-1][1] == offset:
+            ranges[-1] = (ranges[-1][0], ranges[-1][1] + length)
+        else:
+            ranges.append((offset, length))
+
+    return ranges
+
+
+def _sha1_file(path):
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha1.update(chunk)
+
+    return sha1.digest()
+
+
+def create_patch(old_path, new_path, block_size=PATCH_BLOCK_SIZE, max_rolling_bytes=PATCH_MAX_ROLLING_BYTES):
+    """Return the contents of a patch that rebuilds new_path from old_path.
+    The rolling search goes further than when syncing: the patch is made once
+    and downloaded many times.
+    """
+
+    blocks = file_signature(old_path, block_size)
+    new_size = os.path.getsize(new_path)
+    ops = compute_delta(new_path, blocks, block_size, max_rolling_bytes)
+
+    body = []
+    with open(new_path, 'rb') as f:
+        for op in ops:
+            if op[0] == 'copy':
+                _, _, index, length = op
+                body.append(OP_COPY + struct.pack('<II', index, length))
+
+            else:
+                _, offset, length = op
+                f.seek(offset)
+                body.append(OP_DATA + struct.pack('<I', length) + f.read(length))
+
+    header = PATCH_HEADER.pack(PATCH_MAGIC, block_size,
+                               os.path.getsize(old_path), _sha1_file(old_path),
+                               new_size, _sha1_file(new_path))
+
+    return header + zlib.compress(b''.join(body), 9)
+
+
+def apply_patch(old_path, patch, output_path):
+    """Write to output_path the file built by applying the patch contents to
+    old_path. Raise PatchError if the patch does not apply to old_path or if
+    the result is not exactly the expected file. Nothing is left at
+    output_path in that case.
+    """
+
+    try:
+        magic, block_size, old_size, old_sha1, new_size, new_sha1 = PATCH_HEADER.unpack_from(patch)
+        body = zlib.decompress(patch[PATCH_HEADER.size:])
+
+    except (struct.error, zlib.error) as ex:
+        raise PatchError('Corrupted patch: {}'.format(ex))
+
+    if magic != PATCH_MAGIC:
+        raise PatchError('Not a patch file')
+
+    if os.path.getsize(old_path) != old_size or _sha1_file(old_path) != old_sha1:
+        raise PatchError('The patch is not meant for {}'.format(old_path))
+
+    sha1 = hashlib.sha1()
+    patched = False
+
+    try:
+        with open(old_path, 'rb') as old_file, open(output_path, 'wb') as output_file:
+            position = 0
+            while position < len(body):
+                op = body[position:position + 1]
+
+                if op == OP_COPY:
+                    index, length = struct.unpack_from('<II', body, position + 1)
+                    position += 9
+                    old_file.seek(index * block_size)
+                    data = old_file.read(length)
+
+                elif op == OP_DATA:
+                    length = struct.unpack_from('<I', body, position + 1)[0]
+                    data = body[position + 5:position + 5 + length]
+                    position += 5 + length
+
+                else:
+                    raise PatchError('Unknown patch operation: {!r}'.format(op))
+
+                if len(data) != length:
+                    raise PatchError('Truncated patch or old file')
+
+                sha1.update(data)
+                output_file.write(data)
+
+        if os.path.getsize(output_path) != new_size or sha1.digest() != new_sha1:
+            raise PatchError('The patched file is not the expected file')
+
+        patched = True
+
+    except struct.error as ex:
+        raise PatchError('Corrupted patch: {}'.format(ex))
+
+    finally:
+        if not patched:
+            with context.ignore_nosuchfile_exception():
+                os.unlink(output_path)
@@ -0,0 +1,176 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""Cache of the locations of the third party software (Arma, Steam, etc...).
+
+Finding them means reading the registry, parsing files and probing paths.
+Each location is resolved once and stored with the stat signatures (size and
+mtime) of the files that justify it. The stored result is used, in this
+session and in the next ones, for as long as these files stay the same.
+
+Software that could not be found is looked for again after a few seconds:
+the user may be installing it or fixing its registry entries right now.
+"""
+
+from __future__ import unicode_literals
+
+import errno
+import json
+import os
+import threading
+import time
+
+from utils import paths
+from utils.log import Logger
+
+CACHE_FILE_NAME = 'discovery.json'
+REVALIDATE_INTERVAL = 10  # Seconds before checking the files of a result again
+NOT_FOUND_TTL = 5  # Seconds before looking again for missing software
+
+_lock = threading.Lock()
+_results = {}  # {name: {'value': value, 'signatures': {path: signature}, 'checked': time}}
+_not_found = {}  # {name: (expiry time, exception)}
+_persisted = None  # Contents of the cache file, loaded on first use
+
+
+def get_cache_path():
+    return paths.get_launcher_directory(CACHE_FILE_NAME)
+
+
+def _get_signature(path):
+    try:
+        file_stat = os.stat(path)
+
+    except OSError as ex:
+        if ex.errno in (errno.ENOENT, errno.ENOTDIR):
+            return None
+
+        raise
+
+    return [file_stat.st_size, file_stat.st_mtime]
+
+
+def _is_valid(entry):
+    return all(_get_signature(path) == signature for path, signature in entry['signatures'].iteritems())
+
+
+def _load():
+    global _persisted
+
+    if _persisted is None:
+        try:
+            with open(get_cache_path(), 'rb') as f:
+                _persisted = json.load(f)
+
+        except (IOError, ValueError):  # Missing or truncated by a crash
+            _persisted = {}
+
+        if not isinstance(_persisted, dict):
+            _persisted = {}
+
+    return _persisted
+
+
+def _save(name, entry):
+    persisted = _load()
+    persisted[name] = {'value': entry['value'], 'signatures': entry['signatures']}
+
+    path = get_cache_path()
+
+    try:
+        paths.mkdir_p(os.path.dirname(path))
+        paths.write_file_atomically(path, json.dumps(persisted))
+
+    except EnvironmentError as ex:
+        Logger.error('Discovery: Could not save {}: {}'.format(path, ex))
+
+
+def _get_cached(name, now):
+    """Return the cached entry for name or None."""
+
+    entry = _results.get(name)
+    if entry is None:
+        entry = _load().get(name)
+        if entry is None:
+            return None
+
+        entry = dict(entry, checked=None)
+
+    if entry['checked'] is None or entry['checked'] + REVALIDATE_INTERVAL < now:
+        if not _is_valid(entry):
+            _results.pop(name, None)
+            return None
+
+        entry['checked'] = now
+
+    _results[name] = entry
+    return entry
+
+
+def get(name, resolve, not_found_exception):
+    """Return the location stored under name.
+
+    resolve() finds the location and returns (value, files): the value must
+    be serializable to JSON and files are the paths (existing or not) the
+    value depends on. resolve() raises not_found_exception if the software is
+    not installed. The exception is raised again for a few seconds.
+    """
+
+    now = time.time()
+
+    with _lock:
+        entry = _get_cached(name, now)
+        if entry is not None:
+            return entry['value']
+
+        not_found = _not_found.get(name)
+        if not_found and not_found[0] > now:
+            raise not_found[1]
+
+    try:
+        value, files = resolve()
+
+    except not_found_exception as ex:
+        with _lock:
+            _not_found[name] = (now + NOT_FOUND_TTL, ex)
+        raise
+
+    entry = {
+        'value': value,
+        'signatures': {path: _get_signature(path) for path in files},
+        'checked': now,
+    }
+
+    with _lock:
+        _not_found.pop(name, None)
+        _results[name] = entry
+        _save(name, entry)
+
+    return value
+
+
+def forget(name=None):
+    """Drop the cached location stored under name, or all of them, from the
+    memory of this session. The persisted results are validated again.
+    """
+
+    global _persisted
+
+    with _lock:
+        if name is None:
+            _results.clear()
+            _not_found.clear()
+            _persisted = None
+
+        else:
+            _results.pop(name, None)
+            _not_found.pop(name, None)
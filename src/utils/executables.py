@@ -0,0 +1,140 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""Identification of the launcher executables.
+
+Used by the autoupdater and by the syncing process when patching the
+launcher, so this module must not import kivy.
+"""
+
+from __future__ import unicode_literals
+
+import errno
+import os
+import struct
+import threading
+
+from utils.devmode import devmode
+from utils import hashes
+from utils import paths
+from utils.log import Logger
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# {path: ((size, mtime), sha1)} so the executables are only hashed once
+_hashes_cache = {}
+
+
+def get_external_executable():
+    executable = devmode.get_application_executable()
+    if executable:
+        return executable
+
+    else:
+        return paths.get_external_executable()
+
+
+def get_pe_header(path):
+    """Return the COFF header of the PE executable (machine, number of
+    sections, link timestamp, etc...) or None if it's not a PE file.
+    """
+
+    with file(path, 'rb') as f:
+        dos_header = f.read(64)
+        if len(dos_header) < 64 or dos_header[:2] != b'MZ':
+            return None
+
+        pe_offset = struct.unpack_from('<I', dos_header, 0x3C)[0]
+        f.seek(pe_offset)
+        pe_header = f.read(24)
+
+    if len(pe_header) < 24 or pe_header[:4] != b'PE\0\0':
+        return None
+
+    return pe_header[4:]
+
+
+def get_file_sha1(path):
+    """Return the sha1 of the file, reading it in blocks.
+    The result is cached for as long as the size and mtime of the file stay
+    the same.
+    """
+
+    file_stat = os.stat(path)
+    signature = (file_stat.st_size, file_stat.st_mtime)
+
+    cached = _hashes_cache.get(path)
+    if cached and cached[0] == signature:
+        return cached[1]
+
+    sha1 = hashes.hash_for_file(path, 'sha1', block_size=HASH_BLOCK_SIZE)
+    _hashes_cache[path] = (signature, sha1)
+    return sha1
+
+
+def get_files_sha1(paths):
+    """Hash the files at the same time. hashlib releases the GIL while
+    hashing so the threads run in parallel.
+    """
+
+    results = {}
+    errors = []
+
+    def hash_file(path):
+        try:
+            results[path] = get_file_sha1(path)
+        except Exception as ex:
+            errors.append(ex)
+
+    threads = [threading.Thread(target=hash_file, args=(path,)) for path in paths]
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
+
+    return [results[path] for path in paths]
+
+
+def compare_if_same_files(other_executable):
+    """This function checks if the running executable is the same as the one pointed by
+    other_executable variable"""
+
+    my_executable_path = get_external_executable()
+    Logger.info('Autoupdater: Comparing {} with {}...'.format(my_executable_path, other_executable))
+
+    try:
+        # The cheap checks first: most of the time, the files differ there
+        if os.path.getsize(my_executable_path) != os.path.getsize(other_executable):
+            Logger.info('Autoupdater: Same files: False (different sizes)')
+            return False
+
+        if get_pe_header(my_executable_path) != get_pe_header(other_executable):
+            Logger.info('Autoupdater: Same files: False (different PE headers)')
+            return False
+
+        my_sha1, other_sha1 = get_files_sha1([my_executable_path, other_executable])
+
+    except (IOError, OSError) as ex:
+        if ex.errno == errno.ENOENT:
+            Logger.info('Autoupdater: Up to date file missing.')
+        else:
+            Logger.error('Autoupdater: Could not compare the files: {}'.format(ex))
+
+        return False
+
+    same_files = my_sha1 == other_sha1
+    Logger.info('Autoupdater: Same files: {}'.format(same_files))
+    return same_files
@@ -10,68 +10,367 @@
 # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
 # GNU General Public License for more details.
 
+"""Cache of the files downloaded from the internet.
+
+The files are stored under the sha256 of their url. An index (index.json)
+keeps, for each url: the size and the sha256 of the contents, the HTTP
+validators (ETag, Last-Modified), the expiry time and the last access time.
+
+The contents are verified against their hash when read. When the cache grows
+over its maximum size, the least recently used files are removed.
+
+The cache is used by several processes at the same time. The index is
+kept in memory and read again only when another process has changed it. It
+is written atomically. A lost update only ever makes a file look like it's
+not in the cache.
+
+Reading a file does not write the index: the access times are kept in memory
+and saved with the next change of the index, at most ACCESS_SAVE_INTERVAL
+seconds later or when the process exits.
+"""
+
 from __future__ import unicode_literals
 
+import atexit
 import errno
 import hashlib
+import json
 import os
+import time
 
 from utils import paths
 from utils import context
+from utils.devmode import devmode
+
+INDEX_FILE_NAME = 'index.json'
+DEFAULT_MAX_SIZE_MB = 256
+ORPHAN_GRACE_PERIOD = 60 * 60  # Files not in the index are removed after that
+CHUNK_SIZE = 1024 * 1024
+ACCESS_SAVE_INTERVAL = 60  # Seconds before the access times are written to the index
+
+_stats = {
+    'hits': 0,
+    'misses': 0,
+    'evictions': 0,
+    'corrupted': 0,
+}
+
+# The index as last read or written by this process
+_index_cache = {'path': None, 'signature': None, 'index': None}
+
+# {key: time} files read since the index was last saved
+_access_times = {}
+_access_state = {'last_save': 0, 'atexit_registered': False}
 
 
 def get_cache_directory():
     return paths.get_launcher_directory('filecache')
 
 
+def get_max_size():
+    return devmode.get_filecache_max_size(default=DEFAULT_MAX_SIZE_MB) * 1024 * 1024
+
+
+def _get_key(url):
+    return hashlib.sha256(url).hexdigest()
+
+
 def map_file(url):
     """Get the path where the file should be stored in the cache."""
 
-    file_name = hashlib.sha256(url).hexdigest()
-    return os.path.join(get_cache_directory(), file_name)
+    return os.path.join(get_cache_directory(), _get_key(url))
 
 
-def get_file(url):
-    """Get the file contents from the cache or None if the file is not present
-    in the cache.
+def _get_index_path():
+    return os.path.join(get_cache_directory(), INDEX_FILE_NAME)
+
+
+def _get_signature(path):
+    try:
+        file_stat = os.stat(path)
+
+    except OSError as ex:
+        if ex.errno == errno.ENOENT:
+            return None
+
+        raise
+
+    return (file_stat.st_size, file_stat.st_mtime)
+
+
+def _read_index(path):
+    try:
+        with open(path, 'rb') as f:
+            index = json.load(f)
+
+    except IOError as ex:
+        if ex.errno == errno.ENOENT:  # No such file
+            return {}
+
+        raise
+
+    except ValueError:  # Truncated by a crash. Start over
+        return {}
+
+    return index if isinstance(index, dict) else {}
+
+
+def _load_index():
+    """Return the index. It is only read from the disk if it has changed since
+    this process last used it. The pending access times are applied to it.
+    """
+
+    path = _get_index_path()
+    signature = _get_signature(path)
+
+    if _index_cache['path'] != path:
+        _access_times.clear()
+
+    if _index_cache['path'] != path or _index_cache['signature'] != signature:
+        _index_cache.update(path=path, signature=signature, index=_read_index(path))
+
+    index = _index_cache['index']
+    for key, last_access in _access_times.iteritems():
+        entry = index.get(key)
+        if entry and entry['last_access'] < last_access:
+            entry['last_access'] = last_access
+
+    return index
+
+
+def _save_index(index):
+    path = _get_index_path()
+    paths.write_file_atomically(path, json.dumps(index))
+
+    _index_cache.update(path=path, signature=_get_signature(path), index=index)
+    _access_times.clear()
+    _access_state['last_save'] = time.time()
+
+
+def flush():
+    """Write the pending access times to the index."""
+
+    if not _access_times:
+        return
+
+    try:
+        _save_index(_load_index())
+
+    except EnvironmentError:
+        pass  # Only the order of the evictions is affected
+
+
+def _record_access(key):
+    now = time.time()
+    _access_times[key] = now
+
+    if not _access_state['atexit_registered']:
+        atexit.register(flush)
+        _access_state['atexit_registered'] = True
+
+    if _access_state['last_save'] + ACCESS_SAVE_INTERVAL < now:
+        flush()
+
+
+def _remove_entry(index, key):
+    index.pop(key, None)
+    with context.ignore_nosuchfile_exception():
+        os.unlink(os.path.join(get_cache_directory(), key))
+
+
+def _hash_file(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            sha256.update(chunk)
+
+    return sha256.hexdigest()
+
+
+def _evict(index, keep=None):
+    """Remove the least recently used entries until the cache fits in its
+    maximum size. Also remove the files that have no entry in the index.
+    """
+
+    max_size = get_max_size()
+    total_size = sum(entry['size'] for entry in index.itervalues())
+
+    for key in sorted(index, key=lambda key: index[key]['last_access']):
+        if total_size <= max_size:
+            break
+
+        if key == keep:
+            continue
+
+        total_size -= index[key]['size']
+        _remove_entry(index, key)
+        _stats['evictions'] += 1
+
+    # Files left over by an older launcher version or by a lost index update
+    now = time.time()
+    for file_name in os.listdir(get_cache_directory()):
+        if file_name in index or file_name == INDEX_FILE_NAME or file_name.endswith('_tmp'):
+            continue
+
+        path = os.path.join(get_cache_directory(), file_name)
+        with context.ignore_nosuchfile_exception():
+            if os.path.getmtime(path) + ORPHAN_GRACE_PERIOD < now:
+                os.unlink(path)
+
+
+def get_entry(url):
+    """Return the index entry of the url or None if the url is not cached."""
+
+    return _load_index().get(_get_key(url))
+
+
+def is_fresh(url):
+    """Is the cached copy of the url still valid without asking the server."""
+
+    entry = get_entry(url)
+    if not entry or not entry.get('expires'):
+        return False
+
+    return entry['expires'] > time.time()
+
+
+def get_validators(url):
+    """Get the HTTP validators (etag, last_modified) of the cached file.
+    Return None if the file is not in the cache.
     """
 
+    entry = get_entry(url)
+    if not entry:
+        return None
+
+    return {'etag': entry.get('etag'), 'last_modified': entry.get('last_modified')}
+
+
+def _touch(url, verify):
+    """Return the path of the cached file after marking it as used.
+    Return None if the file is not in the cache or if it is corrupted.
+    """
+
+    key = _get_key(url)
+    index = _load_index()
+    entry = index.get(key)
     path = map_file(url)
-    f = None
+
+    if not entry or not os.path.isfile(path):
+        _stats['misses'] += 1
+        return None
+
+    if verify and _hash_file(path) != entry['sha256']:
+        _stats['corrupted'] += 1
+        _stats['misses'] += 1
+        _remove_entry(index, key)
+        _save_index(index)
+        return None
+
+    _stats['hits'] += 1
+    _record_access(key)
+
+    return path
+
+
+def get_path(url, verify=True):
+    """Return the path to the cached copy of the url, to be passed to
+    something that needs a file (images, etc...).
+    Return None if the file is not present in the cache.
+    """
+
+    return _touch(url, verify)
+
+
+def open_file(url):
+    """Return the cached file opened for reading or None if the file is not
+    present in the cache.
+    The file is verified before being returned. It is read in chunks so large
+    files are never loaded in memory as a whole.
+    """
+
+    path = _touch(url, verify=True)
+    if path is None:
+        return None
 
     try:
-        f = open(path, 'rb')
-        return f.read()
+        return open(path, 'rb')
 
     except IOError as ex:
-        if ex.errno == errno.ENOENT:  # No such file
+        if ex.errno == errno.ENOENT:  # Evicted in the meantime
             return None
 
         raise
 
-    finally:
-        if f:
-            f.close()
 
+def get_file(url):
+    """Get the file contents from the cache or None if the file is not present
+    in the cache.
+    """
+
+    f = open_file(url)
+    if f is None:
+        return None
 
-def save_file(url, data):
+    with f:
+        return f.read()
+
+
+def save_file(url, data, etag=None, last_modified=None, max_age=None):
     """Save the file contents to the cache.
     The contents of the file are saved to a temporary file and then moved to
     ensure that no truncated file is present in the cache.
+
+    etag and last_modified are the validators sent by the server with the
+    file. The file is considered fresh for max_age seconds, if given.
     """
 
     # Ensure the directory exists
     paths.mkdir_p(get_cache_directory())
 
-    path = map_file(url)
-    tmp_path = path + '_tmp'
+    key = _get_key(url)
+    paths.write_file_atomically(map_file(url), data)
 
-    f = open(tmp_path, 'wb')
-    f.write(data)
-    f.close()
+    now = time.time()
+    index = _load_index()
+    index[key] = {
+        'url': url,
+        'size': len(data),
+        'sha256': hashlib.sha256(data).hexdigest(),
+        'etag': etag,
+        'last_modified': last_modified,
+        'expires': now + max_age if max_age is not None else None,
+        'last_access': now,
+    }
 
-    # Ensure the file does not exist (would raise an exception on Windows
-    with context.ignore_nosuchfile_exception():
-        os.unlink(path)
+    _evict(index, keep=key)
+    _save_index(index)
+
+
+def refresh(url, max_age=None):
+    """Mark the cached file as fresh again, after the server confirmed it has
+    not been modified.
+    """
+
+    index = _load_index()
+    entry = index.get(_get_key(url))
+    if not entry:
+        return
+
+    now = time.time()
+    entry['expires'] = now + max_age if max_age is not None else None
+    entry['last_access'] = now
+    _save_index(index)
+
+
+def get_stats():
+    """Return the hits/misses/evictions counters of this process and the
+    current size of the cache.
+    """
+
+    index = _load_index()
+    stats = dict(_stats)
+    stats['entries'] = len(index)
+    stats['size'] = sum(entry['size'] for entry in index.itervalues())
 
-    os.rename(tmp_path, path)
+    return stats
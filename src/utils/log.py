@@ -0,0 +1,131 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""Logger for the modules that are run in the child processes.
+
+Importing kivy takes a lot of time, which is paid by every child process
+spawned by Para. Modules used by the Para functions should use this Logger
+instead of the kivy one.
+
+When kivy has already been imported (in the GUI process), the kivy Logger is
+used, so that the messages end up in the kivy log. Otherwise, the messages are
+logged with the standard logging module, to stderr and to a log file of the
+process in the launcher logs directory (stderr goes nowhere in the windowed
+build).
+"""
+
+from __future__ import unicode_literals
+
+import logging
+import os
+import sys
+import time
+
+LOG_LEVELS = {
+    'trace': 9,  # kivy's own level, below DEBUG
+    'debug': logging.DEBUG,
+    'info': logging.INFO,
+    'warning': logging.WARNING,
+    'error': logging.ERROR,
+    'critical': logging.CRITICAL,
+}
+
+LOG_FILE_PREFIX = 'child_'
+MAX_LOG_FILES = 50  # Older log files of the child processes are removed
+
+_fallback_logger = None
+
+
+def get_logs_directory():
+    from utils import paths
+    return paths.get_launcher_directory('logs')
+
+
+def _remove_old_log_files(directory):
+    log_files = sorted(file_name for file_name in os.listdir(directory) if file_name.startswith(LOG_FILE_PREFIX))
+
+    for file_name in log_files[:-MAX_LOG_FILES]:
+        try:
+            os.unlink(os.path.join(directory, file_name))
+        except OSError:
+            pass  # Used by another process
+
+
+def _create_file_handler():
+    """Return a handler writing to a new log file for this process or None
+    if the file can't be created.
+    """
+
+    try:
+        directory = get_logs_directory()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        _remove_old_log_files(directory)
+
+        file_name = '{}{}_{}.txt'.format(LOG_FILE_PREFIX, time.strftime('%Y-%m-%d_%H-%M-%S'), os.getpid())
+        # delay: processes that never log don't leave an empty file behind
+        handler = logging.FileHandler(os.path.join(directory, file_name), delay=True)
+
+    except EnvironmentError:
+        return None
+
+    handler.setFormatter(logging.Formatter('%(asctime)s [%(levelname)-7s] %(message)s'))
+    return handler
+
+
+def _get_fallback_logger():
+    global _fallback_logger
+
+    if _fallback_logger is None:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('[%(levelname)-7s] %(message)s'))
+
+        _fallback_logger = logging.getLogger('launcher')
+        _fallback_logger.addHandler(handler)
+
+        file_handler = _create_file_handler()
+        if file_handler is not None:
+            _fallback_logger.addHandler(file_handler)
+
+        _fallback_logger.setLevel(logging.INFO)
+        _fallback_logger.propagate = False
+
+    return _fallback_logger
+
+
+def get_logger():
+    """Return the kivy Logger if kivy is loaded, the fallback logger otherwise."""
+    kivy_logger = sys.modules.get('kivy.logger')
+    if kivy_logger is not None and hasattr(kivy_logger, 'Logger'):
+        return kivy_logger.Logger
+
+    return _get_fallback_logger()
+
+
+def set_log_level(level_name):
+    """Set the log level by its kivy name ('debug', 'info', ...)."""
+    get_logger().setLevel(LOG_LEVELS.get(level_name, logging.INFO))
+
+
+class _LoggerProxy(object):
+    """Forward everything to the logger returned by get_logger()."""
+
+    def trace(self, *args, **kwargs):
+        logger = get_logger()
+        getattr(logger, 'trace', logger.debug)(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(get_logger(), name)
+
+
+Logger = _LoggerProxy()
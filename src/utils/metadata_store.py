@@ -0,0 +1,132 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""Store of the last versions of the metadata.json received from the server.
+
+Each version is stored in its own file, named after the sha256 of its
+contents (serialized in a canonical way). The settings only keep the hash of
+the current version: two versions of the metadata are the same if they have
+the same hash.
+
+The last few versions are kept, so the launcher can go back to a previous
+one without downloading anything.
+"""
+
+from __future__ import unicode_literals
+
+import errno
+import hashlib
+import json
+import os
+import time
+
+from utils import context
+from utils import paths
+
+DEFAULT_KEEP_VERSIONS = 5
+EXTENSION = '.json'
+
+
+def get_store_directory():
+    return paths.get_launcher_directory('metadata')
+
+
+def _serialize(data):
+    return json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=True)
+
+
+def get_hash(data):
+    """Return the hash of the metadata, as used to store it."""
+
+    return hashlib.sha256(_serialize(data)).hexdigest()
+
+
+def _get_path(data_hash):
+    return os.path.join(get_store_directory(), data_hash + EXTENSION)
+
+
+def get_versions():
+    """Return the hashes of the stored versions, the most recent first."""
+
+    try:
+        file_names = os.listdir(get_store_directory())
+
+    except OSError as ex:
+        if ex.errno == errno.ENOENT:
+            return []
+
+        raise
+
+    versions = []
+    for file_name in file_names:
+        if not file_name.endswith(EXTENSION):
+            continue
+
+        with context.ignore_nosuchfile_exception():
+            mtime = os.path.getmtime(os.path.join(get_store_directory(), file_name))
+            versions.append((mtime, file_name[:-len(EXTENSION)]))
+
+    return [data_hash for _, data_hash in sorted(versions, reverse=True)]
+
+
+def _remove_old_versions(keep, current_hash):
+    for data_hash in get_versions()[keep:]:
+        if data_hash == current_hash:
+            continue
+
+        with context.ignore_nosuchfile_exception():
+            os.unlink(_get_path(data_hash))
+
+
+def save(data, keep=DEFAULT_KEEP_VERSIONS):
+    """Store the metadata, if not already stored, and return its hash.
+    Only the last <keep> versions are kept.
+    """
+
+    contents = _serialize(data)
+    data_hash = hashlib.sha256(contents).hexdigest()
+    path = _get_path(data_hash)
+
+    paths.mkdir_p(get_store_directory())
+
+    if os.path.isfile(path):
+        # Mark it as the most recent version
+        now = time.time()
+        os.utime(path, (now, now))
+
+    else:
+        paths.write_file_atomically(path, contents)
+
+    _remove_old_versions(keep, data_hash)
+
+    return data_hash
+
+
+def load(data_hash):
+    """Return the stored metadata with that hash or None if it is not in the
+    store (or if it is corrupted).
+    """
+
+    try:
+        with open(_get_path(data_hash), 'rb') as f:
+            contents = f.read()
+
+    except IOError as ex:
+        if ex.errno == errno.ENOENT:
+            return None
+
+        raise
+
+    if hashlib.sha256(contents).hexdigest() != data_hash:
+        return None
+
+    return json.loads(contents)
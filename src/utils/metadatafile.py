@@ -17,7 +17,7 @@ import errno
 import json
 import os
 
-from kivy import Logger
+from utils.log import Logger
 from utils.paths import get_launcher_directory
 
 
@@ -287,3 +287,120 @@ def mkdir_p(path):
             pass
         else:
             raise
+
+
+def replace_file(source, destination):
+    """Rename source to destination, replacing destination if it exists.
+    The file is never missing: os.rename does it atomically on POSIX while on
+    Windows it refuses to overwrite a file, so MoveFileEx is used there.
+    Raise OSError on failure.
+    """
+
+    if platform.system() != 'Windows':
+        os.rename(source, destination)
+        return
+
+    import pywintypes
+    import win32file
+
+    try:
+        win32file.MoveFileEx(source, destination, win32file.MOVEFILE_REPLACE_EXISTING)
+
+    except pywintypes.error as ex:
+        raise OSError(ex.winerror, ex.strerror, destination)
+
+
+def write_file_atomically(path, data):
+    """Write data to the file at path. The data is written to a temporary
+    file first, so readers and crashes never see a truncated file.
+    Raise EnvironmentError on failure.
+    """
+
+    tmp_path = '{}_{}_tmp'.format(path, os.getpid())
+
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+
+        replace_file(tmp_path, path)
+
+    except EnvironmentError:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+
+        raise
+
+
+def hardlink(source, link_name):
+    """Create a hard link named link_name pointing to source.
+    Python 2 does not provide os.link on Windows so the WinAPI is used there.
+    Raise OSError on failure.
+    """
+
+    if hasattr(os, 'link'):
+        os.link(source, link_name)
+        return
+
+    import pywintypes
+    import win32file
+
+    try:
+        win32file.CreateHardLink(link_name, source)
+
+    except pywintypes.error as ex:
+        raise OSError(ex.winerror, ex.strerror, link_name)
+
+
+def hardlink_or_copy(source, destination):
+    """Hard link the destination to source. If hard links are not supported
+    (different volumes, FAT32) copy the file instead.
+    Return True if a link has been created and False if the file was copied.
+    """
+    import shutil
+
+    try:
+        hardlink(source, destination)
+        return True
+
+    except OSError:
+        shutil.copy2(source, destination)
+        return False
+
+
+def _get_file_information_windows(path):
+    """Return the result of GetFileInformationByHandle for the file."""
+    import win32file
+
+    handle = win32file.CreateFile(path, 0, win32file.FILE_SHARE_READ | win32file.FILE_SHARE_WRITE,
+                                  None, win32file.OPEN_EXISTING, 0, None)
+    try:
+        return win32file.GetFileInformationByHandle(handle)
+
+    finally:
+        handle.Close()
+
+
+def get_link_count(path):
+    """Return the number of hard links pointing to the file.
+    os.stat always returns 0 as st_nlink on Windows so the WinAPI is used there.
+    """
+
+    if platform.system() != 'Windows':
+        return os.stat(path).st_nlink
+
+    return _get_file_information_windows(path)[7]  # nNumberOfLinks
+
+
+def is_same_file(path1, path2):
+    """Check if both paths point to the same file (are hard links of each other)."""
+
+    if platform.system() != 'Windows':
+        return os.path.samefile(path1, path2)
+
+    # dwVolumeSerialNumber, nFileIndexHigh, nFileIndexLow
+    info1 = _get_file_information_windows(path1)
+    info2 = _get_file_information_windows(path2)
+
+    return (info1[4], info1[8], info1[9]) == (info2[4], info2[8], info2[9])
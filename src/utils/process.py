@@ -22,21 +22,24 @@ They serve as workarounds, for windows issues regarding multiprocessing
 
 from __future__ import unicode_literals
 
-import copy
+import atexit
+import importlib
 import multiprocessing.forking
 import multiprocessing
 import os
+import Queue
 import sys
 import textwrap
 import threading
 import time
 
 from multiprocessing.queues import SimpleQueue
+from collections import defaultdict
 from multiprocessing import Lock, Pipe
-from kivy.clock import Clock
-from kivy.logger import Logger
+from utils.log import Logger
 from utils.primitive_git import get_git_sha1_auto
 from utils import system_processes
+from utils import wire
 from utils.testtools_compat import _format_exc_info
 
 
@@ -83,6 +86,7 @@ class ConnectionWrapper(object):
         self.received_ping_response = True
         self.ping_sent_at = time.time()
         self.use_threads = use_threads
+        self.spawned_at = time.time()
 
     # the following methods have to be overwritten for the queue to work
     # under windows, since pickling is needed. Check link:
@@ -95,6 +99,7 @@ class ConnectionWrapper(object):
                self.received_ping_response,  # Those two could be encapsulated into ping()
                self.ping_sent_at,  # Those two could be encapsulated into ping()
                self.use_threads,
+               self.spawned_at,
                )
 
     def __setstate__(self, state):
@@ -105,10 +110,13 @@ class ConnectionWrapper(object):
         self.received_ping_response,  # Those two could be encapsulated into ping()
         self.ping_sent_at,  # Those two could be encapsulated into ping()
         self.use_threads,
+        self.spawned_at,
         ) = state
 
     def _send_message(self, msg):
         '''Send message through the pipe and note the pipe is broken on error.'''
+        msg['sent_at'] = time.time()  # To measure the delivery latency
+
         try:
             self.con.send(msg)
         except (EOFError, IOError):
@@ -117,12 +125,12 @@ class ConnectionWrapper(object):
 
     def reject(self, data=None):
         msg = {'action': self.action_name, 'status': 'reject',
-               'data': data}
+               'data': wire.encode(data)}
         self._send_message(msg)
 
     def resolve(self, data=None):
         msg = {'action': self.action_name, 'status': 'resolve',
-               'data': data}
+               'data': wire.encode(data)}
         self._send_message(msg)
 
     def ping(self):
@@ -157,17 +165,24 @@ class ConnectionWrapper(object):
         self.received_ping_response = False
 
 
+    def report_spawn_stats(self):
+        """Tell the parent how long it took for the child to start running
+        the function and how many modules it had to import.
+        """
+        if self.use_threads:
+            return
+
+        msg = {'action': self.action_name, 'status': '__stats__',
+               'data': {'spawn_latency': time.time() - self.spawned_at,
+                        'modules_imported': len(sys.modules),
+                        'kivy_imported': 'kivy' in sys.modules}}
+        self._send_message(msg)
+
     def progress(self, data=None, percentage=0.0):
         msg = {'action': self.action_name, 'status': 'progress',
-               'data': data, 'percentage': percentage}
-
-        # leave only one progress item on the queue at any time
-        # self.lock.acquire()
-        # if not self.empty():
-        #     top = self.get()
-        #
-        #     if top['status'] != 'progress':
-        #         self.put(top)
+               'data': wire.encode(data), 'percentage': percentage}
+
+        # Consecutive progress messages are coalesced by the receiving Para
         self._send_message(msg)
 
     def receive_message(self):
@@ -185,6 +200,8 @@ class ConnectionWrapper(object):
                 return None
 
             message = self.con.recv()
+            if message.get('params') is not None:
+                message['params'] = wire.decode(message['params'])
 
             if message.get('command') == '__pong__':
                 Logger.debug('Received pong!')
@@ -199,10 +216,351 @@ class ConnectionWrapper(object):
             return None
 
 
+def coalesce_progress(older, newer):
+    """Merge two consecutive progress messages into one.
+    The newer message wins, except for the 'log' entries that are concatenated
+    so that no log line is lost.
+    """
+    if older is None:
+        return newer
+
+    older_data = older.get('data')
+    newer_data = newer.get('data')
+
+    if isinstance(older_data, dict) and older_data.get('log'):
+        if isinstance(newer_data, dict):
+            newer_data['log'] = older_data['log'] + (newer_data.get('log') or [])
+
+    return newer
+
+
+def _call_with_wire_args(func, messagequeue, *args):
+    """Decode the arguments encoded by Para and call func with them."""
+    return func(messagequeue, *wire.decode(args))
+
+
+def _worker_main(con, preload, shutdown):
+    """Main loop of a pooled worker process.
+    Run the functions sent by the parent, one at a time. Each task uses the
+    worker pipe as its message queue and ends with a '__done__' message.
+
+    The worker exits when the shutdown event is set, once its current task is
+    done, or when the parent process is gone.
+    """
+    for module_name in preload:
+        try:
+            importlib.import_module(module_name)
+
+        except Exception as ex:
+            Logger.error('WorkerPool: Could not preload {}: {}'.format(module_name, repr(ex)))
+
+    while not shutdown.is_set():
+        try:
+            if not con.poll(1):
+                if not system_processes.is_parent_running(retval_on_error=True):
+                    return
+
+                continue
+
+            message = con.recv()
+
+        except (EOFError, IOError):
+            return  # The parent has terminated
+
+        command = message.get('command')
+        if command == '__stop__':
+            return
+
+        if command != '__run__':
+            continue  # Leftover of the previous task (termination request, etc...)
+
+        params = message['params']
+        messagequeue = ConnectionWrapper(params['action_name'], None, con, use_threads=False)
+        messagequeue.spawned_at = params['spawned_at']
+
+        try:
+            _call_with_wire_args(params['func'], messagequeue, *params['args'])
+
+        except Exception:
+            stacktrace = "".join(_format_exc_info(*sys.exc_info()))
+            Logger.error('WorkerPool: Task {} raised an exception:\n{}'.format(params['action_name'], stacktrace))
+
+        messagequeue._send_message({'action': params['action_name'], 'status': '__done__'})
+        if messagequeue.broken_pipe:
+            return
+
+
+class Worker(object):
+    """A pooled worker process and the pipe used to talk to it."""
+
+    def __init__(self, preload, shutdown):
+        super(Worker, self).__init__()
+        self.con, child_con = Pipe()
+        self.tasks_run = 0
+        # Not a daemon: a running task must be able to finish cleanly (saving
+        # the torrents resume data, etc...) when the launcher is closed.
+        self.process = Process(target=_worker_main, args=(child_con, preload, shutdown))
+        self.process.start()
+
+    def stop(self):
+        try:
+            self.con.send({'command': '__stop__'})
+            self.con.close()
+
+        except (EOFError, IOError):
+            pass
+
+
+class PooledTask(object):
+    """Stand-in for the Process object when the Para function is run by a
+    pooled worker. The task is alive until the worker sends '__done__' or
+    terminates.
+    """
+
+    def __init__(self, worker):
+        super(PooledTask, self).__init__()
+        self.worker = worker
+        self.done = False
+
+    @property
+    def exitcode(self):
+        if self.done:
+            return 0
+
+        # None while the worker is running, the real exit code if it crashed
+        return self.worker.process.exitcode
+
+    def is_alive(self):
+        return not self.done and self.worker.process.is_alive()
+
+    def join(self, timeout=None):
+        """Wait for the end of the task. Other messages are discarded."""
+        deadline = time.time() + timeout if timeout is not None else None
+
+        while self.is_alive():
+            remaining = None if deadline is None else max(0, deadline - time.time())
+
+            try:
+                if not self.worker.con.poll(remaining):
+                    return
+
+                if self.worker.con.recv().get('status') == '__done__':
+                    self.done = True
+
+            except (EOFError, IOError):
+                return
+
+
+class WorkerPool(object):
+    """Pool of pre-started processes that run Para functions.
+
+    The workers import the preload modules once, when they are started, so
+    that running a Para does not have to pay for spawning a process and
+    importing libtorrent every time. Workers that crashed or ran
+    max_tasks_per_worker tasks are replaced with new ones.
+    """
+
+    def __init__(self, size=2, preload=(), max_tasks_per_worker=20):
+        super(WorkerPool, self).__init__()
+        self.size = size
+        self.preload = list(preload)
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.shutdown = multiprocessing.Event()
+        self.idle = [Worker(self.preload, self.shutdown) for _ in xrange(size)]
+
+    def _replace(self, worker):
+        worker.stop()
+        if not self.shutdown.is_set():
+            self.idle.append(Worker(self.preload, self.shutdown))
+
+    def run_task(self, func, args, action_name):
+        """Send the function to an idle worker.
+        Return the Worker or None if no worker is available.
+        """
+        while self.idle:
+            worker = self.idle.pop(0)
+            if not worker.process.is_alive():
+                self._replace(worker)
+                continue
+
+            try:
+                worker.con.send({'command': '__run__',
+                                 'params': {'func': func, 'args': args, 'action_name': action_name,
+                                            'spawned_at': time.time()}})
+
+            except (EOFError, IOError):
+                self._replace(worker)
+                continue
+
+            except Exception as ex:
+                # The arguments can't be pickled. Let the caller use a Process.
+                Logger.error('WorkerPool: Could not dispatch {}: {}'.format(action_name, repr(ex)))
+                self.idle.append(worker)
+                return None
+
+            worker.tasks_run += 1
+            return worker
+
+        return None
+
+    def release(self, worker):
+        """Return a worker whose task has ended to the pool."""
+        if not worker.process.is_alive() or worker.tasks_run >= self.max_tasks_per_worker:
+            self._replace(worker)
+        else:
+            self.idle.append(worker)
+
+    def stop(self):
+        """Stop the idle workers. The busy ones stop after their task."""
+        self.shutdown.set()
+
+        for worker in self.idle:
+            worker.stop()
+
+        self.idle = []
+
+
+_worker_pool = None
+_spawn_report = defaultdict(list)  # {action_name: [spawn latency, ...]}
+
+
+def get_spawn_report():
+    """Return {action_name: {'count', 'average', 'max'}} of the time it took
+    for the child processes to start running the Para functions.
+    """
+    report = {}
+    for action_name, latencies in _spawn_report.iteritems():
+        report[action_name] = {'count': len(latencies),
+                               'average': sum(latencies) / len(latencies),
+                               'max': max(latencies)}
+
+    return report
+
+
+def start_worker_pool(size=2, preload=()):
+    """Start the worker pool used by all the subsequent Para runs."""
+    global _worker_pool
+
+    if _worker_pool is None and size > 0:
+        Logger.info('WorkerPool: Starting {} workers'.format(size))
+        _worker_pool = WorkerPool(size, preload)
+
+        # Must run before multiprocessing joins the (non-daemon) workers
+        atexit.register(stop_worker_pool)
+
+    return _worker_pool
+
+
+def stop_worker_pool():
+    global _worker_pool
+
+    if _worker_pool:
+        _worker_pool.stop()
+        _worker_pool = None
+
+
+class JobError(Exception):
+    pass
+
+
+def _map_worker_main(function, job_queue, result_queue):
+    """Main loop of a map_in_processes() process."""
+    for index, job in iter(job_queue.get, None):
+        def report_progress(fraction, index=index):
+            result_queue.put(('progress', index, fraction))
+
+        try:
+            result = function(job, report_progress)
+
+        except Exception:
+            result_queue.put(('error', index, ''.join(_format_exc_info(*sys.exc_info()))))
+            return
+
+        result_queue.put(('done', index, result))
+
+
+def map_in_processes(function, jobs, workers, progress_handler=None):
+    """Call function(job, report_progress) for each job, on up to <workers>
+    processes. The function may call report_progress(fraction) to tell how
+    far it got.
+
+    progress_handler(index, fraction, total_fraction) is called in the calling
+    process each time a job reports progress or ends. total_fraction is the
+    average progress of all the jobs.
+
+    Return the results, in the order of the jobs. If a job raises an
+    exception, the other jobs are terminated and JobError is raised.
+    """
+
+    progress = [0.0] * len(jobs)
+    results = [None] * len(jobs)
+
+    def set_progress(index, fraction):
+        progress[index] = fraction
+        if progress_handler:
+            progress_handler(index, fraction, sum(progress) / len(progress))
+
+    if workers <= 1:
+        for index, job in enumerate(jobs):
+            results[index] = function(job, lambda fraction, index=index: set_progress(index, fraction))
+            set_progress(index, 1.0)
+
+        return results
+
+    job_queue = multiprocessing.Queue()
+    result_queue = multiprocessing.Queue()
+
+    for index, job in enumerate(jobs):
+        job_queue.put((index, job))
+
+    for _ in xrange(workers):
+        job_queue.put(None)
+
+    # utils.process.Process, so that it works in the --onefile build
+    processes = [Process(target=_map_worker_main, args=(function, job_queue, result_queue))
+                 for _ in xrange(workers)]
+
+    for process in processes:
+        process.daemon = True
+        process.start()
+
+    try:
+        remaining = len(jobs)
+        while remaining:
+            try:
+                kind, index, value = result_queue.get(timeout=0.5)
+
+            except Queue.Empty:
+                if not any(process.is_alive() for process in processes):
+                    raise JobError('The processes running the jobs have terminated unexpectedly')
+
+                continue
+
+            if kind == 'error':
+                raise JobError('Job {} failed:\n{}'.format(index, value))
+
+            if kind == 'done':
+                results[index] = value
+                remaining -= 1
+                value = 1.0
+
+            set_progress(index, value)
+
+        return results
+
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+            process.join()
+
+
 class Para(object):
 
     JOIN_TIMEOUT_GRANULATION = 0.1
     HANDLE_MESSAGES_INTERVAL = 0.1
+    HANDLE_MESSAGES_BUDGET = 0.05  # Max time spent draining the pipe in a tick
 
     def __init__(self, func, args, action_name, use_threads=False):
         """
@@ -220,10 +578,15 @@ class Para(object):
         super(Para, self).__init__()
         self.messagequeue = None
         self.func = func
-        self.args = copy.deepcopy(args)
+        # Encoding copies the arguments, so the child can't modify the objects
+        # of the parent (when using threads) and only the fields the child
+        # needs are pickled. See utils.wire.
+        self.args = wire.encode(args)
         self.action_name = action_name
         self.use_threads = use_threads
         self.current_child_process = None
+        self.worker = None  # The pooled worker running the function, if any
+        self.spawn_stats = None  # Reported by the child once it's running
         self.progress_handler = []
         self.resolve_handler = []
         self.reject_handler = []
@@ -233,6 +596,14 @@ class Para(object):
         self.state = 'pending'
         self.lastdata = None  # cached data from the last resolve or reject
         self.lastprogress = None  # cached progress data from the last resolve or reject
+        self.pump_stats = {
+            'messages_received': 0,
+            'progress_coalesced': 0,  # Progress messages that were never handled by themselves
+            'max_queue_depth': 0,  # Max number of messages drained in one tick
+            'last_latency': 0.0,
+            'max_latency': 0.0,
+            'total_latency': 0.0,
+        }
 
     def is_open(self):
         """simple method which queries whenever the para is still in processing."""
@@ -307,16 +678,47 @@ class Para(object):
 
     def _reset(self):
         # self.current_child_process.join()
-        self.parent_conn.close()
+        if self.worker:
+            if _worker_pool:
+                _worker_pool.release(self.worker)
+            else:
+                self.worker.stop()
+        else:
+            self.parent_conn.close()
+
         self.current_child_process = None
+        from kivy.clock import Clock
         Clock.unschedule(self.handle_messagequeue)
-        Logger.debug('Para: {} joined process'.format(self))
+        Logger.debug('Para: {} joined process. Message pump: {}'.format(self, self.get_pump_stats()))
+
+    def get_pump_stats(self):
+        """Return the statistics of the messages received from the child.
+        Latencies are in seconds.
+        """
+        stats = dict(self.pump_stats)
+        received = stats.pop('total_latency')
+        stats['average_latency'] = received / stats['messages_received'] if stats['messages_received'] else 0.0
+
+        return stats
+
+    def _record_message(self, message):
+        stats = self.pump_stats
+        stats['messages_received'] += 1
+
+        latency = max(0.0, time.time() - message.get('sent_at', time.time()))
+        stats['last_latency'] = latency
+        stats['max_latency'] = max(stats['max_latency'], latency)
+        stats['total_latency'] += latency
 
     def send_message(self, command, params=None):
         """Note: Feel free to refactor this message passing method"""
         msg = {'command': command}
         if params:
-            msg['params'] = params
+            msg['params'] = wire.encode(params)
+
+        # The pipe of a pooled worker is reused by the next task
+        if self.worker and not self.is_open():
+            return
 
         self.parent_conn.send(msg)
 
@@ -336,24 +738,80 @@ class Para(object):
         self.reject_handler = []
 
     def run(self):
+        # Imported here so that the child processes don't have to import kivy
+        from kivy.clock import Clock
+
+        if not self.use_threads and _worker_pool:
+            self.worker = _worker_pool.run_task(self.func, self.args, self.action_name)
+
+        if self.worker:
+            Logger.debug('Para: {} running in a pooled worker'.format(self))
+            self.parent_conn = self.worker.con
+            self.current_child_process = PooledTask(self.worker)
+            Clock.schedule_interval(self.handle_messagequeue, self.HANDLE_MESSAGES_INTERVAL)
+            return
+
         self.lock = Lock()
         self.parent_conn, child_conn = Pipe()
         self.messagequeue = ConnectionWrapper(self.action_name, self.lock, child_conn, use_threads=self.use_threads)
         Logger.debug('Para: {} spawning new {}'.format(self, 'thread' if self.use_threads else 'process'))
 
         if self.use_threads:
-            p = threading.Thread(target=self.func, args=(self.messagequeue,) + self.args)
+            p = threading.Thread(target=_call_with_wire_args, args=(self.func, self.messagequeue) + self.args)
         else:
-            p = Process(target=self.func, args=(self.messagequeue,) + self.args)
+            p = Process(target=_call_with_wire_args, args=(self.func, self.messagequeue) + self.args)
 
         p.start()
         self.current_child_process = p
         Clock.schedule_interval(self.handle_messagequeue, self.HANDLE_MESSAGES_INTERVAL)
 
-    def handle_messagequeue(self, dt):
-        con = self.parent_conn
-        progress = None
+    def _handle_message(self, progress):
+        """Handle a single message other than progress."""
+        if progress['status'] == 'resolve':
+            self.lastdata = progress['data']
+            self.lastprogress = progress
+            # enter closingphase cause a process can take long to
+            # terminate
+            self.state = 'closingforresolve'
+
+        elif progress['status'] == 'reject':
+            self.lastdata = progress['data']
+            self.lastprogress = progress
+            # enter closingphase cause a process can take long to
+            # terminate
+            self.state = 'closingforreject'
+
+        elif progress['status'] == '__ping__':
+            self.send_message('__pong__')
+
+        elif progress['status'] == '__done__':
+            self.current_child_process.done = True
+
+        elif progress['status'] == '__stats__':
+            self.spawn_stats = progress['data']
+            _spawn_report[self.action_name].append(self.spawn_stats['spawn_latency'])
+            Logger.info('Para: [{}] started after {:.3f}s ({} modules imported, kivy imported: {})'.format(
+                self.action_name, self.spawn_stats['spawn_latency'],
+                self.spawn_stats['modules_imported'], self.spawn_stats['kivy_imported']))
+
+    def _receive_pending(self):
+        """Return the next pending message or None.
+        A closed pipe is handled as if the child had not sent anything.
+        """
+        try:
+            if self.parent_conn.poll():
+                message = self.parent_conn.recv()
+                if message.get('data') is not None:
+                    message['data'] = wire.decode(message['data'])
+
+                return message
+
+        except (EOFError, IOError):
+            pass
 
+        return None
+
+    def handle_messagequeue(self, dt):
         # handle closing phases first
         # try to join the child process
         if self.state == 'closingforreject':
@@ -370,61 +828,74 @@ class Para(object):
 
             return
 
-        if con.poll():
-            progress = con.recv()
+        # Drain all the pending messages. Consecutive progress messages are
+        # coalesced so that the UI does not lag behind a chatty child.
+        deadline = time.time() + self.HANDLE_MESSAGES_BUDGET
+        pending_progress = None
+        received = 0
+
+        while received == 0 or time.time() < deadline:
+            progress = self._receive_pending()
+            if progress is None:
+                break
+
+            received += 1
+            self._record_message(progress)
 
-        if progress:
             if progress['status'] == 'progress':
-                self._call_progress_handler(progress)
-
-            elif progress['status'] == 'resolve':
-                self.lastdata = progress['data']
-                self.lastprogress = progress
-                # enter closingphase cause a process can take long to
-                # terminate
-                self.state = 'closingforresolve'
-
-            elif progress['status'] == 'reject':
-                self.lastdata = progress['data']
-                self.lastprogress = progress
-                # enter closingphase cause a process can take long to
-                # terminate
-                self.state = 'closingforreject'
-
-            elif progress['status'] == '__ping__':
-                self.send_message('__pong__')
-        else:
-            if not self.current_child_process.is_alive():
+                if pending_progress:
+                    self.pump_stats['progress_coalesced'] += 1
+                pending_progress = coalesce_progress(pending_progress, progress)
+                continue
 
-                if hasattr(self.current_child_process, 'exitcode'):
-                    # It's a Process
-                    message = '[{}] Child process terminated unexpectedly with code {}.'.format(
-                        self.action_name, self.current_child_process.exitcode)
+            # Keep the ordering of the messages
+            if pending_progress:
+                self._call_progress_handler(pending_progress)
+                pending_progress = None
 
-                    # Special case (libtorrent crash)
-                    if self.current_child_process.exitcode == -529697949 or \
-                       self.current_child_process.exitcode == -1073741819:
-                        message += '\n\n' + textwrap.dedent("""
-                        This is probably a bug in Libtorrent that manifests itself
-                        if there are more than 6 network interfaces enabled on the system.
+            self._handle_message(progress)
 
-                        To fix the issue, disable or remove unneeded interfaces until
-                        you have 6 or less interfaces enabled.
+            if self.state != 'pending':
+                break  # Closing. The remaining messages are not relevant
 
-                        Control Panel -> Network status and tasks -> Change adapter settings
-                        Then, right-click and disable unneeded interfaces.
-                        """)
+        if pending_progress:
+            self._call_progress_handler(pending_progress)
 
-                else:
-                    # It's a Thread
-                    message = '[{}] Child thread terminated unexpectedly.'.format(
-                        self.action_name)
+        self.pump_stats['max_queue_depth'] = max(self.pump_stats['max_queue_depth'], received)
+
+        if not received and not self.current_child_process.is_alive():
+
+            if hasattr(self.current_child_process, 'exitcode'):
+                # It's a Process
+                message = '[{}] Child process terminated unexpectedly with code {}.'.format(
+                    self.action_name, self.current_child_process.exitcode)
+
+                # Special case (libtorrent crash)
+                if self.current_child_process.exitcode == -529697949 or \
+                   self.current_child_process.exitcode == -1073741819:
+                    message += '\n\n' + textwrap.dedent("""
+                    This is probably a bug in Libtorrent that manifests itself
+                    if there are more than 6 network interfaces enabled on the system.
 
-                self.lastdata = {'data': {'msg': message}}
-                self._call_reject_handler(self.lastdata)
+                    To fix the issue, disable or remove unneeded interfaces until
+                    you have 6 or less interfaces enabled.
+
+                    Control Panel -> Network status and tasks -> Change adapter settings
+                    Then, right-click and disable unneeded interfaces.
+                    """)
+
+            else:
+                # It's a Thread
+                message = '[{}] Child thread terminated unexpectedly.'.format(
+                    self.action_name)
+
+            self.lastdata = {'data': {'msg': message}}
+            self._call_reject_handler(self.lastdata)
 
 # TODO: Maybe make a decorator out of this
 def _protected_call(messagequeue, function, action_name, *args, **kwargs):
+    messagequeue.report_spawn_stats()
+
     try:
         Logger.info('Para: Starting new thread/process for: {}'.format(action_name))
         return function(messagequeue, *args, **kwargs)
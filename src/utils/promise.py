@@ -0,0 +1,244 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""Promises that can be composed, to run independent Paras at the same time.
+
+A Promise is resolved or rejected once, with some data, and then calls its
+handlers. All the handlers are run in the main (kivy) thread, when the Para
+they depend on is done.
+
+Cancelling a promise is cooperative: the Para behind it is asked to
+terminate and its handlers are dropped, so whatever it sends afterwards is
+ignored.
+"""
+
+from __future__ import unicode_literals
+
+from utils.log import Logger
+
+
+class Promise(object):
+
+    def __init__(self, canceller=None):
+        """
+        Args:
+            canceller: function called when the promise is cancelled or times
+                       out, to stop the work that would settle it.
+        """
+        super(Promise, self).__init__()
+        self.state = 'pending'  # pending, resolved, rejected or cancelled
+        self.data = None
+        self.canceller = canceller
+        self.para = None  # The Para settling the promise, if any
+        self._callbacks = []
+        self._timeout_event = None
+
+    def is_pending(self):
+        return self.state == 'pending'
+
+    def resolve(self, data=None):
+        self._settle('resolved', data)
+
+    def reject(self, data=None):
+        self._settle('rejected', data)
+
+    def _settle(self, state, data):
+        if self.state != 'pending':
+            return
+
+        self.state = state
+        self.data = data
+        self._cancel_timeout()
+
+        callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            self._run_callback(*callback)
+
+    def _run_callback(self, on_resolve, on_reject, on_cancel):
+        if self.state == 'resolved' and on_resolve:
+            on_resolve(self.data)
+
+        elif self.state == 'rejected' and on_reject:
+            on_reject(self.data)
+
+        elif self.state == 'cancelled' and on_cancel:
+            on_cancel()
+
+    def add_callbacks(self, on_resolve=None, on_reject=None, on_cancel=None):
+        """Call the handler matching the way the promise is settled.
+        The handler is called immediately if the promise is already settled.
+        """
+        if self.state == 'pending':
+            self._callbacks.append((on_resolve, on_reject, on_cancel))
+        else:
+            self._run_callback(on_resolve, on_reject, on_cancel)
+
+        return self
+
+    def then(self, on_resolve=None, on_reject=None):
+        """Return a new promise settled with the value returned by the handler.
+
+        If the handler returns a Promise, the new promise is settled with it.
+        A missing handler passes the data unchanged. Cancelling the new promise
+        cancels this one.
+        """
+        promise = Promise(canceller=self.cancel)
+
+        def chain(handler, settle):
+            def callback(data):
+                if not handler:
+                    settle(data)
+                    return
+
+                result = handler(data)
+                if isinstance(result, Promise):
+                    promise.canceller = result.cancel
+                    result.add_callbacks(promise.resolve, promise.reject, promise.cancel)
+                else:
+                    promise.resolve(result)
+
+            return callback
+
+        self.add_callbacks(chain(on_resolve, promise.resolve),
+                           chain(on_reject, promise.reject),
+                           promise.cancel)
+        return promise
+
+    def cancel(self):
+        """Stop waiting for the promise. Its handlers are never called and the
+        work behind it is asked to stop.
+        """
+        if self.state != 'pending':
+            return
+
+        Logger.debug('Promise: Cancelling {}'.format(self))
+        self.state = 'cancelled'
+        self._cancel_timeout()
+
+        if self.canceller:
+            self.canceller()
+
+        callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            self._run_callback(*callback)
+
+    def timeout(self, seconds):
+        """Reject the promise and stop the work behind it if it is not settled
+        after the given number of seconds.
+        """
+        from kivy.clock import Clock
+
+        def on_timeout(dt):
+            self._timeout_event = None
+            if self.state != 'pending':
+                return
+
+            self.reject({'msg': 'The operation has timed out after {} seconds'.format(seconds)})
+            if self.canceller:
+                self.canceller()
+
+        self._cancel_timeout()
+        self._timeout_event = on_timeout
+        Clock.schedule_once(on_timeout, seconds)
+        return self
+
+    def _cancel_timeout(self):
+        if self._timeout_event:
+            from kivy.clock import Clock
+
+            Clock.unschedule(self._timeout_event)
+            self._timeout_event = None
+
+    @classmethod
+    def from_para(cls, para):
+        """Return a promise settled by the resolve() or reject() of the para."""
+        promise = cls(canceller=para.request_termination_and_break_promises)
+        promise.para = para
+        para.then(promise.resolve, promise.reject, None)
+
+        return promise
+
+    @classmethod
+    def all(cls, promises):
+        """Return a promise resolved with the list of the data of all the
+        promises, once they are all resolved.
+        The first rejection rejects it and cancels the remaining promises.
+        """
+        promises = list(promises)
+        results = [None] * len(promises)
+        remaining = [len(promises)]
+
+        def cancel_all():
+            for promise in promises:
+                promise.cancel()
+
+        combined = cls(canceller=cancel_all)
+
+        def on_resolve(index, data):
+            results[index] = data
+            remaining[0] -= 1
+            if remaining[0] == 0:
+                combined.resolve(results)
+
+        def on_reject(data):
+            combined.reject(data)
+            cancel_all()
+
+        if not promises:
+            combined.resolve(results)
+
+        for index, promise in enumerate(promises):
+            promise.add_callbacks(lambda data, index=index: on_resolve(index, data),
+                                  on_reject, combined.cancel)
+
+        return combined
+
+    @classmethod
+    def any(cls, promises):
+        """Return a promise resolved with the data of the first resolved
+        promise. The remaining promises are cancelled.
+        If all the promises are rejected, it is rejected with the list of the
+        rejection data.
+        """
+        promises = list(promises)
+        errors = [None] * len(promises)
+        remaining = [len(promises)]
+
+        def cancel_all():
+            for promise in promises:
+                promise.cancel()
+
+        combined = cls(canceller=cancel_all)
+
+        def on_resolve(data):
+            combined.resolve(data)
+            cancel_all()
+
+        def on_reject(index, data):
+            errors[index] = data
+            remaining[0] -= 1
+            if remaining[0] == 0:
+                combined.reject(errors)
+
+        if not promises:
+            combined.reject(errors)
+
+        for index, promise in enumerate(promises):
+            promise.add_callbacks(on_resolve,
+                                  lambda data, index=index: on_reject(index, data),
+                                  lambda index=index: on_reject(index, None))
+
+        return combined
+
+    def __repr__(self):
+        action_name = self.para.action_name if self.para else None
+        return '<Promise: {} ({})>'.format(self.state, action_name)
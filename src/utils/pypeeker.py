@@ -15,18 +15,176 @@ from __future__ import unicode_literals
 
 
 import ast
+import errno
+import os
+import struct
 import sys
+import zlib
 
+from collections import namedtuple
 # from PyInstaller.archive.readers import CArchiveReader
-from external.pyinstxtractor import extract_file
 
 
 VERSION_LOCATION = 'src\\launcher_config\\version.py'
 
+# The CArchive appended to the executable ends with a cookie:
+# magic, package length, TOC offset, TOC length, python version (, python dll
+# name for PyInstaller 2.1+)
+ARCHIVE_MAGIC = b'MEI\014\013\012\013\016'
+COOKIE = struct.Struct('!8siiii')
+COOKIE20_SIZE = COOKIE.size
+COOKIE21_SIZE = COOKIE.size + 64
+COOKIE_TOLERANCE = 8  # PyInstaller looks for the cookie up to 8 bytes before the end
+TOC_ENTRY = struct.Struct('!iiiiBc')
+
+ArchiveEntry = namedtuple('ArchiveEntry', ['position', 'compressed_size', 'size', 'compressed', 'type'])
+
+_toc_cache = {}  # {path: ((size, mtime), {name: ArchiveEntry})}
+
 
 class PypeekerException(Exception):
     pass
 
+
+def _get_archive_end(f, file_size):
+    """Return the offset at which the archive ends.
+    The certificate of a signed executable is stored after the archive.
+    """
+
+    header = f.read(64)
+    if len(header) < 64 or header[:2] != b'MZ':
+        return file_size
+
+    pe_offset = struct.unpack_from('<i', header, 60)[0]
+    f.seek(pe_offset + 24)
+    coff_magic = f.read(2)
+
+    if coff_magic == b'\x0b\x01':  # 32 bit
+        certificate_entry = pe_offset + 24 + 128
+    elif coff_magic == b'\x0b\x02':  # 64 bit
+        certificate_entry = pe_offset + 24 + 144
+    else:
+        return file_size
+
+    f.seek(certificate_entry)
+    certificate_offset = struct.unpack('<I', f.read(4).ljust(4, b'\0'))[0]
+    if certificate_offset and certificate_offset <= file_size:
+        return certificate_offset
+
+    return file_size
+
+
+def _find_cookie(f, archive_end):
+    """Return the offset at which the package ends and its cookie."""
+
+    tail_start = max(0, archive_end - COOKIE21_SIZE - COOKIE_TOLERANCE)
+    f.seek(tail_start)
+    tail = f.read(archive_end - tail_start)
+
+    for i in xrange(COOKIE_TOLERANCE):
+        package_end = archive_end - i
+
+        for cookie_size in (COOKIE20_SIZE, COOKIE21_SIZE):
+            cookie_start = package_end - cookie_size - tail_start
+            if cookie_start < 0:
+                continue
+
+            if tail[cookie_start:cookie_start + len(ARCHIVE_MAGIC)] == ARCHIVE_MAGIC:
+                return package_end, COOKIE.unpack_from(tail, cookie_start)
+
+    raise PypeekerException('Not a PyInstaller executable!')
+
+
+def _parse_toc(path):
+    """Read the table of contents of the PyInstaller archive of the executable.
+    Return {name: ArchiveEntry}.
+    """
+
+    with open(path, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        package_end, (_, package_length, toc_offset, toc_length, _) = \
+            _find_cookie(f, _get_archive_end(f, file_size))
+
+        package_start = package_end - package_length
+        f.seek(package_start + toc_offset)
+        toc_data = f.read(toc_length)
+
+    if len(toc_data) != toc_length:
+        raise PypeekerException('Truncated PyInstaller executable!')
+
+    toc = {}
+    position = 0
+    while position < toc_length:
+        entry_size, entry_position, compressed_size, size, compressed, entry_type = \
+            TOC_ENTRY.unpack_from(toc_data, position)
+
+        if entry_size < TOC_ENTRY.size:
+            raise PypeekerException('Corrupted PyInstaller executable!')
+
+        name = toc_data[position + TOC_ENTRY.size:position + entry_size]
+        name = name.rstrip(b'\0').decode('utf-8')
+        toc[name] = ArchiveEntry(package_start + entry_position, compressed_size, size, compressed == 1, entry_type)
+
+        position += entry_size
+
+    return toc
+
+
+def get_toc(path):
+    """Return the table of contents of the PyInstaller archive of the executable.
+    The result is cached for as long as the size and mtime of the file stay
+    the same.
+    """
+
+    try:
+        file_stat = os.stat(path)
+
+    except OSError as ex:
+        if ex.errno == errno.ENOENT:
+            raise PypeekerException('Could not find the executable on disk!')
+
+        raise
+
+    signature = (file_stat.st_size, file_stat.st_mtime)
+    cached = _toc_cache.get(path)
+    if cached and cached[0] == signature:
+        return cached[1]
+
+    try:
+        toc = _parse_toc(path)
+
+    except struct.error:
+        raise PypeekerException('Corrupted PyInstaller executable!')
+
+    _toc_cache[path] = (signature, toc)
+    return toc
+
+
+def extract_file(path, file_name):
+    """Return the contents of a single file packed into an executable built by
+    PyInstaller or None if there is no such file. Only that file is read.
+    """
+
+    entry = get_toc(path).get(file_name)
+    if entry is None:
+        return None
+
+    with open(path, 'rb') as f:
+        f.seek(entry.position)
+        data = f.read(entry.compressed_size)
+
+    if entry.compressed:
+        try:
+            data = zlib.decompress(data)
+
+        except zlib.error as ex:
+            raise PypeekerException('Could not decompress {}: {}'.format(file_name, ex))
+
+    if len(data) != entry.size:
+        raise PypeekerException('Truncated file inside the executable: {}'.format(file_name))
+
+    return data
+
 '''
 def get_file_from_pyinstaller_exe(name, file_name):
     """Retrieves a file packed into an exe built by PyInstaller.
@@ -19,20 +19,35 @@ if __name__ == '__main__':
     site.addsitedir(os.path.abspath(os.path.join(file_directory, '..')))
 
 
+import errno
+import json
 import os
 import paramiko
 import posixpath
+import Queue
 import random
 import socket
+import threading
+import stat
+import time
 
-from kivy.logger import Logger
 from paramiko.sftp import CMD_EXTENDED
-from utils.context import ignore_nosuchfile_ioerror
+from utils import delta
+from utils.log import Logger
 
 
 # The remote is using a posix style paths ('/')
 join = posixpath.join
 
+# Number of SFTP channels (on the same SSH connection) used for transfers
+DEFAULT_CHANNELS = 4
+
+# Files smaller than that are always sent whole when mirroring
+DELTA_MIN_SIZE = 1024 * 1024
+# Send the whole file if more than that part of it has changed
+DELTA_MAX_RATIO = 0.5
+WRITE_CHUNK_SIZE = 1024 * 1024
+
 
 class RemoteMissingKeyPolicy(paramiko.client.MissingHostKeyPolicy):
     def __init__(self, *args, **kwargs):
@@ -158,6 +173,36 @@ class RemoteConection(object):
             if client is not None:
                 client.close()
 
+    def rename_overwrite_many(self, renames):
+        """Perform all the (old_path, new_path) renames in one round-trip.
+        All the requests are sent before waiting for the answers. The renames
+        are done in the given order because posix-rename is an OpenSSH
+        extension and OpenSSH handles the requests of a channel sequentially.
+
+        Return the list of exceptions (or None) for each rename.
+        """
+
+        Logger.info('RemoteConection.rename_overwrite_many: Moving files {}'.format(renames))
+
+        request_numbers = []
+        for old_path, new_path in renames:
+            old_path = self.sftp._adjust_cwd(old_path)
+            new_path = self.sftp._adjust_cwd(new_path)
+            request_numbers.append(self.sftp._async_request(
+                type(None), CMD_EXTENDED, 'posix-rename@openssh.com', old_path, new_path))
+
+        errors = []
+        for request_number in request_numbers:
+            try:
+                self.sftp._read_response(request_number)
+                errors.append(None)
+
+            except IOError as ex:
+                errors.append(ex)
+
+        Logger.info('RemoteConection.rename_overwrite_many: Done')
+        return errors
+
     def rename_overwrite(self, old_path, new_path):
         """Move a file atomically, just like with the mv command."""
 
@@ -192,18 +237,27 @@ class RemoteConection(object):
         with self.sftp.file(tmp_path, 'wb') as f:
             f.write(contents)
 
+        renames = []
         if keep_backups:
             format_backup = lambda x: path + '_bak{}'.format('' if x == 0 else x)
 
             # Rotate the backups
             for i in range(keep_backups - 1, 0, -1):
-                with ignore_nosuchfile_ioerror():
-                    self.rename_overwrite(format_backup(i - 1), format_backup(i))
+                renames.append((format_backup(i - 1), format_backup(i)))
+
+            renames.append((path, format_backup(0)))
+
+        renames.append((tmp_path, path))
 
-            with ignore_nosuchfile_ioerror():
-                self.rename_overwrite(path, format_backup(0))
+        # Missing backups are fine. Failing to put the new file in place is not
+        errors = self.rename_overwrite_many(renames)
+        for error in errors[:-1]:
+            if error is not None and error.errno != errno.ENOENT:
+                raise error
+
+        if errors[-1] is not None:
+            raise errors[-1]
 
-        self.rename_overwrite(tmp_path, path)
         Logger.info('RemoteConection.save_file: Saved.')
 
     def put_file(self, local_file_path, remote_file_path):
@@ -212,6 +266,13 @@ class RemoteConection(object):
         transferred, it will be renamed to the requested name.
         """
 
+        self._put_file(self.sftp, local_file_path, remote_file_path)
+
+    def _put_file(self, sftp, local_file_path, remote_file_path):
+        """Upload the file using the given SFTP channel.
+        Return the size of the file.
+        """
+
         remote_file_path_tmp = '{}.tmp{}'.format(remote_file_path, self._random_str())
         Logger.info('RemoteConection.put_file: Saving local file {} to {} using temporary name {}'.format(
             local_file_path, remote_file_path, remote_file_path_tmp))
@@ -219,14 +280,107 @@ class RemoteConection(object):
 
         # Put the file to a temporary name so it doesn't trigger any scripts
         # while it is uploading and in case the transfer fails mid-upload
-        remote_stat = self.sftp.put(local_file_path, remote_file_path_tmp, confirm=True)
+        remote_stat = sftp.put(local_file_path, remote_file_path_tmp, confirm=True)
 
         if local_stat.st_size != remote_stat.st_size:
             raise Exception("Uploaded file size differs from local file size. Upload failed.")
 
         # Rename the file to the requested name
-        self.rename_overwrite(remote_file_path_tmp, remote_file_path)
-        Logger.info('RemoteConection.put_file: Saved.')
+        sftp._request(CMD_EXTENDED, 'posix-rename@openssh.com',
+                      sftp._adjust_cwd(remote_file_path_tmp), sftp._adjust_cwd(remote_file_path))
+        Logger.info('RemoteConection.put_file: Saved {}.'.format(remote_file_path))
+
+        return local_stat.st_size
+
+    def transfer_files(self, uploads=(), removals=(), channels=DEFAULT_CHANNELS, callback=None):
+        """Upload and remove files concurrently, over several SFTP channels
+        opened on the same SSH connection.
+
+        uploads is a list of (local_file_path, remote_file_path) and removals
+        a list of remote paths. The removals are started first.
+        callback(action, remote_path, size, seconds) is called, in the calling
+        thread, each time a file is done. action is 'put' or 'remove'.
+
+        The first error is raised once all the running transfers are done.
+        """
+
+        jobs = Queue.Queue()
+        results = Queue.Queue()
+
+        for path in removals:
+            jobs.put(('remove', None, path))
+
+        for local_file_path, remote_file_path in uploads:
+            jobs.put(('put', local_file_path, remote_file_path))
+
+        job_count = jobs.qsize()
+        channels = max(1, min(channels, job_count))
+        failed = threading.Event()
+
+        def worker():
+            sftp = None
+
+            try:
+                sftp = self.client.open_sftp()
+
+                while not failed.is_set():
+                    try:
+                        action, local_file_path, remote_path = jobs.get_nowait()
+                    except Queue.Empty:
+                        return
+
+                    start = time.time()
+                    size = None
+
+                    if action == 'put':
+                        size = self._put_file(sftp, local_file_path, remote_path)
+                    else:
+                        Logger.info('RemoteConection.remove_file: Removing {}'.format(remote_path))
+                        sftp.unlink(remote_path)
+
+                    results.put((action, remote_path, size, time.time() - start, None))
+
+            except Exception as ex:
+                failed.set()
+                results.put((None, None, None, None, ex))
+
+            finally:
+                if sftp is not None:
+                    sftp.close()
+
+                results.put(None)  # This worker is done
+
+        threads = [threading.Thread(target=worker) for _ in range(channels if job_count else 0)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        error = None
+        running = len(threads)
+
+        while running:
+            result = results.get()
+            if result is None:
+                running -= 1
+                continue
+
+            action, remote_path, size, seconds, ex = result
+            if ex is not None:
+                error = error or ex
+                continue
+
+            if action == 'put':
+                Logger.info('RemoteConection.transfer_files: Uploaded {} ({} bytes in {:.2f}s, {:.0f} KB/s)'.format(
+                    remote_path, size, seconds, size / 1024.0 / max(seconds, 0.001)))
+
+            if callback:
+                callback(action, remote_path, size, seconds)
+
+        for thread in threads:
+            thread.join()
+
+        if error is not None:
+            raise error
 
 
     def list_files(self, path):
@@ -241,6 +395,210 @@ class RemoteConection(object):
         self.sftp.unlink(path)
         Logger.info('RemoteConection.remove_file: Removed.')
 
+    def make_directories(self, path):
+        """Create all the directories of the path, like mkdir -p."""
+
+        try:
+            if stat.S_ISDIR(self.sftp.stat(path).st_mode):
+                return
+
+        except IOError as ex:
+            if ex.errno != errno.ENOENT:
+                raise
+
+        parent = posixpath.dirname(path.rstrip('/'))
+        if parent and parent != path:
+            self.make_directories(parent)
+
+        self.sftp.mkdir(path)
+
+    def list_files_recursive(self, path):
+        """Return {relative_path: size} of all the files below path and the
+        set of the relative paths of the directories.
+        Return empty results if path does not exist.
+        """
+
+        files = {}
+        directories = set()
+        to_visit = ['']
+
+        while to_visit:
+            relative_directory = to_visit.pop()
+
+            try:
+                entries = self.sftp.listdir_attr(join(path, relative_directory))
+
+            except IOError as ex:
+                if ex.errno != errno.ENOENT:
+                    raise
+                continue
+
+            for entry in entries:
+                relative_path = join(relative_directory, entry.filename) if relative_directory else entry.filename
+                if stat.S_ISDIR(entry.st_mode):
+                    directories.add(relative_path)
+                    to_visit.append(relative_path)
+                else:
+                    files[relative_path] = entry.st_size
+
+        return files, directories
+
+    def _patch_file(self, local_file_path, remote_file_path, ranges, size):
+        """Write the given (offset, length) ranges of the local file over the
+        remote file and truncate it to size.
+        """
+
+        with open(local_file_path, 'rb') as local_file:
+            with self.sftp.file(remote_file_path, 'r+b') as remote_file:
+                remote_file.set_pipelined(True)
+
+                for offset, length in ranges:
+                    local_file.seek(offset)
+                    remote_file.seek(offset)
+
+                    while length > 0:
+                        chunk = local_file.read(min(length, WRITE_CHUNK_SIZE))
+                        remote_file.write(chunk)
+                        length -= len(chunk)
+
+                remote_file.truncate(size)
+
+    def mirror_directory(self, local_directory, remote_directory, file_filter=None, channels=DEFAULT_CHANNELS):
+        """Make the remote directory an exact copy of the local directory.
+
+        Only the files that changed since the last mirroring are sent.
+        Large files are patched in place, sending only the blocks that
+        changed. The block signatures of the files are kept in a manifest,
+        next to the remote directory, so the remote files never have to be
+        read back.
+
+        file_filter(local_path) returns False for the files and directories
+        that must not be mirrored.
+
+        The sizes of the remote files are verified at the end.
+        Return some statistics about what has been done.
+        """
+
+        remote_directory = remote_directory.rstrip('/')
+        manifest_path = join(posixpath.dirname(remote_directory),
+                             '.{}.signatures.json'.format(posixpath.basename(remote_directory)))
+        Logger.info('RemoteConection.mirror_directory: Mirroring {} to {}'.format(local_directory, remote_directory))
+
+        try:
+            manifest = json.loads(self.read_file(manifest_path))
+        except IOError as ex:
+            if ex.errno != errno.ENOENT:
+                raise
+            manifest = {}
+        except ValueError:  # Truncated manifest. Send everything again
+            manifest = {}
+
+        block_size = manifest.get('block_size', delta.DEFAULT_BLOCK_SIZE)
+        old_entries = manifest.get('files', {})
+        new_entries = {}
+
+        remote_files, remote_directories = self.list_files_recursive(remote_directory)
+        local_files = {}
+        local_directories = set()
+
+        for root, dirs, files in os.walk(local_directory):
+            if file_filter:
+                dirs[:] = [name for name in dirs if file_filter(os.path.join(root, name))]
+
+            relative_root = os.path.relpath(root, local_directory).replace(os.path.sep, '/')
+            if relative_root == '.':
+                relative_root = ''
+            else:
+                local_directories.add(relative_root)
+
+            for name in files:
+                local_path = os.path.join(root, name)
+                if file_filter and not file_filter(local_path):
+                    continue
+
+                local_files[join(relative_root, name) if relative_root else name] = local_path
+
+        stats = {'files_sent': 0, 'files_patched': 0, 'files_unchanged': 0,
+                 'files_removed': 0, 'bytes_sent': 0, 'bytes_skipped': 0}
+
+        self.make_directories(remote_directory)
+        for relative_path in sorted(local_directories - remote_directories):
+            self.make_directories(join(remote_directory, relative_path))
+
+        uploads = []
+        patches = []
+        for relative_path, local_path in sorted(local_files.iteritems()):
+            local_stat = os.stat(local_path)
+            remote_path = join(remote_directory, relative_path)
+            entry = old_entries.get(relative_path)
+            remote_size = remote_files.get(relative_path)
+
+            if entry and remote_size != entry['size']:
+                entry = None  # The remote file has been changed by someone else
+
+            if entry and entry['size'] == local_stat.st_size and entry['mtime'] == local_stat.st_mtime:
+                new_entries[relative_path] = entry
+                stats['files_unchanged'] += 1
+                stats['bytes_skipped'] += local_stat.st_size
+                continue
+
+            if local_stat.st_size >= DELTA_MIN_SIZE:
+                blocks = delta.file_signature(local_path, block_size)
+            else:
+                blocks = None
+
+            new_entries[relative_path] = {'size': local_stat.st_size, 'mtime': local_stat.st_mtime, 'blocks': blocks}
+
+            if entry and entry.get('blocks') and blocks:
+                ops = delta.compute_delta(local_path, entry['blocks'], block_size)
+                ranges = delta.get_ranges_to_send(ops, block_size)
+                to_send = sum(length for _, length in ranges)
+
+                if to_send <= local_stat.st_size * DELTA_MAX_RATIO:
+                    patches.append((local_path, remote_path, ranges, local_stat.st_size))
+                    stats['files_patched'] += 1
+                    stats['bytes_sent'] += to_send
+                    stats['bytes_skipped'] += local_stat.st_size - to_send
+                    continue
+
+            uploads.append((local_path, remote_path))
+            stats['files_sent'] += 1
+            stats['bytes_sent'] += local_stat.st_size
+
+        removals = [join(remote_directory, relative_path)
+                    for relative_path in sorted(set(remote_files) - set(local_files))]
+        stats['files_removed'] = len(removals)
+
+        # Forget the signatures of the files that are about to change. If the
+        # mirroring is interrupted, they will be sent whole next time instead
+        # of being patched using wrong signatures
+        if patches or uploads or removals:
+            unchanged_entries = {relative_path: entry for relative_path, entry in new_entries.iteritems()
+                                 if old_entries.get(relative_path) is entry}
+            self.save_file(manifest_path, json.dumps({'block_size': block_size, 'files': unchanged_entries}),
+                           keep_backups=0)
+
+        for local_path, remote_path, ranges, size in patches:
+            Logger.info('RemoteConection.mirror_directory: Patching {}: sending {} of {} bytes'.format(
+                remote_path, sum(length for _, length in ranges), size))
+            self._patch_file(local_path, remote_path, ranges, size)
+
+        self.transfer_files(uploads=uploads, removals=removals, channels=channels)
+
+        # Verify the result before anything starts pointing to those files
+        remote_files, _ = self.list_files_recursive(remote_directory)
+        expected_files = {relative_path: entry['size'] for relative_path, entry in new_entries.iteritems()}
+
+        if remote_files != expected_files:
+            wrong = sorted(set(remote_files.items()) ^ set(expected_files.items()))
+            raise Exception('Mirroring {} failed. Wrong files: {}'.format(remote_directory, wrong[:10]))
+
+        self.save_file(manifest_path, json.dumps({'block_size': block_size, 'files': new_entries}),
+                       keep_backups=0)
+
+        Logger.info('RemoteConection.mirror_directory: Done: {}'.format(stats))
+        return stats
+
 
 if __name__ == '__main__':
     pass
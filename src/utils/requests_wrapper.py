@@ -14,13 +14,38 @@ from __future__ import unicode_literals
 
 import requests
 
-from kivy.logger import Logger
+from requests.adapters import HTTPAdapter
+from utils import filecache
+from utils.log import Logger
+
+POOL_CONNECTIONS = 4  # Number of hosts to keep connections to
+POOL_MAXSIZE = 8  # Connections kept alive per host
+
+_session = None
 
 
 class DownloadException(Exception):
     pass
 
 
+def get_session():
+    """Return the HTTP session shared by all the requests of the process.
+    The session keeps the connections alive between requests, so fetching
+    metadata and torrents from the same server reuses the same connection.
+    """
+    global _session
+
+    if _session is None:
+        _session = requests.Session()
+        _session.headers['Accept-Encoding'] = 'gzip, deflate'
+
+        adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+        _session.mount('http://', adapter)
+        _session.mount('https://', adapter)
+
+    return _session
+
+
 
 def download_url(*args, **kwargs):
     """Helper function that adds our error handling to requests.get.
@@ -53,7 +78,7 @@ def _download_url(domain, *args, **kwargs):
         domain = "the domain"
 
     try:
-        res = requests.get(*args, **kwargs)
+        res = get_session().get(*args, **kwargs)
     except requests.exceptions.ConnectionError as ex:
         try:
             reason_errno = ex.message.reason.errno
@@ -71,3 +96,98 @@ def _download_url(domain, *args, **kwargs):
         raise DownloadException('Could not download data from the server.')
 
     return res
+
+
+def get_max_age(headers, default=None):
+    """Return the number of seconds the response may be cached for, according
+    to its Cache-Control header, or default if the header doesn't tell.
+    """
+
+    cache_control = headers.get('Cache-Control', '')
+    directives = [directive.strip().lower() for directive in cache_control.split(',')]
+
+    if 'no-store' in directives or 'no-cache' in directives:
+        return None
+
+    for directive in directives:
+        if directive.startswith('max-age='):
+            try:
+                return int(directive[len('max-age='):])
+            except ValueError:
+                break
+
+    return default
+
+
+def _cached_response(url, content):
+    res = requests.Response()
+    res.url = url
+    res.status_code = 200
+    res._content = content
+    res.from_cache = True
+
+    return res
+
+
+def download_url_cached(domain, url, max_age=None, **kwargs):
+    """Download the url like download_url but use the copy stored in the
+    filecache when possible.
+
+    A fresh copy is returned without contacting the server. A stale copy is
+    revalidated with a conditional GET (ETag, If-Modified-Since).
+    The copy is fresh for the time given by the server (Cache-Control) or for
+    max_age seconds if the server doesn't tell. With max_age None, the copy
+    is revalidated every time.
+
+    The cached contents are returned as a response with a 200 status code, so
+    callers don't need to handle the cache themselves. res.from_cache tells if
+    the cached copy was used.
+    """
+
+    if filecache.is_fresh(url):
+        content = filecache.get_file(url)
+        if content is not None:
+            Logger.debug('download_url_cached: {} is fresh, using the cached copy'.format(url))
+            return _cached_response(url, content)
+
+    request_headers = kwargs.pop('headers', None) or {}
+    headers = dict(request_headers)
+    validators = filecache.get_validators(url)
+
+    if validators:
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+
+    res = download_url(domain, url, headers=headers, **kwargs)
+    res.from_cache = False
+
+    if res.status_code == 304 and validators:
+        content = filecache.get_file(url)
+
+        if content is None:
+            # Removed from the cache in the meantime
+            res = download_url(domain, url, headers=request_headers, **kwargs)
+            res.from_cache = False
+            return res
+
+        Logger.debug('download_url_cached: {} not modified, using the cached copy'.format(url))
+        filecache.refresh(url, get_max_age(res.headers, max_age))
+        return _cached_response(url, content)
+
+    if res.status_code == 200:
+        etag = res.headers.get('ETag')
+        last_modified = res.headers.get('Last-Modified')
+        res_max_age = get_max_age(res.headers, max_age)
+
+        if etag or last_modified or res_max_age:
+            try:
+                filecache.save_file(url, res.content, etag=etag, last_modified=last_modified,
+                                    max_age=res_max_age)
+
+            except (IOError, OSError) as ex:
+                Logger.error('download_url_cached: Could not cache {}: {}'.format(url, repr(ex)))
+
+    return res
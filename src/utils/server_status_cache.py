@@ -0,0 +1,110 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""Last known status (player count and ping) of the servers.
+
+The status is kept between launches so the server list can be shown
+immediately, while the servers are queried again in the background.
+"""
+
+from __future__ import unicode_literals
+
+import errno
+import json
+import os
+import time
+
+from third_party.steam_query import RESPONSE_UNKNOWN
+from utils import paths
+from utils.log import Logger
+
+STATUS_FILE_NAME = 'server_status.json'
+STATUS_TTL = 60  # Query the server again after that many seconds
+MAX_STATUS_AGE = 24 * 60 * 60  # Older entries are not worth showing at all
+
+
+def get_key(server):
+    return '{}:{}'.format(server.ip, server.port)
+
+
+class ServerStatusCache(object):
+    """The status of the servers, keyed by ip:port."""
+
+    def __init__(self, path=None, ttl=STATUS_TTL):
+        super(ServerStatusCache, self).__init__()
+        self.path = path or paths.get_launcher_directory(STATUS_FILE_NAME)
+        self.ttl = ttl
+        self.entries = {}  # {ip:port: {'players': '5/64', 'ping': 35, 'updated': timestamp}}
+
+    def load(self):
+        """Load the entries saved by the previous launch, if any."""
+        try:
+            with open(self.path, 'rb') as f:
+                entries = json.load(f)
+
+        except IOError as ex:
+            if ex.errno != errno.ENOENT:  # No such file
+                Logger.error('ServerStatusCache: Could not load {}: {}'.format(self.path, ex))
+            return
+
+        except ValueError:  # Truncated by a crash. Start over
+            return
+
+        if not isinstance(entries, dict):
+            return
+
+        oldest = time.time() - MAX_STATUS_AGE
+        self.entries = {key: entry for key, entry in entries.iteritems()
+                        if isinstance(entry, dict) and entry.get('updated', 0) > oldest}
+
+    def save(self):
+        """Write the entries to disk. Failures are only logged: the cache is
+        not worth interrupting the user for.
+        """
+        try:
+            paths.mkdir_p(os.path.dirname(self.path))
+            paths.write_file_atomically(self.path, json.dumps(self.entries))
+
+        except (IOError, OSError) as ex:
+            Logger.error('ServerStatusCache: Could not save {}: {}'.format(self.path, ex))
+
+    def get(self, server):
+        """Return the last known status of the server or None."""
+        return self.entries.get(get_key(server))
+
+    def is_fresh(self, server):
+        entry = self.get(server)
+        return bool(entry) and entry['updated'] + self.ttl > time.time()
+
+    def needs_refresh(self, servers):
+        return not all(self.is_fresh(server) for server in servers)
+
+    def update(self, servers, server_data, server_ping):
+        """Store the status of the servers as received from query_servers.
+        Statuses that are not known yet (None or '?/?') are skipped.
+        Return the indexes of the servers whose status has changed.
+        """
+        changed = []
+        now = time.time()
+
+        for index, (server, players, ping) in enumerate(zip(servers, server_data, server_ping)):
+            if not players or players == RESPONSE_UNKNOWN:
+                continue
+
+            key = get_key(server)
+            entry = self.entries.get(key)
+            if not entry or entry['players'] != players or entry['ping'] != ping:
+                changed.append(index)
+
+            self.entries[key] = {'players': players, 'ping': ping, 'updated': now}
+
+        return changed
@@ -17,14 +17,16 @@ Module to hold launcher specific model stuff
 from __future__ import unicode_literals
 
 import argparse
+import atexit
 import launcher_config
 import os
 
 from kivy.logger import Logger
 from kivy.event import EventDispatcher
 from third_party.arma import Arma, SoftwareNotInstalled
+from utils import metadata_store
 from utils.critical_messagebox import MessageBox
-from utils.data.jsonstore import JsonStore
+from utils.data.jsonstore import DelayedSaver, JsonStore
 from utils.data.model import ModelInterceptorError, Model
 from utils.paths import mkdir_p, get_launcher_directory
 
@@ -47,6 +49,10 @@ class Settings(Model):
         disable this behaviour, call suspend_autosave(). To re-enable
         the Auto-saving call resume_autosave()
 
+        The changes are saved in the background, a moment later, so that a
+        series of changes is saved only once. Call flush() to save the
+        pending changes right away.
+
     Path definitions:
         launcher_default_basedir -> this path must be CONSTANT, is build up
             from the users document-root and the constant _LAUNCHER_DIR and is
@@ -55,6 +61,10 @@ class Settings(Model):
         config_path -> launcher_default_basedir + "config.json"
             place where the config gets stored
 
+    Metadata cache:
+        mod_data_cache is kept in utils.metadata_store. Only its hash,
+        mod_data_hash, is saved in the config.
+
         launcher_basedir -> can be set by user, and determines where stuff
             regarding the launcher gets stored
 
@@ -73,7 +83,8 @@ class Settings(Model):
         {'name': 'basedir_change_notice', 'defaultValue': 0},
         {'name': 'launcher_basedir'},
         {'name': 'launcher_moddir'},
-        {'name': 'mod_data_cache', 'defaultValue': None},
+        {'name': 'mod_data_cache', 'defaultValue': None, 'persist': False},
+        {'name': 'mod_data_hash', 'defaultValue': None},
         {'name': 'max_upload_speed', 'defaultValue': 0},
         {'name': 'max_download_speed', 'defaultValue': 0},
         {'name': 'seeding_type', 'defaultValue': 'while_not_playing'},
@@ -127,11 +138,22 @@ class Settings(Model):
         except Exception:
             Logger.warn('Settings: Launcher config could not be loaded')
 
+        # Configs of older versions hold the whole metadata
+        if self.data.get('mod_data_cache') is not None and not self.data.get('mod_data_hash'):
+            try:
+                self.data['mod_data_hash'] = metadata_store.save(self.data['mod_data_cache'])
+            except Exception:
+                Logger.warn('Settings: Cached metadata could not be moved to the metadata store')
+
+        self._saver = DelayedSaver(JsonStore(self.config_path), self)
+        atexit.register(self.flush)  # In case the app is not stopped cleanly
+
         # parse arguments
         self.parser = None
         self.parse_args(argv)
 
-        Logger.info('Settings: loaded args: ' + unicode(self.data))
+        Logger.info('Settings: loaded args: ' + unicode(
+            {key: value for key, value in self.data.iteritems() if key != 'mod_data_cache'}))
 
     @classmethod
     def launcher_default_basedir(cls):
@@ -166,6 +188,32 @@ class Settings(Model):
 
         return launcher_basedir
 
+    def _get_mod_data_cache(self, data):
+        """
+        interceptor for mod_data_cache
+        loads the metadata from the metadata store the first time it is needed
+        """
+        if data is None and self.data.get('mod_data_hash'):
+            data = metadata_store.load(self.data['mod_data_hash'])
+            self.data['mod_data_cache'] = data
+
+        return data
+
+    def _set_mod_data_cache(self, data):
+        """
+        interceptor for mod_data_cache
+        stores the metadata in the metadata store and keeps its hash
+        """
+        data_hash = None
+        if data is not None:
+            try:
+                data_hash = metadata_store.save(data)
+            except EnvironmentError as ex:
+                Logger.error('Settings: Could not store the metadata: {}'.format(ex))
+
+        self.set('mod_data_hash', data_hash)
+        return data
+
     def _get_launcher_moddir(self, moddir):
         """
         interceptor for launcher_moddir
@@ -210,6 +258,10 @@ class Settings(Model):
         """enables the auto save mechanic of the model"""
         self.auto_save_on_change = True
 
+    def flush(self):
+        """save the pending changes to disc right away"""
+        self._saver.flush()
+
     def parse_args(self, argv):
         """parse arguments from the commandline and write them into the model"""
         self.parser = argparse.ArgumentParser()
@@ -240,6 +292,4 @@ class Settings(Model):
             'Settings: settings changed. New value for key "{}" is: {}'.format(key, new_value))
 
         if self.auto_save_on_change:
-            Logger.debug('Settings: saving config to: {}'.format(self.config_path))
-            store = JsonStore(self.config_path)
-            store.save(self)
+            self._saver.schedule(key)
@@ -14,26 +14,129 @@ from __future__ import unicode_literals
 
 import os
 import psutil
+import threading
+import time
 import unicode_helpers
 
-from kivy.logger import Logger
+from utils.log import Logger
+
+# All the queries made within that time share the same list of processes
+SNAPSHOT_MAX_AGE = 0.5
+
+# While waiting for a program to start, the processes are listed again after
+# an interval growing from MIN to MAX
+SCAN_INTERVAL_MIN = 1
+SCAN_INTERVAL_MAX = 5
+
+_snapshot_lock = threading.Lock()
+_snapshot = {'time': None, 'processes': {}}  # processes: {casefolded name: [pids]}
+_casefolded_names = {}  # {process name: casefolded unicode name}
+
+
+def _casefold_name(name):
+    casefolded = _casefolded_names.get(name)
+    if casefolded is None:
+        casefolded = unicode_helpers.casefold(unicode_helpers.fs_to_u(name))
+        _casefolded_names[name] = casefolded
+
+    return casefolded
+
+
+def get_processes(max_age=SNAPSHOT_MAX_AGE):
+    """Return {casefolded name: [pids]} of the processes running on the system.
+    The system is only scanned again if the last scan is older than max_age.
+    """
+
+    with _snapshot_lock:
+        now = time.time()
+        if _snapshot['time'] is not None and 0 <= now - _snapshot['time'] <= max_age:
+            return _snapshot['processes']
+
+        processes = {}
+        for process in psutil.process_iter():
+            try:
+                processes.setdefault(_casefold_name(process.name()), []).append(process.pid)
+
+            except psutil.Error:
+                continue
+
+        _snapshot['time'] = now
+        _snapshot['processes'] = processes
+
+        return processes
+
+
+def find_program(*executable_names):
+    """Return the pids of the processes matching the given names."""
+
+    processes = get_processes()
+    pids = []
+    for name in executable_names:
+        pids.extend(processes.get(unicode_helpers.casefold(name), []))
+
+    return pids
 
 
 def program_running(*executable_names):
     """Return if any process running on the system matches the given names."""
 
-    executables_casefold = [unicode_helpers.casefold(name) for name in executable_names]
+    return bool(find_program(*executable_names))
 
-    for process in psutil.process_iter():
+
+class ProcessWatcher(object):
+    """Tell if a program is running, at a low cost.
+
+    Once a process of the program is found, only that process is checked.
+    While none is running, the processes are listed at a decreasing rate.
+    Call reset() when the program is being started to look for it more often
+    again.
+    """
+
+    def __init__(self, *executable_names):
+        super(ProcessWatcher, self).__init__()
+        self.executable_names = executable_names
+        self.process = None
+        self.reset()
+
+    def reset(self):
+        """Look for the program right away and then at the highest rate."""
+        self.scan_interval = SCAN_INTERVAL_MIN
+        self.next_scan = None
+
+    def _process_alive(self):
         try:
-            name = unicode_helpers.fs_to_u(process.name())
-            if unicode_helpers.casefold(name) in executables_casefold:
-                return True
+            # is_running() also makes sure the pid has not been reused
+            return self.process.is_running() and self.process.status() != psutil.STATUS_ZOMBIE
 
         except psutil.Error:
-            continue
+            return False
 
-    return False
+    def is_running(self):
+        if self.process is not None:
+            if self._process_alive():
+                return True
+
+            # Look for another process of the program right away
+            self.process = None
+            self.reset()
+
+        now = time.time()
+        if self.next_scan is not None and now < self.next_scan:
+            return False
+
+        for pid in find_program(*self.executable_names):
+            try:
+                self.process = psutil.Process(pid)
+
+            except psutil.Error:
+                continue
+
+            self.reset()
+            return True
+
+        self.next_scan = now + self.scan_interval
+        self.scan_interval = min(self.scan_interval * 2, SCAN_INTERVAL_MAX)
+        return False
 
 
 def file_running(path):
@@ -0,0 +1,115 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""Compact representation of the objects passed between the processes.
+
+Objects implementing to_wire(memo) and from_wire(data, memo) (Mod, Server)
+are replaced by a tagged tuple containing only the fields needed to recreate
+them, instead of pickling their whole __dict__ along with whatever was
+attached to them at run time (torrent handles, file lists, libtorrent
+parameters...).
+
+Lists, tuples and dictionaries are walked recursively. Everything else is
+left as is and pickled normally.
+
+Encoding always returns new containers, so the encoded data is independent
+from the original objects, which makes deep-copying it unnecessary. An object
+referenced several times is encoded once, and decoded as a single object, like
+deepcopy() and pickle do.
+"""
+
+from __future__ import unicode_literals
+
+import importlib
+
+WIRE_TAG = '__wire__'
+WIRE_REF = '__wire_ref__'
+
+_classes = {}
+
+
+def _get_class(path):
+    cls = _classes.get(path)
+    if cls is None:
+        module_name, class_name = path.rsplit('.', 1)
+        cls = getattr(importlib.import_module(module_name), class_name)
+        _classes[path] = cls
+
+    return cls
+
+
+def _encode(obj, memo):
+    if hasattr(obj, 'to_wire') and not isinstance(obj, type):
+        # The same object (a mod shared by several servers) is sent only once
+        key = memo.get(id(obj))
+        if key is not None:
+            return (WIRE_REF, key)
+
+        key = len(memo)
+        memo[id(obj)] = key
+        cls = type(obj)
+        return (WIRE_TAG, '{}.{}'.format(cls.__module__, cls.__name__), key, obj.to_wire(memo))
+
+    if isinstance(obj, list):
+        return [_encode(item, memo) for item in obj]
+
+    if isinstance(obj, tuple):
+        return tuple(_encode(item, memo) for item in obj)
+
+    if isinstance(obj, dict):
+        return {key: _encode(value, memo) for key, value in obj.iteritems()}
+
+    return obj
+
+
+def _decode(obj, memo):
+    if isinstance(obj, list):
+        return [_decode(item, memo) for item in obj]
+
+    if isinstance(obj, tuple):
+        if len(obj) == 2 and obj[0] == WIRE_REF:
+            return memo[obj[1]]
+
+        if len(obj) == 4 and obj[0] == WIRE_TAG:
+            _, path, key, data = obj
+            instance = _get_class(path).from_wire(data, memo)
+            memo[key] = instance
+            return instance
+
+        return tuple(_decode(item, memo) for item in obj)
+
+    if isinstance(obj, dict):
+        return {key: _decode(value, memo) for key, value in obj.iteritems()}
+
+    return obj
+
+
+def encode(obj):
+    """Return obj with all the wire-aware objects replaced by their compact
+    representation.
+    """
+    return _encode(obj, {})
+
+
+def decode(obj):
+    """Reverse encode()."""
+    return _decode(obj, {})
+
+
+def encode_field(value, memo):
+    """Encode a field of a wire-aware object, sharing the memo of the caller."""
+    return _encode(value, memo)
+
+
+def decode_field(value, memo):
+    """Decode a field encoded with encode_field()."""
+    return _decode(value, memo)
@@ -13,7 +13,9 @@
 
 from __future__ import unicode_literals
 
+import random
 
+from kivy.clock import Clock
 from kivy.lang import Builder
 from kivy.logger import Logger
 from kivy.properties import ListProperty, ObjectProperty
@@ -21,9 +23,27 @@ from kivy.uix.scrollview import ScrollView
 from kivy.uix.boxlayout import BoxLayout
 from sync.modmanager import ModManager
 from sync.server import Server
+from third_party.steam_query import RESPONSE_UNKNOWN
+from utils.server_status_cache import ServerStatusCache
 from view.behaviors import HoverBehavior
 from view.errorpopup import ErrorPopup, DEFAULT_ERROR_MESSAGE
 
+REFRESH_INTERVAL = 60  # Query the servers in the background that often
+REFRESH_JITTER = 0.2  # +/- 20% so many launchers don't query at the same time
+
+_status_cache = None
+
+
+def get_status_cache():
+    """Return the status cache shared by all the server lists."""
+    global _status_cache
+
+    if _status_cache is None:
+        _status_cache = ServerStatusCache()
+        _status_cache.load()
+
+    return _status_cache
+
 
 class ServerListRefresh(BoxLayout):
     def __init__(self, owner, *args, **kwargs):
@@ -85,24 +105,33 @@ class ServerListScrolled(ScrollView, HoverBehavior):
         self.bind(mouse_hover=self.hover)
         self.para = None
         self.refresh_widget = None
+        self.background_query = False
 
     def on_query_servers_resolve(self, data):
         Logger.info('on_query_servers_resolve: {}'.format(data))
         self.para = None
 
-        for server, widget, data in zip(self.servers, self.server_widgets, data.get('server_data', [])):
-            widget.ids.server_players.text = data
-
-            if server.selected:
-                self.text = '{} ({})'.format(server.name, data)
+        self.show_server_data(data)
+        get_status_cache().save()
 
         if self.refresh_widget:
             self.refresh_widget.enable()
 
+        self.schedule_refresh()
+
     def on_query_servers_reject(self, data):
         Logger.info('on_query_servers_reject: {}'.format(data))
         self.para = None
 
+        if self.refresh_widget:
+            self.refresh_widget.enable()
+
+        self.schedule_refresh()
+
+        # Don't bother the user about a refresh they have not asked for
+        if self.background_query:
+            return
+
         message = data.get('msg', DEFAULT_ERROR_MESSAGE)
         details = data.get('details', None)
 
@@ -110,14 +139,54 @@ class ServerListScrolled(ScrollView, HoverBehavior):
 
     def on_query_servers_progress(self, data, progress):
         Logger.info('on_query_servers_progress: {}'.format(data))
+        self.show_server_data(data)
+
+    def show_server_data(self, data):
+        """Store the status of the servers in the cache and update only the
+        widgets of the servers whose status has changed.
+        """
+        server_data = data.get('server_data', [])
+        server_ping = data.get('server_ping') or [None] * len(server_data)
+
+        for index in get_status_cache().update(self.servers, server_data, server_ping):
+            self.show_status(index, server_data[index], server_ping[index])
+
+    def show_cached_status(self):
+        """Show the last known status of the servers, without waiting for
+        them to answer.
+        """
+        cache = get_status_cache()
+
+        for index, server in enumerate(self.servers):
+            entry = cache.get(server)
+            if entry:
+                self.show_status(index, entry['players'], entry['ping'])
+            else:
+                self.show_status(index, RESPONSE_UNKNOWN, None)
+
+    def show_status(self, index, players, ping):
+        server = self.servers[index]
+        widget = self.server_widgets[index]
+
+        widget.ids.server_players.text = players
+        widget.ids.server_ping.text = '{} ms'.format(ping) if ping is not None else ''
 
-        for server, widget, data in zip(self.servers, self.server_widgets, data.get('server_data', [])):
-            widget.ids.server_players.text = data
+        if server.selected:
+            self.text = '{} ({})'.format(server.name, players)
 
-            if server.selected:
-                self.text = '{} ({})'.format(server.name, data)
+    def schedule_refresh(self):
+        Clock.unschedule(self.on_refresh_timer)
+
+        delay = REFRESH_INTERVAL * random.uniform(1 - REFRESH_JITTER, 1 + REFRESH_JITTER)
+        Clock.schedule_once(self.on_refresh_timer, delay)
+
+    def on_refresh_timer(self, dt):
+        self.query_servers(background=True)
+
+    def query_servers(self, background=False):
+        Clock.unschedule(self.on_refresh_timer)
+        self.background_query = background
 
-    def query_servers(self):
         if self.refresh_widget:
             self.refresh_widget.disable()
 
@@ -161,8 +230,13 @@ class ServerListScrolled(ScrollView, HoverBehavior):
         self.server_widgets.append(dummy_server_entry)
         self.ids.servers_list.add_widget(dummy_server_entry)
 
-        # Check people on the servers
-        self.query_servers()
+        # Show what is known right away and check people on the servers
+        self.show_cached_status()
+
+        if get_status_cache().needs_refresh(self.servers):
+            self.query_servers(background=True)
+        else:
+            self.schedule_refresh()
 
 
 Builder.load_file('kv/serverlist.kv')
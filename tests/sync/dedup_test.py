@@ -0,0 +1,102 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+from collections import defaultdict
+from mock import Mock, patch
+from sync import dedup
+from sync.reconcile import TorrentFile
+
+CONTENTS = b'a' * 100
+
+
+class DeduplicateFilesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.base = tempfile.mkdtemp()
+        self.index = defaultdict(list)
+
+        for name, patcher in (('build_file_index', patch('sync.dedup.build_file_index', return_value=self.index)),
+                              ('update_mtime', patch('sync.dedup._update_resume_data_mtime'))):
+            setattr(self, name, patcher.start())
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.base)
+
+    def add_file(self, foldername, contents, indexed_contents=CONTENTS):
+        """Write the file of the mod. The index says it holds indexed_contents."""
+        path = os.path.join(self.base, foldername, 'addons', 'file.pbo')
+        os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as f:
+            f.write(contents)
+
+        filehash = hashlib.sha1(indexed_contents).digest()
+        torrent_file = TorrentFile(os.path.join(foldername, 'addons', 'file.pbo'), len(indexed_contents), 0, filehash)
+        entry = dedup.FileEntry(Mock(foldername=foldername, parent_location=self.base), 0, torrent_file)
+        self.index[(len(indexed_contents), filehash)].append(entry)
+
+        return entry
+
+    def test_identical_files_are_linked(self):
+        canonical = self.add_file('@a', CONTENTS)
+        duplicate = self.add_file('@b', CONTENTS)
+
+        report = dedup.deduplicate_files([])
+
+        self.assertEqual(report, {'files_linked': 1, 'bytes_saved': len(CONTENTS), 'files_skipped': 0})
+        self.assertTrue(os.path.samefile(canonical.full_path, duplicate.full_path))
+        self.assertFalse(os.path.exists(duplicate.full_path + '.launcher_tmp'))
+        self.update_mtime.assert_called_once_with([duplicate])
+
+        # Nothing left to do the second time
+        self.assertEqual(dedup.deduplicate_files([])['files_linked'], 0)
+
+    def test_modified_file_is_left_alone(self):
+        canonical = self.add_file('@a', CONTENTS)
+        modified = self.add_file('@b', b'b' * len(CONTENTS))
+
+        report = dedup.deduplicate_files([])
+
+        self.assertEqual(report['files_linked'], 0)
+        self.assertFalse(os.path.samefile(canonical.full_path, modified.full_path))
+        with open(modified.full_path, 'rb') as f:
+            self.assertEqual(f.read(), b'b' * len(CONTENTS))
+
+    def test_failed_link_keeps_the_duplicate(self):
+        self.add_file('@a', CONTENTS)
+        duplicate = self.add_file('@b', CONTENTS)
+
+        with patch('utils.paths.hardlink', side_effect=OSError(18, 'Invalid cross-device link')):
+            report = dedup.deduplicate_files([])
+
+        self.assertEqual(report['files_skipped'], 1)
+        with open(duplicate.full_path, 'rb') as f:
+            self.assertEqual(f.read(), CONTENTS)
+
+    def test_failed_replace_keeps_the_duplicate(self):
+        canonical = self.add_file('@a', CONTENTS)
+        duplicate = self.add_file('@b', CONTENTS)
+
+        with patch('utils.paths.replace_file', side_effect=OSError(13, 'Permission denied')):
+            report = dedup.deduplicate_files([])
+
+        self.assertEqual(report['files_skipped'], 1)
+        self.assertFalse(os.path.samefile(canonical.full_path, duplicate.full_path))
+        self.assertEqual(os.listdir(os.path.dirname(duplicate.full_path)), ['file.pbo'])
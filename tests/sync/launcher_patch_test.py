@@ -0,0 +1,92 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import Mock, patch
+from sync import launcher_patch
+from utils import delta
+from utils.requests_wrapper import DownloadException
+
+OLD_DATA = os.urandom(64 * 1024)
+NEW_DATA = OLD_DATA[:1000] + b'new version' + OLD_DATA[1000:]
+
+
+class PatchLauncherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.my_executable = self.write('running.exe', OLD_DATA)
+        self.patch = delta.create_patch(self.my_executable, self.write('built.exe', NEW_DATA))
+        self.new_executable = os.path.join(self.directory, 'launcher', 'Launcher.exe')
+
+        old_sha1 = hashlib.sha1(OLD_DATA).hexdigest()
+        self.launcher = Mock(sha1=hashlib.sha1(NEW_DATA).hexdigest(),
+                             patches={old_sha1: 'launcher-1-{}.patch'.format(old_sha1[:12])},
+                             torrent_url='http://example.com/torrents/launcher-1.torrent')
+        self.launcher.get_full_path.return_value = os.path.join(self.directory, 'launcher')
+
+        for patcher in (patch('sync.launcher_patch.executables.get_external_executable', return_value=self.my_executable),
+                        patch('sync.launcher_patch.launcher_config.executable_name', 'Launcher', create=True)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, data):
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+
+        return path
+
+    def test_executable_is_patched(self):
+        with patch('sync.launcher_patch.download_url', return_value=Mock(content=self.patch)) as download_url:
+            self.assertTrue(launcher_patch.patch_launcher(Mock(), self.launcher))
+
+        url = download_url.call_args[0][1]
+        self.assertEqual(url, 'http://example.com/torrents/' + self.launcher.patches.values()[0])
+        with open(self.new_executable, 'rb') as f:
+            self.assertEqual(f.read(), NEW_DATA)
+        self.assertFalse(os.path.exists(self.new_executable + '.patched'))
+
+        # Already up to date
+        with patch('sync.launcher_patch.download_url') as download_url:
+            self.assertFalse(launcher_patch.patch_launcher(Mock(), self.launcher))
+            download_url.assert_not_called()
+
+    def test_no_patch_for_the_running_executable(self):
+        self.launcher.patches = {'0' * 40: 'launcher-1-000000000000.patch'}
+
+        with patch('sync.launcher_patch.download_url') as download_url:
+            self.assertFalse(launcher_patch.patch_launcher(Mock(), self.launcher))
+            download_url.assert_not_called()
+
+    def test_failed_download_falls_back_to_the_torrent(self):
+        with patch('sync.launcher_patch.download_url', side_effect=DownloadException('404')):
+            self.assertFalse(launcher_patch.patch_launcher(Mock(), self.launcher))
+
+        self.assertFalse(os.path.exists(self.new_executable))
+
+    def test_corrupted_patch_falls_back_to_the_torrent(self):
+        with patch('sync.launcher_patch.download_url', return_value=Mock(content=self.patch[:-10])):
+            self.assertFalse(launcher_patch.patch_launcher(Mock(), self.launcher))
+
+        self.assertFalse(os.path.exists(self.new_executable))
+        self.assertFalse(os.path.exists(self.new_executable + '.patched'))
@@ -0,0 +1,71 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import copy
+import unittest
+
+from sync.metadata_diff import diff_metadata
+
+
+def mod(foldername, timestamp):
+    return {'foldername': foldername, 'torrent-timestamp': timestamp, 'full_name': foldername}
+
+
+METADATA = {
+    'protocol': '1.0',
+    'refresh': 600,
+    'mods': [mod('@cba', '2017-01-01_00-00-00')],
+    'servers': [{
+        'name': 'Server',
+        'ip': '127.0.0.1',
+        'port': 2302,
+        'mods': [mod('@cba', '2017-01-01_00-00-00'), mod('@ace', '2017-01-01_00-00-00')],
+    }],
+}
+
+
+class MetadataDiffTest(unittest.TestCase):
+
+    def setUp(self):
+        self.new = copy.deepcopy(METADATA)
+
+    def test_same_metadata(self):
+        self.assertTrue(diff_metadata(METADATA, self.new).is_empty())
+
+    def test_new_torrent_is_applied_in_place(self):
+        self.new['refresh'] = 60
+        self.new['servers'][0]['mods'][1]['torrent-timestamp'] = '2017-02-02_00-00-00'
+
+        changes = diff_metadata(METADATA, self.new)
+
+        self.assertEqual(changes.changed_mods.keys(), ['@ace'])
+        self.assertTrue(changes.can_be_applied_in_place())
+
+    def test_mod_listed_twice_with_different_torrents(self):
+        self.new['mods'][0]['torrent-timestamp'] = '2017-02-02_00-00-00'
+
+        changes = diff_metadata(METADATA, self.new)
+
+        self.assertEqual(changes.updated_mods, {'@cba'})
+        self.assertFalse(changes.can_be_applied_in_place())
+
+    def test_other_changes_require_a_restart(self):
+        self.new['servers'][0]['mods'].append(mod('@tfar', '2017-01-01_00-00-00'))
+        self.new['teamspeak'] = 'ts.example.com'
+
+        changes = diff_metadata(METADATA, self.new)
+
+        self.assertEqual(changes.added_mods, {'@tfar'})
+        self.assertEqual(changes.changed_keys, {'servers', 'teamspeak'})
+        self.assertFalse(changes.can_be_applied_in_place())
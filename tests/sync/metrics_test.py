@@ -0,0 +1,99 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import json
+import os
+import shutil
+import socket
+import tempfile
+import unittest
+
+from mock import Mock, patch
+from sync import metrics
+
+
+def fake_mod(foldername, state, pieces, progress):
+    mod = Mock(foldername=foldername)
+    mod.torrent_handle.is_valid.return_value = True
+    mod.torrent_handle.has_metadata.return_value = True
+    mod.status = Mock(state=state, num_pieces=pieces, progress=progress, total_wanted=1000,
+                      download_payload_rate=100, upload_payload_rate=10, total_redundant_bytes=0,
+                      total_failed_bytes=0, num_peers=2, num_seeds=1)
+    return mod
+
+
+def fake_session():
+    session = Mock()
+    session.status.return_value = Mock(payload_download_rate=100, payload_upload_rate=10,
+                                       total_payload_download=5000, total_payload_upload=500,
+                                       total_redundant_bytes=0, total_failed_bytes=0, num_peers=2)
+    session.get_cache_status.return_value = Mock(queued_jobs=3, queued_bytes=4096, spec=['queued_jobs', 'queued_bytes'])
+    return session
+
+
+class SyncMetricsTest(unittest.TestCase):
+
+    def test_update_computes_the_rates(self):
+        sync_metrics = metrics.SyncMetrics()
+        downloading = metrics.libtorrent.torrent_status.downloading
+
+        with patch('sync.metrics.time.time', return_value=1000.0):
+            sync_metrics.update(fake_session(), [fake_mod('@mod', downloading, 10, 0.1)])
+
+        with patch('sync.metrics.time.time', return_value=1002.0):
+            sync_metrics.update(fake_session(), [fake_mod('@mod', downloading, 14, 0.2)])
+
+        torrent = sync_metrics.torrents['@mod']
+        self.assertEqual(torrent['state'], 'downloading')
+        self.assertEqual(torrent['piece_interval_seconds'], 0.5)
+        self.assertEqual(sync_metrics.session['disk_queue_jobs'], 3)
+        self.assertEqual(sync_metrics.phase_seconds['download'], 2)
+
+    def test_prometheus_format(self):
+        sync_metrics = metrics.SyncMetrics()
+        sync_metrics.session = {'peers': 2}
+        sync_metrics.torrents = {'@my "mod"': {'state': 'seeding', 'progress': 1.0}}
+
+        lines = sync_metrics.to_prometheus().splitlines()
+
+        self.assertIn('launcher_phase_seconds{phase="download"} 0.0', lines)
+        self.assertIn('launcher_session_peers 2.0', lines)
+        self.assertIn('launcher_torrent_state{mod="@my \\"mod\\"",state="seeding"} 1.0', lines)
+        self.assertIn('launcher_torrent_progress{mod="@my \\"mod\\""} 1.0', lines)
+
+
+class MetricsExporterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_port_in_use(self):
+        taken = socket.socket()
+        self.addCleanup(taken.close)
+        taken.bind(('127.0.0.1', 0))
+        taken.listen(1)
+
+        json_file = os.path.join(self.directory, 'metrics.json')
+        exporter = metrics.MetricsExporter(json_file=json_file, port=taken.getsockname()[1])
+        self.addCleanup(exporter.close)
+
+        self.assertIsNone(exporter.http_server)
+
+        # The files are still written
+        exporter.export(metrics.SyncMetrics(), force=True)
+        with open(json_file, 'rb') as f:
+            self.assertIn('phase_seconds', json.load(f))
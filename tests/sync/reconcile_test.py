@@ -0,0 +1,126 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+from sync.reconcile import ContentVerifier, TorrentFile, break_stale_hardlinks, plan_reconciliation
+
+PIECE_LENGTH = 16
+
+
+class ReconcileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.base = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.base)
+
+    def _write(self, name, contents):
+        path = os.path.join(self.base, name)
+        with open(path, 'wb') as f:
+            f.write(contents)
+
+        return path
+
+    def _torrent(self, entries, with_hashes=True):
+        """Build torrent file entries and the matching piece hashes."""
+        files = []
+        data = b''
+
+        for name, contents in entries:
+            filehash = hashlib.sha1(contents).digest() if with_hashes else None
+            files.append((TorrentFile(name, len(contents), len(data), filehash),
+                          os.path.join(self.base, name)))
+            data += contents
+
+        piece_hashes = [hashlib.sha1(data[i:i + PIECE_LENGTH]).digest()
+                        for i in xrange(0, len(data), PIECE_LENGTH)]
+        verifier = ContentVerifier(PIECE_LENGTH, piece_hashes, len(data))
+
+        return files, verifier
+
+    def _local_files(self):
+        return {os.path.join(self.base, name): os.path.getsize(os.path.join(self.base, name))
+                for name in os.listdir(self.base)}
+
+    def test_renamed_file_is_matched_by_file_hash(self):
+        old_path = self._write('old.pbo', b'a' * 40)
+        files, verifier = self._torrent([('new.pbo', b'a' * 40)])
+
+        plan = plan_reconciliation(files, self._local_files(), verifier)
+
+        self.assertEqual(plan, {old_path: [os.path.join(self.base, 'new.pbo')]})
+
+    def test_renamed_file_is_matched_by_piece_hashes(self):
+        old_path = self._write('old.pbo', b'b' * 40)
+        files, verifier = self._torrent([('small.bin', b'x' * 5), ('new.pbo', b'b' * 40)], with_hashes=False)
+
+        plan = plan_reconciliation(files, self._local_files(), verifier)
+
+        self.assertEqual(plan, {old_path: [os.path.join(self.base, 'new.pbo')]})
+
+    def test_modified_file_is_not_matched(self):
+        self._write('old.pbo', b'c' * 39 + b'd')
+        files, verifier = self._torrent([('new.pbo', b'c' * 40)], with_hashes=False)
+
+        plan = plan_reconciliation(files, self._local_files(), verifier)
+
+        self.assertEqual(plan, {})
+
+    def test_existing_destination_is_left_alone(self):
+        self._write('old.pbo', b'e' * 40)
+        self._write('new.pbo', b'f' * 40)
+        files, verifier = self._torrent([('new.pbo', b'e' * 40)])
+
+        plan = plan_reconciliation(files, self._local_files(), verifier)
+
+        self.assertEqual(plan, {})
+
+    def test_stale_hardlink_is_broken(self):
+        files, verifier = self._torrent([('new.pbo', b'new contents of the file')])
+        other_mod_file = self._write('other.pbo', b'old contents of the file')
+        os.link(other_mod_file, os.path.join(self.base, 'new.pbo'))
+
+        break_stale_hardlinks(files, verifier)
+
+        self.assertFalse(os.path.samefile(other_mod_file, os.path.join(self.base, 'new.pbo')))
+        with open(other_mod_file, 'rb') as f:
+            self.assertEqual(f.read(), b'old contents of the file')
+
+    def test_up_to_date_hardlink_is_kept(self):
+        files, verifier = self._torrent([('new.pbo', b'same contents')])
+        other_mod_file = self._write('other.pbo', b'same contents')
+        os.link(other_mod_file, os.path.join(self.base, 'new.pbo'))
+
+        break_stale_hardlinks(files, verifier)
+
+        self.assertTrue(os.path.samefile(other_mod_file, os.path.join(self.base, 'new.pbo')))
+
+    def test_failed_copy_leaves_the_link_alone(self):
+        files, verifier = self._torrent([('new.pbo', b'new contents of the file')])
+        other_mod_file = self._write('other.pbo', b'old contents of the file')
+        os.link(other_mod_file, os.path.join(self.base, 'new.pbo'))
+
+        with patch('utils.paths.replace_file', side_effect=OSError(13, 'Permission denied')):
+            with self.assertRaises(OSError):
+                break_stale_hardlinks(files, verifier)
+
+        self.assertTrue(os.path.samefile(other_mod_file, os.path.join(self.base, 'new.pbo')))
+        self.assertFalse(os.path.exists(os.path.join(self.base, 'new.pbo.launcher_tmp')))
@@ -0,0 +1,188 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import Mock, patch
+from sync.seeder import MetadataSource, Seeder, SeederException, SeederQueue
+
+METADATA_URL = 'http://example.com/updater/metadata.json'
+
+
+def fake_source(data):
+    source = Mock(torrent_url_prefix='http://example.com/torrents/')
+    source.fetch.return_value = data
+    return source
+
+
+class MetadataSourceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'metadata.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_local_file(self):
+        with open(self.path, 'wb') as f:
+            json.dump({'mods': []}, f)
+
+        self.assertEqual(MetadataSource(self.path).fetch(), {'mods': []})
+
+    def test_missing_local_file(self):
+        with self.assertRaises(SeederException):
+            MetadataSource(self.path).fetch()
+
+    def test_corrupted_local_file(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'{"mods": [')
+
+        with self.assertRaises(SeederException):
+            MetadataSource(self.path).fetch()
+
+    def test_torrent_url_prefix(self):
+        self.assertEqual(MetadataSource(METADATA_URL).torrent_url_prefix, 'http://example.com/updater/torrents/')
+        self.assertEqual(MetadataSource(METADATA_URL, torrent_url_prefix='http://cdn/').torrent_url_prefix,
+                         'http://cdn/')
+
+    def test_url(self):
+        with patch('sync.seeder.manager_functions._get_mod_descriptions', return_value={'mods': []}) as get:
+            self.assertEqual(MetadataSource(METADATA_URL, 'login', 'password').fetch(), {'mods': []})
+
+        self.assertEqual(get.call_args[0][1:], ('login', 'password'))
+        self.assertEqual(get.call_args[1], {'url': METADATA_URL})
+
+    def test_rejected_url(self):
+        def reject(queue, *args, **kwargs):
+            queue.reject({'msg': 'Metadata not found'})
+
+        with patch('sync.seeder.manager_functions._get_mod_descriptions', side_effect=reject):
+            with self.assertRaisesRegexp(SeederException, 'Metadata not found'):
+                MetadataSource(METADATA_URL).fetch()
+
+    def test_error_after_rejecting(self):
+        def reject_and_fail(queue, *args, **kwargs):
+            queue.reject({'details': 'Server error'})
+            raise KeyError('mods')
+
+        with patch('sync.seeder.manager_functions._get_mod_descriptions', side_effect=reject_and_fail):
+            with self.assertRaisesRegexp(SeederException, 'Server error'):
+                MetadataSource(METADATA_URL).fetch()
+
+    def test_error_without_rejecting_is_raised(self):
+        with patch('sync.seeder.manager_functions._get_mod_descriptions', side_effect=KeyError('mods')):
+            with self.assertRaises(KeyError):
+                MetadataSource(METADATA_URL).fetch()
+
+
+class SeederQueueTest(unittest.TestCase):
+
+    def test_receive_message(self):
+        self.assertIsNone(SeederQueue().receive_message())
+
+        terminate = [False]
+        queue = SeederQueue(termination_check=lambda: terminate[0])
+        self.assertIsNone(queue.receive_message())
+
+        terminate[0] = True
+        self.assertEqual(queue.receive_message(), {'command': 'terminate', 'params': None})
+
+    def test_reject(self):
+        queue = SeederQueue()
+        self.assertEqual(queue.get_reject_message(), '')
+
+        queue.reject({'msg': 'first'})
+        queue.reject({'details': 'second'})
+        self.assertEqual(queue.get_reject_message(), 'second')
+
+
+class SeederTest(unittest.TestCase):
+
+    def setUp(self):
+        self.source = fake_source({'mods': [1]})
+        self.seeder = Seeder([self.source], '/mods', refresh_interval=300)
+        _, self.seeder.metadata_checksum = self.seeder.fetch_metadata()
+
+        patcher = patch('sync.seeder.time.time', return_value=1000.0)
+        self.time = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_metadata_is_not_checked_too_often(self):
+        self.seeder.next_refresh = 1100
+        self.source.fetch.return_value = {'mods': [2]}
+
+        self.assertFalse(self.seeder.metadata_changed())
+
+    def test_unchanged_metadata(self):
+        self.assertFalse(self.seeder.metadata_changed())
+        self.assertEqual(self.seeder.next_refresh, 1300)
+
+    def test_changed_metadata(self):
+        self.source.fetch.return_value = {'mods': [2]}
+
+        self.assertTrue(self.seeder.should_terminate())
+
+        # Checked again only after refresh_interval
+        self.assertFalse(self.seeder.metadata_changed())
+
+    def test_failed_refresh_keeps_the_old_metadata(self):
+        self.source.fetch.side_effect = SeederException('Could not fetch')
+
+        self.assertFalse(self.seeder.metadata_changed())
+        self.assertFalse(self.seeder.should_terminate())
+
+    def test_stop(self):
+        self.seeder.next_refresh = 1100
+        self.seeder.stop()
+
+        self.assertTrue(self.seeder.should_terminate())
+
+    @patch('sync.seeder.devmode.get_ip_whitelist', return_value=[])
+    @patch('sync.seeder.TorrentSyncer')
+    def test_seed_once_until_the_metadata_changes(self, torrent_syncer, _):
+        mods = [Mock(foldername='@a'), Mock(foldername='@b')]
+
+        def sync(keep_seeding):
+            queue = torrent_syncer.call_args[0][0]
+            self.assertIsNone(queue.receive_message())
+
+            self.time.return_value += self.seeder.refresh_interval + 1
+            self.source.fetch.return_value = {'mods': [2]}
+            self.assertEqual(queue.receive_message()['command'], 'terminate')
+            return True
+
+        torrent_syncer.return_value.sync.side_effect = sync
+
+        with patch.object(self.seeder, 'get_mods', return_value=mods):
+            self.assertTrue(self.seeder.seed_once())
+
+        self.assertEqual(torrent_syncer.call_args[0][1], mods)
+        torrent_syncer.return_value.update_session_settings.assert_called_once_with(
+            active_downloads=2, active_seeds=2, active_limit=2)
+
+    @patch('sync.seeder.devmode.get_ip_whitelist', return_value=[])
+    @patch('sync.seeder.TorrentSyncer')
+    def test_seed_once_fails_on_reject(self, torrent_syncer, _):
+        def sync(keep_seeding):
+            torrent_syncer.call_args[0][0].reject({'msg': 'Could not download the torrent'})
+
+        torrent_syncer.return_value.sync.side_effect = sync
+
+        with patch.object(self.seeder, 'get_mods', return_value=[]):
+            self.assertFalse(self.seeder.seed_once())
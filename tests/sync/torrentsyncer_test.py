@@ -0,0 +1,125 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import unittest
+
+from mock import Mock, call, patch
+from sync import manager_functions
+from sync.torrentsyncer import TorrentSyncer
+
+TFR = '@task_force_radio'
+
+
+def fake_mod(foldername, files_list=()):
+    mod = Mock(foldername=foldername, torrent_url='http://example.com/torrents/{}-1.torrent'.format(foldername),
+               web_seed_job=None, files_list=list(files_list))
+    mod.torrent_handle.is_valid.return_value = True
+    return mod
+
+
+def synced_messages(queue):
+    return [args[0]['workaround_finished'] for args, _ in queue.progress.call_args_list
+            if 'workaround_finished' in args[0]]
+
+
+class RunFinishedHookTest(unittest.TestCase):
+
+    def setUp(self):
+        self.queue = Mock()
+        self.mods = [fake_mod(TFR), fake_mod('@other')]
+
+        with patch.object(TorrentSyncer, 'init_libtorrent'):
+            self.syncer = TorrentSyncer(self.queue, self.mods)
+
+        self.syncer.session = Mock()
+        self.syncer.updated_mod_hook = Mock(return_value=True)
+
+        patcher = patch.object(self.syncer, 'torrent_finished_hook', return_value=True)
+        self.torrent_finished_hook = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def replace(self, new_mod):
+        with patch.object(self.syncer, 'prepare_libtorrent_params'):
+            self.syncer.update_mods([new_mod])
+
+    def test_mod_replaced_while_seeding_is_reported_after_the_hook(self):
+        new_mod = fake_mod(TFR, ['plugins/task_force_radio.ts3_plugin'])
+        self.replace(new_mod)
+
+        self.assertTrue(self.syncer.run_finished_hook(new_mod))
+
+        self.syncer.updated_mod_hook.assert_called_once_with(new_mod)
+        self.assertEqual(synced_messages(self.queue), [TFR])
+        self.assertEqual(self.syncer.updated_mods, set())
+
+    def test_failed_hook_is_not_reported_as_synced(self):
+        new_mod = fake_mod(TFR)
+        self.replace(new_mod)
+        self.syncer.updated_mod_hook.return_value = False
+
+        self.assertFalse(self.syncer.run_finished_hook(new_mod))
+
+        self.assertEqual(synced_messages(self.queue), [])
+        self.assertTrue(self.syncer.force_termination)
+
+    def test_failed_cleanup_skips_the_hook(self):
+        new_mod = fake_mod(TFR)
+        self.replace(new_mod)
+        self.torrent_finished_hook.return_value = False
+
+        self.assertFalse(self.syncer.run_finished_hook(new_mod))
+
+        self.syncer.updated_mod_hook.assert_not_called()
+        self.queue.reject.assert_called_once()
+
+    def test_mods_not_replaced_are_left_to_the_end_of_the_sync(self):
+        self.assertTrue(self.syncer.run_finished_hook(self.mods[1]))
+
+        self.syncer.updated_mod_hook.assert_not_called()
+        self.assertEqual(synced_messages(self.queue), [])
+
+    @patch('sync.manager_functions.devmode.get_deduplicate_mods', return_value=True)
+    @patch('sync.manager_functions._try_installing_teamspeak_plugins', return_value=True)
+    @patch('sync.dedup.deduplicate_files', return_value={'files_linked': 0, 'bytes_saved': 0, 'files_skipped': 0})
+    def test_plugin_of_mod_replaced_while_seeding_is_installed(self, deduplicate_files, install_plugins, _):
+        all_mods = list(self.mods)
+        new_mod = fake_mod(TFR, ['plugins/task_force_radio.ts3_plugin'])
+        self.replace(new_mod)
+        self.syncer.updated_mod_hook = lambda mod: manager_functions._finish_updated_mod(self.queue, mod, all_mods)
+
+        steps = Mock()
+        steps.attach_mock(install_plugins, 'install_plugins')
+        steps.attach_mock(deduplicate_files, 'deduplicate_files')
+        steps.attach_mock(self.queue.progress, 'progress')
+
+        self.assertTrue(self.syncer.run_finished_hook(new_mod))
+
+        install_plugins.assert_called_once_with(self.queue, new_mod)
+        deduplicate_files.assert_called_once_with([new_mod, all_mods[1]])
+        self.assertEqual([name for name, _, _ in steps.mock_calls],
+                         ['install_plugins', 'progress', 'deduplicate_files', 'progress'])
+        self.assertEqual(synced_messages(self.queue), [TFR])
+        new_mod.force_completion.assert_called_once_with()
+
+    @patch('sync.manager_functions._try_installing_teamspeak_plugins', return_value=False)
+    @patch('sync.dedup.deduplicate_files')
+    def test_failed_plugin_installation(self, deduplicate_files, _):
+        new_mod = fake_mod(TFR, ['plugins/task_force_radio.ts3_plugin'])
+        self.replace(new_mod)
+        self.syncer.updated_mod_hook = lambda mod: manager_functions._finish_updated_mod(self.queue, mod, self.mods)
+
+        self.assertFalse(self.syncer.run_finished_hook(new_mod))
+
+        deduplicate_files.assert_not_called()
+        self.assertEqual(synced_messages(self.queue), [])
@@ -0,0 +1,178 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import BaseHTTPServer
+import hashlib
+import os
+import re
+import requests
+import shutil
+import tempfile
+import threading
+import unittest
+import urllib
+
+from mock import patch
+from SocketServer import ThreadingMixIn
+from sync.webseed import FileSlice, TorrentLayout, WebSeedDownloader, WebSeedException
+
+PIECE_LENGTH = 16
+
+
+class RangeRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Serve the files of self.server.files, honouring the Range header."""
+
+    protocol_version = 'HTTP/1.1'  # Keep-alive
+
+    def do_GET(self):
+        path = urllib.unquote(self.path.lstrip('/')).decode('utf-8')
+        data = self.server.files.get(path)
+        if data is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        match = re.match(r'bytes=(\d+)-(\d+)', self.headers.get('Range', ''))
+        if match and not self.server.ignore_range:
+            data = data[int(match.group(1)):int(match.group(2)) + 1] + self.server.extra_data
+            self.send_response(206)
+        else:
+            self.send_response(200)
+
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class WebSeedServer(ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    ignore_range = False
+    extra_data = b''  # Sent after the requested range, like a broken server would
+
+
+class WebSeedTest(unittest.TestCase):
+
+    def setUp(self):
+        self.save_path = tempfile.mkdtemp()
+        self.server = WebSeedServer(('127.0.0.1', 0), RangeRequestHandler)
+        self.server.files = {}
+        self.url = 'http://127.0.0.1:{}/'.format(self.server.server_address[1])
+
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.save_path)
+
+    def _layout(self, entries):
+        data = b''.join(contents for _, contents in entries)
+        piece_hashes = [hashlib.sha1(data[i:i + PIECE_LENGTH]).digest()
+                        for i in xrange(0, len(data), PIECE_LENGTH)]
+
+        return TorrentLayout(PIECE_LENGTH, piece_hashes, [(path, len(contents)) for path, contents in entries])
+
+    def _read(self, path):
+        with open(os.path.join(self.save_path, path), 'rb') as f:
+            return f.read()
+
+    def test_pieces_spanning_files_are_downloaded(self):
+        entries = [('@mod/a b.pbo', b'a' * 20), ('@mod/addons/b.pbo', b'b' * 30), ('@mod/c.bin', b'c' * 7)]
+        self.server.files = dict(entries)
+        layout = self._layout(entries)
+
+        downloader = WebSeedDownloader(layout, self.save_path, [self.url], connections=3)
+        downloaded = downloader.download(range(layout.num_pieces()))
+
+        self.assertEqual(downloaded, set(range(layout.num_pieces())))
+        for path, contents in entries:
+            self.assertEqual(self._read(path), contents)
+
+    def test_corrupted_piece_is_not_written(self):
+        entries = [('@mod/a.pbo', b'a' * 32)]
+        self.server.files = {'@mod/a.pbo': b'a' * 16 + b'x' * 16}
+        layout = self._layout(entries)
+
+        downloader = WebSeedDownloader(layout, self.save_path, [self.url])
+        downloaded = downloader.download([0, 1])
+
+        self.assertEqual(downloaded, {0})
+        self.assertEqual(downloader.failed, {1})
+        self.assertEqual(self._read('@mod/a.pbo'), b'a' * 16)
+
+    def test_next_web_seed_is_used_on_failure(self):
+        entries = [('@mod/a.pbo', b'a' * 40)]
+        self.server.files = dict(entries)
+        layout = self._layout(entries)
+
+        broken_url = self.url + 'missing/'
+        downloader = WebSeedDownloader(layout, self.save_path, [broken_url, self.url], connections=1)
+        downloaded = downloader.download(range(layout.num_pieces()))
+
+        self.assertEqual(downloaded, set(range(layout.num_pieces())))
+        self.assertEqual(self._read('@mod/a.pbo'), b'a' * 40)
+
+    def test_write_errors_fail_the_piece_only(self):
+        entries = [('@mod/a.pbo', b'a' * 48)]
+        self.server.files = dict(entries)
+        layout = self._layout(entries)
+
+        downloader = WebSeedDownloader(layout, self.save_path, [self.url], connections=1)
+        write_piece = downloader.write_piece
+        errors = {0: IOError(28, 'No space left on device'), 1: ValueError('unexpected')}
+
+        def failing_write_piece(piece_data):
+            piece = piece_data[0][0].offset // PIECE_LENGTH
+            if piece in errors:
+                raise errors[piece]
+
+            write_piece(piece_data)
+
+        with patch.object(downloader, 'write_piece', side_effect=failing_write_piece):
+            downloaded = downloader.download([0, 1, 2])
+
+        self.assertEqual(downloaded, {2})
+        self.assertEqual(downloader.failed, {0, 1})
+
+    def _fetch_slice(self, file_slice):
+        downloader = WebSeedDownloader(self._layout([('@mod/a.pbo', b'a' * 40)]), self.save_path, [self.url])
+        session = requests.Session()
+        self.addCleanup(session.close)
+
+        return downloader.fetch_slice(session, self.url, file_slice)
+
+    def test_slice_is_fetched(self):
+        self.server.files = {'@mod/a.pbo': b'0123456789'}
+
+        self.assertEqual(self._fetch_slice(FileSlice('@mod/a.pbo', 2, 5)), b'23456')
+
+    def test_server_ignoring_the_range_is_rejected(self):
+        self.server.files = {'@mod/a.pbo': b'0123456789'}
+        self.server.ignore_range = True
+
+        with self.assertRaises(WebSeedException):
+            self._fetch_slice(FileSlice('@mod/a.pbo', 0, 10))
+
+    def test_too_much_data_is_rejected(self):
+        self.server.files = {'@mod/a.pbo': b'0123456789'}
+        self.server.extra_data = b'x' * 100
+
+        with self.assertRaises(WebSeedException):
+            self._fetch_slice(FileSlice('@mod/a.pbo', 2, 5))
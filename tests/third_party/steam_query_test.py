@@ -0,0 +1,126 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import socket
+import struct
+import threading
+import unittest
+
+from third_party import steam_query
+
+CHALLENGE = b'\x01\x02\x03\x04'
+
+
+def make_info_response(player_count, max_players):
+    return (steam_query.PACKET_HEADER + steam_query.S2A_INFO + b'\x11' +
+            b'Test server\x00Altis\x00Arma3\x00Arma 3\x00' +
+            struct.pack('<hBB', 0, player_count, max_players) + b'\x00' * 6)
+
+
+class FakeA2SServer(threading.Thread):
+    """A local UDP server answering A2S_INFO requests, optionally requiring a
+    challenge and ignoring the first few requests.
+    """
+
+    def __init__(self, player_count=3, require_challenge=False, drop_requests=0):
+        super(FakeA2SServer, self).__init__()
+        self.daemon = True
+        self.player_count = player_count
+        self.require_challenge = require_challenge
+        self.drop_requests = drop_requests
+        self.requests = []
+        self.running = True
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.settimeout(0.05)
+        self.address = self.sock.getsockname()
+
+    def run(self):
+        while self.running:
+            try:
+                data, address = self.sock.recvfrom(1400)
+
+            except socket.timeout:
+                continue
+
+            self.requests.append(data)
+            if len(self.requests) <= self.drop_requests:
+                continue
+
+            if self.require_challenge and not data.endswith(CHALLENGE):
+                reply = steam_query.PACKET_HEADER + steam_query.S2C_CHALLENGE + CHALLENGE
+            else:
+                reply = make_info_response(self.player_count, 64)
+
+            self.sock.sendto(reply, address)
+
+    def stop(self):
+        self.running = False
+        self.join()
+        self.sock.close()
+
+
+class QueryEngineTest(unittest.TestCase):
+
+    def start_server(self, **kwargs):
+        server = FakeA2SServer(**kwargs)
+        server.start()
+        self.addCleanup(server.stop)
+        return server
+
+    def get_unused_address(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(('127.0.0.1', 0))
+        address = sock.getsockname()
+        sock.close()
+        return address
+
+    def test_parse_info_response(self):
+        info = steam_query.parse_info_response(make_info_response(12, 64))
+
+        self.assertEqual(info['server_name'], 'Test server')
+        self.assertEqual(info['player_count'], 12)
+        self.assertEqual(info['max_players'], 64)
+
+        with self.assertRaises(steam_query.InvalidResponse):
+            steam_query.parse_info_response(make_info_response(12, 64)[:20])
+
+    def test_queries_all_servers_at_once(self):
+        servers = [self.start_server(player_count=1),
+                   self.start_server(player_count=2, require_challenge=True),
+                   self.start_server(player_count=3, drop_requests=1)]
+        down_address = self.get_unused_address()
+
+        engine = steam_query.QueryEngine([server.address for server in servers] + [down_address],
+                                         attempts=3, initial_timeout=0.1)
+        results = list(engine.results())
+
+        # The servers are reported as soon as they answer, the dead one last
+        self.assertEqual(results[-1], (3, None, None))
+        answers = {server_id: info['player_count'] for server_id, info, _ in results[:-1]}
+        self.assertEqual(answers, {0: 1, 1: 2, 2: 3})
+
+        for _, _, ping in results[:-1]:
+            self.assertGreaterEqual(ping, 0)
+
+        self.assertEqual(servers[1].requests, [steam_query.A2S_INFO_REQUEST,
+                                               steam_query.A2S_INFO_REQUEST + CHALLENGE])
+        self.assertEqual(len(servers[2].requests), 2)
+
+    def test_should_stop(self):
+        server = self.start_server(drop_requests=100)
+        engine = steam_query.QueryEngine([server.address])
+
+        self.assertEqual(list(engine.results(should_stop=lambda: True)), [])
@@ -0,0 +1,111 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from mock import patch
+from utils.data.jsonstore import DelayedSaver, JsonStore
+
+
+class ExampleModel(object):
+    """The part of utils.data.model.Model used by JsonStore."""
+
+    fields = [
+        {'name': 'max_upload_speed'},
+        {'name': 'max_download_speed'},
+        {'name': 'update', 'persist': False},
+    ]
+
+    def __init__(self):
+        self.data = {'max_upload_speed': 0, 'max_download_speed': 0, 'update': False}
+
+    def get(self, key):
+        return self.data[key]
+
+    def set(self, key, value):
+        self.data[key] = value
+
+
+class DelayedSaverTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'config.json')
+        self.model = ExampleModel()
+        self.store = JsonStore(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read(self):
+        with open(self.path, 'rb') as f:
+            return json.load(f)
+
+    def test_changes_are_saved_together(self):
+        saver = DelayedSaver(self.store, self.model, delay=0.05)
+
+        with patch.object(self.store, 'save', wraps=self.store.save) as save:
+            for speed in xrange(10):
+                self.model.set('max_upload_speed', speed)
+                saver.schedule('max_upload_speed')
+
+            self.model.set('max_download_speed', 5)
+            saver.schedule('max_download_speed')
+            self.assertFalse(os.path.exists(self.path))
+
+            time.sleep(0.3)
+
+            save.assert_called_once_with(self.model, {'max_upload_speed', 'max_download_speed'})
+            self.assertEqual(self.read(), {'max_upload_speed': 9, 'max_download_speed': 5})
+            self.assertEqual(os.listdir(self.directory), ['config.json'])
+
+    def test_flush_saves_right_away(self):
+        saver = DelayedSaver(self.store, self.model, delay=60)
+        self.model.set('max_upload_speed', 100)
+        saver.schedule('max_upload_speed')
+
+        saver.flush()
+
+        self.assertFalse(saver.has_pending_changes())
+        self.assertEqual(self.read()['max_upload_speed'], 100)
+
+    def test_failed_save_is_retried(self):
+        saver = DelayedSaver(self.store, self.model, delay=0.05)
+        self.model.set('max_upload_speed', 100)
+        saver.schedule('max_upload_speed')
+
+        with patch.object(self.store, '_save_to_file', side_effect=IOError(13, 'Permission denied')):
+            saver.flush()
+
+        self.assertTrue(saver.has_pending_changes())
+
+        time.sleep(0.3)
+
+        self.assertFalse(saver.has_pending_changes())
+        self.assertEqual(self.read()['max_upload_speed'], 100)
+
+    def test_existing_file_is_replaced(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'{"max_upload_speed": 1}')
+
+        self.model.set('max_upload_speed', 2)
+        self.store.save(self.model)
+
+        self.assertEqual(self.read()['max_upload_speed'], 2)
+        self.assertEqual(os.listdir(self.directory), ['config.json'])
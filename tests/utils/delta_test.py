@@ -0,0 +1,84 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from utils import delta
+
+BLOCK_SIZE = 1024
+
+
+class DeltaTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.old_data = os.urandom(20 * BLOCK_SIZE + 100)
+        self.signature = delta.file_signature(self.write('old', self.old_data), BLOCK_SIZE)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, data):
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+
+        return path
+
+    def get_delta(self, data):
+        return delta.compute_delta(self.write('new', data), self.signature, BLOCK_SIZE)
+
+    def test_identical_file(self):
+        ops = self.get_delta(self.old_data)
+
+        self.assertEqual(len(ops), 21)
+        self.assertEqual(delta.get_ranges_to_send(ops, BLOCK_SIZE), [])
+
+    def test_modified_block(self):
+        new_data = self.old_data[:5 * BLOCK_SIZE + 10] + b'changed' + self.old_data[5 * BLOCK_SIZE + 17:]
+        ops = self.get_delta(new_data)
+
+        self.assertEqual(delta.get_ranges_to_send(ops, BLOCK_SIZE), [(5 * BLOCK_SIZE, BLOCK_SIZE)])
+
+    def test_inserted_bytes_are_found_by_rolling(self):
+        new_data = self.old_data[:5 * BLOCK_SIZE] + b'inserted' + self.old_data[5 * BLOCK_SIZE:]
+        ops = self.get_delta(new_data)
+
+        self.assertEqual([op for op in ops if op[0] == 'data'], [('data', 5 * BLOCK_SIZE, 8)])
+        self.assertIn(('copy', 5 * BLOCK_SIZE + 8, 5, BLOCK_SIZE), ops)
+
+    def test_patch(self):
+        new_data = self.old_data[:5 * BLOCK_SIZE] + b'inserted' + self.old_data[5 * BLOCK_SIZE:-50] + b'end'
+        new_path = self.write('new', new_data)
+        output_path = os.path.join(self.directory, 'output')
+
+        patch = delta.create_patch(os.path.join(self.directory, 'old'), new_path, BLOCK_SIZE)
+        self.assertLess(len(patch), 2 * BLOCK_SIZE)
+
+        delta.apply_patch(os.path.join(self.directory, 'old'), patch, output_path)
+        with open(output_path, 'rb') as f:
+            self.assertEqual(f.read(), new_data)
+
+    def test_patch_for_another_file_is_refused(self):
+        patch = delta.create_patch(os.path.join(self.directory, 'old'), self.write('new', b'new'), BLOCK_SIZE)
+        other_path = self.write('other', b'other')
+        output_path = os.path.join(self.directory, 'output')
+
+        with self.assertRaises(delta.PatchError):
+            delta.apply_patch(other_path, patch, output_path)
+
+        self.assertFalse(os.path.exists(output_path))
@@ -0,0 +1,78 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import Mock, patch
+from utils import discovery
+
+
+class NotInstalled(Exception):
+    pass
+
+
+class DiscoveryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.exe = os.path.join(self.directory, 'Arma3.exe')
+        with open(self.exe, 'wb') as f:
+            f.write(b'MZ')
+
+        patcher = patch('utils.discovery.get_cache_path', return_value=os.path.join(self.directory, 'discovery.json'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        discovery.forget()
+        self.addCleanup(discovery.forget)
+
+        self.resolve = Mock(return_value=(self.directory, [self.exe]))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_resolved_once(self):
+        self.assertEqual(discovery.get('arma', self.resolve, NotInstalled), self.directory)
+        self.assertEqual(discovery.get('arma', self.resolve, NotInstalled), self.directory)
+        self.assertEqual(self.resolve.call_count, 1)
+
+    def test_persisted_until_the_files_change(self):
+        discovery.get('arma', self.resolve, NotInstalled)
+
+        # Next session
+        discovery.forget()
+        self.assertEqual(discovery.get('arma', self.resolve, NotInstalled), self.directory)
+        self.assertEqual(self.resolve.call_count, 1)
+
+        discovery.forget()
+        os.unlink(self.exe)
+        discovery.get('arma', self.resolve, NotInstalled)
+        self.assertEqual(self.resolve.call_count, 2)
+
+    def test_not_found_is_retried_later(self):
+        self.resolve.side_effect = NotInstalled()
+
+        with patch('utils.discovery.time.time', return_value=1000):
+            for _ in xrange(2):
+                with self.assertRaises(NotInstalled):
+                    discovery.get('arma', self.resolve, NotInstalled)
+
+            self.assertEqual(self.resolve.call_count, 1)
+
+        self.resolve.side_effect = None
+        with patch('utils.discovery.time.time', return_value=1000 + discovery.NOT_FOUND_TTL + 1):
+            self.assertEqual(discovery.get('arma', self.resolve, NotInstalled), self.directory)
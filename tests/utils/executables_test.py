@@ -0,0 +1,104 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import hashlib
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+from mock import patch
+from utils import executables
+from utils import hashes
+
+
+def make_pe(timestamp, body=b'body'):
+    """Return the contents of a minimal PE file linked at timestamp."""
+
+    dos_header = b'MZ' + b'\0' * 58 + struct.pack('<I', 64)
+    coff_header = struct.pack('<HHIIIHH', 0x14c, 3, timestamp, 0, 0, 224, 0x102)
+    return dos_header + b'PE\0\0' + coff_header + body
+
+
+class ExecutablesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.my_executable = self.write('running.exe', make_pe(1000))
+
+        patcher = patch('utils.executables.get_external_executable', return_value=self.my_executable)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        hash_patcher = patch('utils.executables.hashes.hash_for_file', wraps=hashes.hash_for_file)
+        self.hash_for_file = hash_patcher.start()
+        self.addCleanup(hash_patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        executables._hashes_cache.clear()
+
+    def write(self, name, data):
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+
+        return path
+
+    def test_get_pe_header(self):
+        header = executables.get_pe_header(self.my_executable)
+
+        self.assertEqual(len(header), 20)
+        self.assertEqual(struct.unpack_from('<I', header, 4)[0], 1000)
+        self.assertIsNone(executables.get_pe_header(self.write('script.py', b'print "hello"')))
+
+    def test_get_file_sha1_is_cached(self):
+        expected = hashlib.sha1(make_pe(1000)).hexdigest()
+
+        self.assertEqual(executables.get_file_sha1(self.my_executable), expected)
+        self.assertEqual(executables.get_file_sha1(self.my_executable), expected)
+        self.assertEqual(self.hash_for_file.call_count, 1)
+
+        # A modified file is hashed again
+        self.write('running.exe', make_pe(2000))
+        os.utime(self.my_executable, (0, 0))
+        self.assertNotEqual(executables.get_file_sha1(self.my_executable), expected)
+        self.assertEqual(self.hash_for_file.call_count, 2)
+
+    def test_same_files(self):
+        other = self.write('other.exe', make_pe(1000))
+
+        self.assertTrue(executables.compare_if_same_files(other))
+
+    def test_different_sizes_are_not_hashed(self):
+        other = self.write('other.exe', make_pe(1000, body=b'longer body'))
+
+        self.assertFalse(executables.compare_if_same_files(other))
+        self.hash_for_file.assert_not_called()
+
+    def test_different_pe_headers_are_not_hashed(self):
+        other = self.write('other.exe', make_pe(2000))
+
+        self.assertFalse(executables.compare_if_same_files(other))
+        self.hash_for_file.assert_not_called()
+
+    def test_same_header_different_contents(self):
+        other = self.write('other.exe', make_pe(1000, body=b'BODY'))
+
+        self.assertFalse(executables.compare_if_same_files(other))
+        self.assertEqual(self.hash_for_file.call_count, 2)
+
+    def test_missing_other_file(self):
+        self.assertFalse(executables.compare_if_same_files(os.path.join(self.directory, 'missing.exe')))
@@ -0,0 +1,96 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from mock import patch
+from utils import filecache
+
+
+class FileCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_directory = tempfile.mkdtemp()
+
+        for name, value in (('get_cache_directory', self.cache_directory), ('get_max_size', 10)):
+            patcher = patch('utils.filecache.{}'.format(name), return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_directory)
+
+    def test_save_and_get(self):
+        filecache.save_file('http://a', b'12345', etag='"a"')
+
+        self.assertEqual(filecache.get_file('http://a'), b'12345')
+        self.assertEqual(filecache.get_validators('http://a'), {'etag': '"a"', 'last_modified': None})
+        self.assertIsNone(filecache.get_file('http://b'))
+
+    def test_least_recently_used_file_is_evicted(self):
+        filecache.save_file('http://a', b'1234')
+        filecache.save_file('http://b', b'1234')
+        filecache.get_file('http://a')
+
+        filecache.save_file('http://c', b'1234')
+
+        self.assertEqual(filecache.get_file('http://a'), b'1234')
+        self.assertIsNone(filecache.get_file('http://b'))
+        self.assertEqual(filecache.get_file('http://c'), b'1234')
+        self.assertEqual(filecache.get_stats()['size'], 8)
+
+    def test_corrupted_file_is_dropped(self):
+        filecache.save_file('http://a', b'12345')
+        with open(filecache.map_file('http://a'), 'wb') as f:
+            f.write(b'54321')
+
+        self.assertIsNone(filecache.get_file('http://a'))
+        self.assertIsNone(filecache.get_entry('http://a'))
+
+    def test_freshness(self):
+        filecache.save_file('http://a', b'1', max_age=60)
+        filecache.save_file('http://b', b'1')
+
+        self.assertTrue(filecache.is_fresh('http://a'))
+        self.assertFalse(filecache.is_fresh('http://b'))
+
+    def test_reads_use_the_index_in_memory(self):
+        filecache.save_file('http://a', b'1', max_age=60)
+        filecache._access_state['last_save'] = time.time()
+
+        with patch('utils.filecache._read_index') as read_index, \
+             patch('utils.paths.write_file_atomically') as write_file_atomically:
+            for _ in xrange(3):
+                self.assertTrue(filecache.is_fresh('http://a'))
+                self.assertEqual(filecache.get_file('http://a'), b'1')
+
+            read_index.assert_not_called()
+            write_file_atomically.assert_not_called()
+
+    def test_access_times_are_saved_lazily(self):
+        filecache.save_file('http://a', b'1')
+        filecache._access_state['last_save'] = time.time()
+        filecache.get_file('http://a')
+        last_access = filecache._access_times[filecache._get_key('http://a')]
+
+        filecache.flush()
+
+        with open(os.path.join(self.cache_directory, filecache.INDEX_FILE_NAME), 'rb') as f:
+            index = json.load(f)
+        self.assertEqual(index[filecache._get_key('http://a')]['last_access'], last_access)
@@ -0,0 +1,63 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+from utils import log
+
+
+class FallbackLoggerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        patcher = patch('utils.log.get_logs_directory', return_value=self.directory)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.reset_logger)
+        self.reset_logger()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def reset_logger(self):
+        logger = logging.getLogger('launcher')
+        for handler in logger.handlers[:]:
+            handler.close()
+            logger.removeHandler(handler)
+
+        log._fallback_logger = None
+
+    def test_messages_are_written_to_a_file(self):
+        with patch('sys.stderr'):
+            log._get_fallback_logger().info('Synced @cba')
+
+        log_files = os.listdir(self.directory)
+        self.assertEqual(len(log_files), 1)
+        with open(os.path.join(self.directory, log_files[0])) as f:
+            self.assertIn('Synced @cba', f.read())
+
+    def test_old_log_files_are_removed(self):
+        for i in xrange(log.MAX_LOG_FILES + 5):
+            open(os.path.join(self.directory, 'child_2017-01-01_00-00-{:02}_1.txt'.format(i)), 'w').close()
+
+        log._get_fallback_logger()
+
+        log_files = sorted(os.listdir(self.directory))
+        self.assertEqual(len(log_files), log.MAX_LOG_FILES)
+        self.assertEqual(log_files[0], 'child_2017-01-01_00-00-05_1.txt')
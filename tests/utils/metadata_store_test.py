@@ -0,0 +1,61 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+from utils import metadata_store
+
+
+class MetadataStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        patcher = patch('utils.metadata_store.get_store_directory', return_value=self.directory)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_save_and_load(self):
+        data = {'protocol': '1.0', 'mods': [{'foldername': '@cba', 'torrent-timestamp': '2017-01-01_00-00-00'}]}
+
+        data_hash = metadata_store.save(data)
+
+        self.assertEqual(data_hash, metadata_store.get_hash({'mods': data['mods'], 'protocol': '1.0'}))
+        self.assertEqual(metadata_store.load(data_hash), data)
+        self.assertIsNone(metadata_store.load(metadata_store.get_hash({})))
+
+    def test_only_the_last_versions_are_kept(self):
+        hashes = []
+        for version in xrange(4):
+            hashes.append(metadata_store.save({'version': version}, keep=2))
+            os.utime(os.path.join(self.directory, hashes[-1] + '.json'), (version, version))
+
+        self.assertEqual(metadata_store.get_versions(), [hashes[3], hashes[2]])
+
+        # Saving a stored version again makes it the most recent one
+        self.assertEqual(metadata_store.save({'version': 2}, keep=2), hashes[2])
+        self.assertEqual(metadata_store.get_versions(), [hashes[2], hashes[3]])
+
+    def test_corrupted_version_is_not_loaded(self):
+        data_hash = metadata_store.save({'protocol': '1.0'})
+        with open(os.path.join(self.directory, data_hash + '.json'), 'wb') as f:
+            f.write(b'{"protocol": "2.0"}')
+
+        self.assertIsNone(metadata_store.load(data_hash))
@@ -0,0 +1,76 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+from utils import paths
+
+
+class HardlinkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.source = os.path.join(self.directory, 'source.pbo')
+        self.destination = os.path.join(self.directory, 'destination.pbo')
+
+        with open(self.source, 'wb') as f:
+            f.write(b'contents')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_hardlink_or_copy_links(self):
+        self.assertTrue(paths.hardlink_or_copy(self.source, self.destination))
+
+        self.assertTrue(paths.is_same_file(self.source, self.destination))
+        self.assertEqual(paths.get_link_count(self.source), 2)
+
+    def test_hardlink_or_copy_copies_when_links_are_not_supported(self):
+        with patch('utils.paths.hardlink', side_effect=OSError(18, 'Invalid cross-device link')):
+            self.assertFalse(paths.hardlink_or_copy(self.source, self.destination))
+
+        self.assertFalse(paths.is_same_file(self.source, self.destination))
+        self.assertEqual(paths.get_link_count(self.source), 1)
+        with open(self.destination, 'rb') as f:
+            self.assertEqual(f.read(), b'contents')
+
+    def test_replace_file_overwrites_the_destination(self):
+        with open(self.destination, 'wb') as f:
+            f.write(b'old contents')
+
+        paths.replace_file(self.source, self.destination)
+
+        self.assertFalse(os.path.exists(self.source))
+        with open(self.destination, 'rb') as f:
+            self.assertEqual(f.read(), b'contents')
+
+    def test_write_file_atomically(self):
+        paths.write_file_atomically(self.source, b'new contents')
+
+        with open(self.source, 'rb') as f:
+            self.assertEqual(f.read(), b'new contents')
+        self.assertEqual(os.listdir(self.directory), ['source.pbo'])
+
+    def test_write_file_atomically_keeps_the_file_on_failure(self):
+        with patch('utils.paths.replace_file', side_effect=OSError(13, 'Permission denied')):
+            with self.assertRaises(OSError):
+                paths.write_file_atomically(self.source, b'new contents')
+
+        with open(self.source, 'rb') as f:
+            self.assertEqual(f.read(), b'contents')
+        self.assertEqual(os.listdir(self.directory), ['source.pbo'])
@@ -24,7 +24,7 @@ from mock import patch, Mock
 from kivy.clock import Clock
 
 from nose.plugins.attrib import attr
-from utils.process import Para
+from utils.process import JobError, Para, WorkerPool, get_spawn_report, map_in_processes, protected_para
 
 
 def worker_func(con, arg1, arg2):
@@ -53,6 +53,32 @@ def blocking_after_resolving(con):
     # time.sleep(5)
 
 
+def crashing_func(con):
+    os._exit(3)
+
+
+def chatty_func(con):
+    """this function is run in another process"""
+    for i in range(50):
+        con.progress({'msg': 'step {}'.format(i), 'log': [i]}, (i + 1) / 50.0)
+
+    con.resolve('done')
+
+
+def slow_job(job, report_progress):
+    """The first jobs take the longest, so they end last"""
+    report_progress(0.5)
+    time.sleep(0.05 * (3 - job))
+    return job * 10
+
+
+def failing_job(job, report_progress):
+    if job == 1:
+        raise ValueError('bad job')
+
+    return job
+
+
 class ParaTest(unittest.TestCase):
 
     def setUp(self):
@@ -147,3 +173,124 @@ class ParaTest(unittest.TestCase):
                 para.request_termination()
 
         res_handler.assert_called_once_with('terminating')
+
+    def test_para_should_report_spawn_stats(self):
+        p = protected_para(worker_func, (1, 2), 'spawnstats')
+
+        while p.is_open():
+            time.sleep(0.1)
+            Clock.tick()
+
+        self.assertGreaterEqual(p.spawn_stats['spawn_latency'], 0)
+        self.assertEqual(get_spawn_report()['spawnstats']['count'], 1)
+
+    def test_para_should_coalesce_progress(self):
+        progress_handler = Mock()
+        res_handler = Mock()
+
+        para = Para(chatty_func, (), 'testaction')
+        para.then(res_handler, None, progress_handler)
+        para.run()
+
+        # Let all the messages pile up in the pipe
+        para.current_child_process.join()
+        para.handle_messagequeue(0)
+
+        progress_handler.assert_called_once_with({'msg': 'step 49', 'log': range(50)}, 1.0)
+        self.assertEqual(para.state, 'closingforresolve')
+        self.assertEqual(para.get_pump_stats()['messages_received'], 51)
+
+        while not para.state == 'resolved':
+            time.sleep(0.1)
+            Clock.tick()
+
+        res_handler.assert_called_once_with('done')
+
+
+class WorkerPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.old_main =                     sys.modules["__main__"]
+        self.old_main_file =                sys.modules["__main__"].__file__
+        sys.modules["__main__"] =           sys.modules["tests.utils.process_test"]
+        sys.modules["__main__"].__file__ =  sys.modules["tests.utils.process_test"].__file__
+
+        self.pool = WorkerPool(size=1)
+
+    def tearDown(self):
+        self.pool.stop()
+        sys.modules["__main__"] =           self.old_main
+        sys.modules["__main__"].__file__ =  self.old_main_file
+
+    def _run(self, func, args=()):
+        res_handler = Mock()
+
+        with patch('utils.process._worker_pool', self.pool):
+            para = Para(func, args, 'actionname')
+            para.then(res_handler, None, None)
+            para.run()
+
+            while para.is_open():
+                time.sleep(0.1)
+                Clock.tick()
+
+        return para, res_handler
+
+    def test_worker_is_reused(self):
+        worker = self.pool.idle[0]
+
+        for _ in range(2):
+            para, res_handler = self._run(worker_func, (1, 2))
+
+            self.assertIs(para.worker, worker)
+            res_handler.assert_called_once_with('something')
+
+        self.assertEqual(self.pool.idle, [worker])
+        self.assertEqual(worker.tasks_run, 2)
+
+    def test_crashed_worker_is_replaced(self):
+        worker = self.pool.idle[0]
+        rej_handler = Mock()
+
+        with patch('utils.process._worker_pool', self.pool):
+            para = Para(crashing_func, (), 'actionname')
+            para.then(None, rej_handler, None)
+            para.run()
+
+            while para.is_open():
+                time.sleep(0.1)
+                Clock.tick()
+
+        self.assertIn('code 3', rej_handler.call_args[0][0]['msg'])
+        self.assertEqual(len(self.pool.idle), 1)
+        self.assertIsNot(self.pool.idle[0], worker)
+
+
+class MapInProcessesTest(unittest.TestCase):
+
+    def test_results_are_in_the_order_of_the_jobs(self):
+        progress = []
+        results = map_in_processes(slow_job, [0, 1, 2], 3,
+                                   lambda index, fraction, total: progress.append((index, fraction, total)))
+
+        self.assertEqual(results, [0, 10, 20])
+
+        # Each job reported half way and its end, the total only grows up to 1
+        self.assertEqual(sorted((index, fraction) for index, fraction, _ in progress),
+                         [(0, 0.5), (0, 1.0), (1, 0.5), (1, 1.0), (2, 0.5), (2, 1.0)])
+        totals = [total for _, _, total in progress]
+        self.assertEqual(totals, sorted(totals))
+        self.assertEqual(totals[-1], 1.0)
+
+    def test_single_worker_runs_in_this_process(self):
+        progress = []
+        results = map_in_processes(slow_job, [2, 1], 1, lambda *args: progress.append(args))
+
+        self.assertEqual(results, [20, 10])
+        self.assertEqual(progress, [(0, 0.5, 0.25), (0, 1.0, 0.5), (1, 0.5, 0.75), (1, 1.0, 1.0)])
+
+    def test_failed_job_raises(self):
+        with self.assertRaises(JobError) as context:
+            map_in_processes(failing_job, [0, 1, 2], 2)
+
+        self.assertIn('bad job', unicode(context.exception))
@@ -0,0 +1,83 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+import unittest
+
+from mock import Mock
+from utils.promise import Promise
+
+
+class PromiseTest(unittest.TestCase):
+
+    def test_then_chains_values(self):
+        handler = Mock()
+        first = Promise()
+        second = Promise()
+
+        first.then(lambda data: second).then(lambda data: data + 1).then(handler)
+        first.resolve(1)
+        handler.assert_not_called()
+
+        second.resolve(41)
+        handler.assert_called_once_with(42)
+
+    def test_all_waits_for_every_promise(self):
+        handler = Mock()
+        promises = [Promise(), Promise()]
+        Promise.all(promises).then(handler)
+
+        promises[1].resolve('b')
+        handler.assert_not_called()
+
+        promises[0].resolve('a')
+        handler.assert_called_once_with(['a', 'b'])
+
+    def test_all_rejection_cancels_the_others(self):
+        canceller = Mock()
+        rej_handler = Mock()
+        promises = [Promise(), Promise(canceller=canceller)]
+        Promise.all(promises).then(None, rej_handler)
+
+        promises[0].reject({'msg': 'failed'})
+
+        rej_handler.assert_called_once_with({'msg': 'failed'})
+        canceller.assert_called_once_with()
+        self.assertEqual(promises[1].state, 'cancelled')
+
+    def test_any_resolves_with_the_first_promise(self):
+        handler = Mock()
+        promises = [Promise(), Promise()]
+        Promise.any(promises).then(handler)
+
+        promises[0].reject({'msg': 'failed'})
+        promises[1].resolve('b')
+
+        handler.assert_called_once_with('b')
+
+    def test_cancel_drops_handlers(self):
+        handler = Mock()
+        canceller = Mock()
+        promise = Promise(canceller=canceller)
+        promise.then(handler).cancel()
+
+        promise.resolve('a')
+
+        handler.assert_not_called()
+        canceller.assert_called_once_with()
+
+    def test_from_para(self):
+        para = Mock()
+        promise = Promise.from_para(para)
+
+        para.then.assert_called_once_with(promise.resolve, promise.reject, None)
+        promise.cancel()
+        para.request_termination_and_break_promises.assert_called_once_with()
@@ -0,0 +1,81 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+import zlib
+
+from mock import patch
+from utils import pypeeker
+
+
+def build_archive(files, prefix=b'MZ' + b'\0' * 126):
+    """Return an executable with a PyInstaller 2.1+ archive holding the
+    {name: contents} files.
+    """
+
+    data = b''
+    toc = b''
+    for name, contents in sorted(files.items()):
+        compressed = zlib.compress(contents)
+        name = name.encode('utf-8') + b'\0'
+        toc += struct.pack(b'!iiiiBc', 18 + len(name), len(data), len(compressed), len(contents), 1, b's') + name
+        data += compressed
+
+    package_length = len(data) + len(toc) + pypeeker.COOKIE21_SIZE
+    cookie = struct.pack(b'!8siiii64s', pypeeker.ARCHIVE_MAGIC, package_length, len(data), len(toc), 27, b'python27.dll')
+
+    return prefix + data + toc + cookie
+
+
+class PypeekerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'launcher.exe')
+        self.write({
+            pypeeker.VERSION_LOCATION: b"version = '1.2.3'\n",
+            'other.pyc': os.urandom(1000),
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, files):
+        with open(self.path, 'wb') as f:
+            f.write(build_archive(files))
+
+    def test_get_version(self):
+        self.assertEqual(pypeeker.get_version(self.path), '1.2.3')
+        self.assertIsNone(pypeeker.extract_file(self.path, 'missing.py'))
+
+    def test_toc_is_cached_until_the_file_changes(self):
+        with patch('utils.pypeeker._parse_toc', wraps=pypeeker._parse_toc) as parse_toc:
+            pypeeker.get_version(self.path)
+            pypeeker.get_version(self.path)
+            self.assertEqual(parse_toc.call_count, 1)
+
+            self.write({pypeeker.VERSION_LOCATION: b"version = '1.2.40'\n"})
+            self.assertEqual(pypeeker.get_version(self.path), '1.2.40')
+            self.assertEqual(parse_toc.call_count, 2)
+
+    def test_not_an_archive(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'MZ' + b'\0' * 1000)
+
+        with self.assertRaises(pypeeker.PypeekerException):
+            pypeeker.get_version(self.path)
@@ -0,0 +1,243 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import os
+import paramiko
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+
+from utils import remote
+
+
+class StubServer(paramiko.ServerInterface):
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED
+
+
+class StubSFTPHandle(paramiko.SFTPHandle):
+    def stat(self):
+        return paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+
+    def chattr(self, attr):
+        if attr.st_size is not None:
+            self.writefile.truncate(attr.st_size)
+        return paramiko.SFTP_OK
+
+
+class StubSFTPServer(paramiko.SFTPServerInterface):
+    """Serve the files of the directory set in the ROOT class attribute."""
+
+    ROOT = None
+
+    def _path(self, path):
+        return os.path.join(self.ROOT, path.lstrip('/'))
+
+    def list_folder(self, path):
+        path = self._path(path)
+        try:
+            return [paramiko.SFTPAttributes.from_stat(os.stat(os.path.join(path, name)), name)
+                    for name in os.listdir(path)]
+        except OSError as ex:
+            return paramiko.SFTPServer.convert_errno(ex.errno)
+
+    def stat(self, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.stat(self._path(path)))
+        except OSError as ex:
+            return paramiko.SFTPServer.convert_errno(ex.errno)
+
+    lstat = stat
+
+    def open(self, path, flags, attr):
+        if flags & os.O_WRONLY:
+            mode = 'wb'
+        elif flags & os.O_RDWR:
+            mode = 'r+b'
+        else:
+            mode = 'rb'
+
+        try:
+            f = os.fdopen(os.open(self._path(path), flags, 0o644), mode)
+        except OSError as ex:
+            return paramiko.SFTPServer.convert_errno(ex.errno)
+
+        handle = StubSFTPHandle(flags)
+        handle.readfile = f
+        handle.writefile = f
+        return handle
+
+    def remove(self, path):
+        try:
+            os.remove(self._path(path))
+        except OSError as ex:
+            return paramiko.SFTPServer.convert_errno(ex.errno)
+        return paramiko.SFTP_OK
+
+    def mkdir(self, path, attr):
+        try:
+            os.mkdir(self._path(path))
+        except OSError as ex:
+            return paramiko.SFTPServer.convert_errno(ex.errno)
+        return paramiko.SFTP_OK
+
+    def posix_rename(self, oldpath, newpath):
+        try:
+            os.rename(self._path(oldpath), self._path(newpath))
+        except OSError as ex:
+            return paramiko.SFTPServer.convert_errno(ex.errno)
+        return paramiko.SFTP_OK
+
+
+class SFTPStandIn(object):
+    """A local SSH server with an SFTP subsystem serving a directory."""
+
+    def __init__(self, root):
+        super(SFTPStandIn, self).__init__()
+        self.root = root
+        self.host_key = paramiko.RSAKey.generate(1024)
+        self.transports = []
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(5)
+        self.port = self.sock.getsockname()[1]
+
+        self.thread = threading.Thread(target=self.serve)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def serve(self):
+        server_class = type(str('RootedSFTPServer'), (StubSFTPServer,), {'ROOT': self.root})
+
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except socket.error:
+                return
+
+            transport = paramiko.Transport(conn)
+            transport.add_server_key(self.host_key)
+            transport.set_subsystem_handler('sftp', paramiko.SFTPServer, server_class)
+            transport.start_server(server=StubServer())
+            self.transports.append(transport)
+
+    def close(self):
+        self.sock.close()
+        for transport in self.transports:
+            transport.close()
+
+
+class RemoteConectionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.local_directory = tempfile.mkdtemp()
+        self.remote_directory = tempfile.mkdtemp()
+        self.server = SFTPStandIn(self.remote_directory)
+        self.connection = remote.RemoteConection('127.0.0.1', 'user', 'password', self.server.port)
+
+    def tearDown(self):
+        self.connection.close()
+        self.server.close()
+        shutil.rmtree(self.local_directory)
+        shutil.rmtree(self.remote_directory)
+
+    def test_transfer_files(self):
+        uploads = []
+        for i in range(10):
+            path = os.path.join(self.local_directory, 'mod{}.torrent'.format(i))
+            with open(path, 'wb') as f:
+                f.write(b'torrent {}'.format(i) * 1000)
+
+            uploads.append((path, '/mod{}.torrent'.format(i)))
+
+        with open(os.path.join(self.remote_directory, 'old.torrent'), 'wb') as f:
+            f.write(b'old')
+
+        done = []
+        self.connection.transfer_files(uploads=uploads, removals=['/old.torrent'], channels=4,
+                                       callback=lambda action, path, size, seconds: done.append((action, path)))
+
+        self.assertEqual(sorted(os.listdir(self.remote_directory)),
+                         sorted('mod{}.torrent'.format(i) for i in range(10)))
+        self.assertEqual(len(done), 11)
+        self.assertIn(('remove', '/old.torrent'), done)
+
+        with open(os.path.join(self.remote_directory, 'mod3.torrent'), 'rb') as f:
+            self.assertEqual(f.read(), b'torrent 3' * 1000)
+
+    def test_transfer_files_raises_errors(self):
+        with self.assertRaises(IOError):
+            self.connection.transfer_files(removals=['/missing.torrent'])
+
+    def test_save_file_rotates_backups(self):
+        for version in (b'1', b'2', b'3'):
+            self.connection.save_file('/metadata.json', version, keep_backups=2)
+
+        def read(name):
+            with open(os.path.join(self.remote_directory, name), 'rb') as f:
+                return f.read()
+
+        self.assertEqual(sorted(os.listdir(self.remote_directory)),
+                         ['metadata.json', 'metadata.json_bak', 'metadata.json_bak1'])
+        self.assertEqual(read('metadata.json'), b'3')
+        self.assertEqual(read('metadata.json_bak'), b'2')
+        self.assertEqual(read('metadata.json_bak1'), b'1')
+
+    def test_mirror_directory_sends_only_the_changes(self):
+        mod_directory = os.path.join(self.local_directory, '@mod')
+        os.makedirs(os.path.join(mod_directory, 'addons'))
+
+        big_file = os.path.join(mod_directory, 'addons', 'big.pbo')
+        with open(big_file, 'wb') as f:
+            f.write(os.urandom(2 * 1024 * 1024))
+
+        for name in ('mod.cpp', 'removed.txt'):
+            with open(os.path.join(mod_directory, name), 'wb') as f:
+                f.write(name)
+
+        stats = self.connection.mirror_directory(mod_directory, '/mods/@mod')
+        self.assertEqual(stats['files_sent'], 3)
+
+        # Change a few bytes of the big file, add a file and remove another
+        with open(big_file, 'r+b') as f:
+            f.seek(1024 * 1024 + 10)
+            f.write(b'changed')
+
+        os.unlink(os.path.join(mod_directory, 'removed.txt'))
+        with open(os.path.join(mod_directory, 'added.txt'), 'wb') as f:
+            f.write(b'added')
+
+        stats = self.connection.mirror_directory(mod_directory, '/mods/@mod')
+
+        self.assertEqual(stats['files_patched'], 1)
+        self.assertEqual(stats['files_sent'], 1)
+        self.assertEqual(stats['files_removed'], 1)
+        self.assertEqual(stats['files_unchanged'], 1)
+        self.assertLess(stats['bytes_sent'], 100 * 1024)
+
+        remote_mod_directory = os.path.join(self.remote_directory, 'mods', '@mod')
+        self.assertEqual(sorted(os.listdir(remote_mod_directory)), ['added.txt', 'addons', 'mod.cpp'])
+
+        with open(big_file, 'rb') as local_file:
+            with open(os.path.join(remote_mod_directory, 'addons', 'big.pbo'), 'rb') as remote_file:
+                self.assertEqual(local_file.read(), remote_file.read())
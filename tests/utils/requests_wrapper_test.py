@@ -0,0 +1,87 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import BaseHTTPServer
+import shutil
+import tempfile
+import threading
+import unittest
+
+from mock import patch
+from SocketServer import ThreadingMixIn
+from utils import requests_wrapper
+
+ETAG = '"v1"'
+
+
+class ConditionalRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Serve self.server.data, answering 304 when the ETag matches."""
+
+    protocol_version = 'HTTP/1.1'  # Keep-alive
+
+    def do_GET(self):
+        self.server.requests.append(self.headers.get('If-None-Match'))
+
+        if self.headers.get('If-None-Match') == ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('ETag', ETAG)
+        self.send_header('Content-Length', str(len(self.server.data)))
+        self.end_headers()
+        self.wfile.write(self.server.data)
+
+    def log_message(self, *args):
+        pass
+
+
+class CacheServer(ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class DownloadUrlCachedTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_directory = tempfile.mkdtemp()
+        patcher = patch('utils.filecache.get_cache_directory', return_value=self.cache_directory)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.server = CacheServer(('127.0.0.1', 0), ConditionalRequestHandler)
+        self.server.data = b'{"protocol": "1.0"}'
+        self.server.requests = []
+        self.url = 'http://127.0.0.1:{}/metadata.json'.format(self.server.server_address[1])
+
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.cache_directory)
+
+    def test_revalidates_the_cached_copy(self):
+        res = requests_wrapper.download_url_cached(None, self.url, timeout=5)
+        self.assertFalse(res.from_cache)
+        self.assertEqual(res.json(), {'protocol': '1.0'})
+
+        res = requests_wrapper.download_url_cached(None, self.url, timeout=5)
+        self.assertTrue(res.from_cache)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json(), {'protocol': '1.0'})
+
+        self.assertEqual(self.server.requests, [None, ETAG])
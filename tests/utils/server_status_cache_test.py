@@ -0,0 +1,64 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+from sync.server import Server
+from utils.server_status_cache import ServerStatusCache
+
+
+class ServerStatusCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'server_status.json')
+        self.servers = [Server('A', '127.0.0.1', 2302), Server('B', '127.0.0.1', 2402)]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_update_returns_only_the_changes(self):
+        cache = ServerStatusCache(self.path)
+
+        self.assertEqual(cache.update(self.servers, ['1/64', '?/?'], [20, None]), [0])
+        self.assertEqual(cache.update(self.servers, ['1/64', '2/64'], [20, 30]), [1])
+        self.assertEqual(cache.update(self.servers, ['1/64', '3/64'], [20, 30]), [1])
+
+    def test_entries_expire(self):
+        cache = ServerStatusCache(self.path, ttl=60)
+
+        with patch('time.time', return_value=1000):
+            cache.update(self.servers, ['1/64', '2/64'], [20, 30])
+
+        with patch('time.time', return_value=1059):
+            self.assertFalse(cache.needs_refresh(self.servers))
+
+        with patch('time.time', return_value=1061):
+            self.assertTrue(cache.needs_refresh(self.servers))
+
+    def test_persistence(self):
+        cache = ServerStatusCache(self.path)
+        cache.update(self.servers, ['1/64', '-/-'], [20, None])
+        cache.save()
+
+        loaded = ServerStatusCache(self.path)
+        loaded.load()
+
+        self.assertEqual(loaded.get(self.servers[0])['players'], '1/64')
+        self.assertEqual(loaded.get(self.servers[0])['ping'], 20)
+        self.assertEqual(loaded.get(self.servers[1])['players'], '-/-')
@@ -0,0 +1,82 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+from __future__ import unicode_literals
+
+import os
+import psutil
+import subprocess
+import unittest
+
+from mock import Mock, patch
+from utils import system_processes
+
+
+def fake_process(pid, name):
+    process = Mock(pid=pid)
+    process.name.return_value = name
+    return process
+
+
+class SystemProcessesTest(unittest.TestCase):
+
+    def setUp(self):
+        system_processes._snapshot['time'] = None
+
+    def test_queries_share_the_same_scan(self):
+        processes = [fake_process(10, b'explorer.exe'), fake_process(20, b'Arma3_x64.exe')]
+
+        with patch('utils.system_processes.psutil.process_iter', return_value=processes) as process_iter:
+            self.assertTrue(system_processes.program_running('arma3.exe', 'arma3_x64.exe'))
+            self.assertFalse(system_processes.program_running('arma3launcher.exe'))
+            self.assertEqual(system_processes.find_program('ARMA3_X64.EXE'), [20])
+
+        self.assertEqual(process_iter.call_count, 1)
+
+    def test_watcher_scans_less_and_less_often(self):
+        watcher = system_processes.ProcessWatcher('arma3.exe')
+
+        with patch('utils.system_processes.find_program', return_value=[]) as find_program, \
+             patch('utils.system_processes.time.time') as time:
+            for now in xrange(10):
+                time.return_value = 1000 + now
+                self.assertFalse(watcher.is_running())
+
+            # At 0, 1, 3 and 7 seconds
+            self.assertEqual(find_program.call_count, 4)
+
+            watcher.reset()
+            watcher.is_running()
+            self.assertEqual(find_program.call_count, 5)
+
+    def test_watcher_follows_the_process(self):
+        with open(os.devnull, 'wb') as devnull:
+            child = subprocess.Popen(['sleep', '30'], stdout=devnull)
+
+        self.addCleanup(lambda: child.poll() is None and child.kill())
+        watcher = system_processes.ProcessWatcher(psutil.Process(child.pid).name())
+
+        self.assertTrue(watcher.is_running())
+        self.assertEqual(watcher.process.pid, child.pid)
+
+        # The process is checked directly, without listing all the processes
+        with patch('utils.system_processes.get_processes') as get_processes:
+            self.assertTrue(watcher.is_running())
+            get_processes.assert_not_called()
+
+        child.kill()
+        child.wait()
+        system_processes._snapshot['time'] = None
+
+        # Another process with the same name may be running on the system
+        watcher.is_running()
+        self.assertTrue(watcher.process is None or watcher.process.pid != child.pid)
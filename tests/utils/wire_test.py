@@ -0,0 +1,52 @@
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+import cPickle
+import unittest
+
+from sync.server import Server
+from utils import wire
+
+
+class FakeMod(object):
+    def __init__(self, foldername):
+        self.foldername = foldername
+        self.torrent_handle = object()  # Not picklable runtime state
+
+    def to_wire(self, memo):
+        return self.foldername
+
+    @classmethod
+    def from_wire(cls, data, memo):
+        return cls(data)
+
+
+class WireTest(unittest.TestCase):
+
+    def test_encode_drops_runtime_state(self):
+        encoded = wire.encode({'mods': [FakeMod('@cba')], 'msg': 'done'})
+        decoded = wire.decode(cPickle.loads(cPickle.dumps(encoded)))
+
+        self.assertEqual(decoded['msg'], 'done')
+        self.assertEqual(decoded['mods'][0].foldername, '@cba')
+
+    def test_shared_objects_stay_shared(self):
+        shared = FakeMod('@cba')
+        server = Server('name', '127.0.0.1', 2302)
+        server.set_mods([shared, FakeMod('@ace')])
+
+        mods, servers = wire.decode(wire.encode(([shared], [server])))
+
+        self.assertIsNot(mods[0], shared)
+        self.assertEqual(servers[0].name, 'name')
+        self.assertEqual([mod.foldername for mod in servers[0].mods], ['@cba', '@ace'])
+        self.assertIs(servers[0].mods[0], mods[0])
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""
+Compare the time needed to read the launcher version from an executable with
+pyinstxtractor (the old way) against the indexed reader of utils.pypeeker,
+with and without its table of contents in the cache.
+
+Without an executable given, a sample PyInstaller bundle is generated.
+"""
+
+from __future__ import unicode_literals
+
+import argparse
+import os
+import struct
+import sys
+import tempfile
+import time
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from external import pyinstxtractor
+from utils import pypeeker
+
+
+def create_bundle(path, files_count, file_size):
+    """Write a sample executable with a PyInstaller 2.1+ archive."""
+
+    files = [('module_{}.pyc'.format(i), os.urandom(file_size // 2) * 2) for i in xrange(files_count)]
+    files.append((pypeeker.VERSION_LOCATION, b"version = '1.0.0'\n"))
+
+    data = []
+    toc = []
+    offset = 0
+    for name, contents in files:
+        compressed = zlib.compress(contents)
+        name = name.encode('utf-8') + b'\0'
+        toc.append(struct.pack(b'!iiiiBc', 18 + len(name), offset, len(compressed), len(contents), 1, b's') + name)
+        data.append(compressed)
+        offset += len(compressed)
+
+    toc = b''.join(toc)
+    package_length = offset + len(toc) + pypeeker.COOKIE21_SIZE
+
+    with open(path, 'wb') as f:
+        f.write(b'MZ' + b'\0' * 1022)
+        for chunk in data:
+            f.write(chunk)
+
+        f.write(toc)
+        f.write(struct.pack(b'!8siiii64s', pypeeker.ARCHIVE_MAGIC, package_length, offset, len(toc), 27, b'python27.dll'))
+
+
+def measure(function, repeat):
+    start = time.time()
+    for _ in xrange(repeat):
+        result = function()
+
+    return result, (time.time() - start) / repeat
+
+
+def run(path, repeat):
+    devnull = open(os.devnull, 'w')
+
+    def old_way():
+        stdout, sys.stdout = sys.stdout, devnull  # pyinstxtractor prints a lot
+        try:
+            return pyinstxtractor.extract_file(path, pypeeker.VERSION_LOCATION)
+        finally:
+            sys.stdout = stdout
+
+    def cold():
+        pypeeker._toc_cache.clear()
+        return pypeeker.extract_file(path, pypeeker.VERSION_LOCATION)
+
+    def warm():
+        return pypeeker.extract_file(path, pypeeker.VERSION_LOCATION)
+
+    print '{}: {} bytes, {} files'.format(path, os.path.getsize(path), len(pypeeker.get_toc(path)))
+
+    for name, function in (('pyinstxtractor', old_way), ('pypeeker (cold)', cold), ('pypeeker (cached)', warm)):
+        result, duration = measure(function, repeat)
+        print '    {:20} {:9.3f} ms ({} bytes)'.format(name, duration * 1000, len(result or b''))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('executable', nargs='?', help='PyInstaller executable (a sample is generated if missing)')
+    parser.add_argument('-f', '--files', type=int, default=2000, help='Number of files in the sample bundle')
+    parser.add_argument('-s', '--size', type=int, default=8192, help='Size of each file of the sample bundle')
+    parser.add_argument('-r', '--repeat', type=int, default=20, help='Number of measurements')
+    args = parser.parse_args()
+
+    if args.executable:
+        run(args.executable, args.repeat)
+
+    else:
+        fd, path = tempfile.mkstemp(suffix='.exe')
+        os.close(fd)
+
+        try:
+            create_bundle(path, args.files, args.size)
+            run(path, args.repeat)
+
+        finally:
+            os.unlink(path)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+
+# Bulletproof Arma Launcher
+# Copyright (C) 2017 Lukasz Taczuk
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+"""
+Compare the size and the serialization time of the Para arguments when
+deep-copying and pickling the mods (the old way) against encoding them with
+utils.wire first.
+
+The mods carry the runtime state the sync process attaches to them (file
+lists, libtorrent params, torrent contents) to show its impact.
+"""
+
+from __future__ import unicode_literals
+
+import argparse
+import copy
+import cPickle
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from sync.mod import Mod
+from sync.server import Server
+from utils import wire
+
+
+def create_mod(index, files_count):
+    mod = Mod(foldername='@mod_{}'.format(index),
+              parent_location='C:\\Arma 3\\Mods',
+              torrent_url='https://example.com/torrents/@mod_{}-2017-01-01_00-00-00.torrent'.format(index),
+              torrent_timestamp='2017-01-01_00-00-00',
+              full_name='Some mod number {}'.format(index),
+              web_seeds=['https://mirror.example.com/mods/'])
+
+    # The state attached to the mods by the sync process
+    mod.files_list = ['addons\\file_{}.pbo'.format(i) for i in xrange(files_count)]
+    mod.libtorrent_params = {'save_path': mod.parent_location, 'resume_data': b'r' * 20 * files_count}
+    mod.torrent_content = b't' * 20 * files_count
+
+    return mod
+
+
+def create_args(mods_count, servers_count, files_count):
+    mods = [create_mod(i, files_count) for i in xrange(mods_count)]
+    servers = []
+    for i in xrange(servers_count):
+        server = Server('Server {}'.format(i), '127.0.0.{}'.format(i), 2302)
+        server.set_mods([create_mod(mods_count + i, files_count)] + mods[:mods_count // 2])
+        servers.append(server)
+
+    all_mods = mods[:]
+    for server in servers:
+        all_mods.extend(server.mods)
+
+    return (mods, all_mods, 'C:\\Arma 3\\Mods'), servers
+
+
+def measure(function, repeat):
+    start = time.time()
+    for _ in xrange(repeat):
+        result = function()
+
+    return result, (time.time() - start) / repeat
+
+
+def run(mods_count, servers_count, files_count, repeat):
+    args, servers = create_args(mods_count, servers_count, files_count)
+    resolved = {'msg': 'Checking mods finished', 'mods': args[0], 'servers': servers}
+
+    for name, data in (('Para arguments', args), ('resolve() data', resolved)):
+        old, old_time = measure(lambda: cPickle.dumps(copy.deepcopy(data), cPickle.HIGHEST_PROTOCOL), repeat)
+        new, new_time = measure(lambda: cPickle.dumps(wire.encode(data), cPickle.HIGHEST_PROTOCOL), repeat)
+        _, decode_time = measure(lambda: wire.decode(cPickle.loads(new)), repeat)
+
+        print '{}:'.format(name)
+        print '    deepcopy + pickle: {:9} bytes {:8.2f} ms'.format(len(old), old_time * 1000)
+        print '    encode + pickle:   {:9} bytes {:8.2f} ms (unpickle + decode: {:.2f} ms)'.format(
+            len(new), new_time * 1000, decode_time * 1000)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-m', '--mods', type=int, default=50, help='Number of mods')
+    parser.add_argument('-s', '--servers', type=int, default=5, help='Number of servers')
+    parser.add_argument('-f', '--files', type=int, default=500, help='Number of files in each mod')
+    parser.add_argument('-r', '--repeat', type=int, default=20, help='Number of measurements')
+    args = parser.parse_args()
+
+    run(args.mods, args.servers, args.files, args.repeat)